@@ -12,7 +12,7 @@ def main():
     """Parse args and run the appropriate interface."""
     if len(sys.argv) > 1 and sys.argv[1] == "--cli":
         # Run CLI version if --cli flag is provided
-        cli_main()
+        cli_main(sys.argv[2:])
     else:
         # Default to GUI version
         gui_main()
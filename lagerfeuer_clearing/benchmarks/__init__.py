@@ -0,0 +1,3 @@
+"""
+Benchmarks for Lagerfeuer Clearing.
+"""
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Compare file size and load/save time of compressed and plain ledger files.
+
+Example:
+    python -m lagerfeuer_clearing.benchmarks.compression --expenses 200000
+"""
+
+import argparse
+import io
+import json
+import os
+import tempfile
+import time
+
+from lagerfeuer_clearing.benchmarks.generate import write_ledger
+from lagerfeuer_clearing.core import ExpenseManager
+
+EXTENSIONS = (".json", ".json.gz", ".json.bz2", ".json.xz")
+
+
+def measure(manager, filename, repeat):
+    """Return the file size and the best save and load times for a file name."""
+    best_save = best_load = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        manager.save_to_file(filename)
+        best_save = min(best_save, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ExpenseManager.load_from_file(filename)
+        best_load = min(best_load, time.perf_counter() - start)
+    return os.path.getsize(filename), best_save, best_load
+
+
+def main():
+    """Print size, compression ratio and run times for every supported format."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--expenses", type=int, default=200_000)
+    parser.add_argument("--prepayments", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    out = io.StringIO()
+    write_ledger(out, args.expenses, args.prepayments)
+    data = json.loads(out.getvalue())
+    manager = ExpenseManager(data["persons"], data["groups"], data["expenses"], data["prepayments"])
+
+    with tempfile.TemporaryDirectory() as directory:
+        plain_size = None
+        print(f"{'Format':<10} {'Größe':>12} {'Verhältnis':>10} {'Speichern':>10} {'Laden':>10}")
+        for extension in EXTENSIONS:
+            filename = os.path.join(directory, "ledger" + extension)
+            size, save, load = measure(manager, filename, args.repeat)
+            plain_size = plain_size or size
+            print(
+                f"{extension:<10} {size / 1e6:>9.2f} MB {plain_size / size:>9.1f}x "
+                f"{save:>8.3f} s {load:>8.3f} s"
+            )
+
+
+if __name__ == "__main__":
+    main()
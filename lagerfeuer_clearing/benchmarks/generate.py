@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Generator for large synthetic ledger files.
+"""
+
+import argparse
+import json
+import random
+
+
+def write_ledger(fp, expenses, prepayments=0, persons=50, groups=10, seed=0):
+    """Write a synthetic ledger record by record in the format of save_to_file.
+
+    Args:
+        fp: Text file object to write to
+        expenses: Number of expenses to generate
+        prepayments: Number of prepayments to generate
+        persons: Number of persons
+        groups: Number of groups besides the group of everyone
+        seed: Seed for the random generator
+
+    Returns:
+        dict: The persons and groups of the generated ledger
+    """
+    rng = random.Random(seed)
+    names = [f"Person {i}" for i in range(persons)]
+    group_map = {"Alle": names[:]}
+    for i in range(groups):
+        group_map[f"Gruppe {i}"] = rng.sample(names, rng.randint(2, persons))
+    group_names = list(group_map)
+
+    fp.write('{\n"persons": ')
+    json.dump(names, fp, ensure_ascii=False)
+    fp.write(',\n"groups": ')
+    json.dump(group_map, fp, ensure_ascii=False)
+    fp.write(',\n"expenses": [')
+    for i in range(expenses):
+        record = {
+            "person": rng.choice(names),
+            "amount": round(rng.uniform(1, 500), 2),
+            "group": rng.choice(group_names),
+            "subject": f"Ausgabe {i}",
+        }
+        fp.write((",\n" if i else "\n") + json.dumps(record, ensure_ascii=False))
+    fp.write('\n],\n"prepayments": [')
+    for i in range(prepayments):
+        record = {
+            "person": rng.choice(names),
+            "amount": round(rng.uniform(1, 200), 2),
+            "recipient": rng.choice(names),
+        }
+        fp.write((",\n" if i else "\n") + json.dumps(record, ensure_ascii=False))
+    fp.write("\n]\n}\n")
+    return {"persons": names, "groups": group_map}
+
+
+def main():
+    """Write a synthetic ledger file."""
+    parser = argparse.ArgumentParser(description="Generate a synthetic ledger file.")
+    parser.add_argument("output", help="Path of the ledger file to write")
+    parser.add_argument("--expenses", type=int, default=100_000)
+    parser.add_argument("--prepayments", type=int, default=10_000)
+    parser.add_argument("--persons", type=int, default=50)
+    parser.add_argument("--groups", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    with open(args.output, "w", encoding="utf-8") as f:
+        write_ledger(f, args.expenses, args.prepayments, args.persons, args.groups, args.seed)
+
+
+if __name__ == "__main__":
+    main()
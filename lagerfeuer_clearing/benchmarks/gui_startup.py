@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Measure the time until the GUI window appears and until the data is shown.
+
+Needs a display; on servers run it with xvfb-run.
+
+Example:
+    python -m lagerfeuer_clearing.benchmarks.gui_startup --sizes 1000 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tkinter as tk
+
+from lagerfeuer_clearing.benchmarks.generate import write_ledger
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.gui.gui_app import ExpenseApp
+
+
+def wait_until(root, condition):
+    """Process events until the condition holds."""
+    while not condition():
+        root.update()
+
+
+def measure_lazy(filename):
+    """Return the seconds until the window appears and until the ledger is shown."""
+    start = time.perf_counter()
+    root = tk.Tk()
+    app = ExpenseApp(root)
+    app.load_in_background(lambda: ExpenseManager.load_from_file(filename))
+    wait_until(root, root.winfo_ismapped)
+    window = time.perf_counter() - start
+    wait_until(root, lambda: app.manager is not None)
+    root.update()
+    loaded = time.perf_counter() - start
+    root.destroy()
+    return window, loaded
+
+
+def measure_eager(filename):
+    """Return the seconds until the window appears after loading and building every tab."""
+    start = time.perf_counter()
+    manager = ExpenseManager.load_from_file(filename)
+    root = tk.Tk()
+    app = ExpenseApp(root, manager)
+    for tab in app.notebook.tabs():
+        app.build_tab(tab)
+    wait_until(root, root.winfo_ismapped)
+    window = time.perf_counter() - start
+    root.destroy()
+    return window
+
+
+def main():
+    """Print the startup times for ledgers of growing size."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'Ausgaben':>10} {'Fenster':>10} {'geladen':>10} {'alles vorab':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            filename = os.path.join(directory, f"ledger_{size}.json")
+            with open(filename, "w", encoding="utf-8") as f:
+                write_ledger(f, size, size // 10)
+            lazy = [measure_lazy(filename) for _ in range(args.repeat)]
+            eager = min(measure_eager(filename) for _ in range(args.repeat))
+            window = min(result[0] for result in lazy)
+            loaded = min(result[1] for result in lazy)
+            print(f"{size:>10} {window:>9.3f}s {loaded:>9.3f}s {eager:>11.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Measure the three-way merge of two independently edited copies of a large ledger.
+
+Example:
+    python -m lagerfeuer_clearing.benchmarks.merge --expenses 100000
+"""
+
+import argparse
+import io
+import json
+import random
+import time
+
+from lagerfeuer_clearing.benchmarks.generate import write_ledger
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.merge import merge_ledgers
+
+
+def edited_copy(data, rng, changes, removals):
+    """Return a manager with expenses removed at random positions and new ones appended."""
+    expenses = list(data["expenses"])
+    for _ in range(removals):
+        expenses.pop(rng.randrange(len(expenses)))
+    for i in range(changes):
+        expense = dict(rng.choice(expenses))
+        expense["subject"] = f"Neu {rng.random()} {i}"
+        expenses.append(expense)
+    return ExpenseManager(
+        list(data["persons"]), dict(data["groups"]), expenses, list(data["prepayments"])
+    )
+
+
+def main():
+    """Print the best run times of merging two edited copies of a synthetic ledger.
+
+    Copies with only appended expenses share their beginning with the common
+    version, copies with expenses removed anywhere have to be merged by hash.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--expenses", type=int, default=100_000)
+    parser.add_argument("--prepayments", type=int, default=10_000)
+    parser.add_argument("--changes", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    out = io.StringIO()
+    write_ledger(out, args.expenses, args.prepayments)
+    data = json.loads(out.getvalue())
+    rng = random.Random(0)
+    base = ExpenseManager(data["persons"], data["groups"], data["expenses"], data["prepayments"])
+
+    print(f"{args.expenses} Ausgaben, je {args.changes} neue:")
+    for label, removals in (("nur angehängt", 0), ("auch gelöscht", args.changes)):
+        ours = edited_copy(data, rng, args.changes, removals)
+        theirs = edited_copy(data, rng, args.changes, removals)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = merge_ledgers(base, ours, theirs)
+            best = min(best, time.perf_counter() - start)
+        print(f"\t{label:<14} {len(result.manager.expenses):>8} Ausgaben in {best:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
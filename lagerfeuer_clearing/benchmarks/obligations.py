@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Measure how settling dense obligation graphs scales with the number of persons.
+
+Example:
+    python -m lagerfeuer_clearing.benchmarks.obligations --persons 4000
+"""
+
+import argparse
+import random
+import time
+
+from lagerfeuer_clearing.core.obligations import ObligationMatrix, settle_obligations
+
+
+def random_matrix(persons, debts, cyclic_share, rng):
+    """Return a matrix where every person owes up to a number of random others.
+
+    Only the last share of the persons may owe someone listed before them, so
+    the debts of all other persons cannot form cycles and are searched without
+    finding any.
+    """
+    matrix = ObligationMatrix()
+    acyclic = int(persons * (1 - cyclic_share))
+    for debtor in range(persons):
+        for _ in range(debts):
+            creditor = rng.randrange(persons)
+            if debtor >= acyclic or creditor > debtor:
+                matrix.add(f"P{debtor}", f"P{creditor}", rng.randint(1, 10_000) / 100)
+    return matrix
+
+
+def main():
+    """Print the best run times of settle_obligations for doubling numbers of persons.
+
+    With the cycles cancelled in a single depth-first search the run time
+    grows roughly with the number of debts plus the length of the cancelled
+    cycles, instead of searching all debts again for every cycle.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--persons", type=int, default=2_000)
+    parser.add_argument("--debts", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sizes = [args.persons // 4, args.persons // 2, args.persons]
+    for label, cyclic_share in (("alle im Kreis", 1.0), ("10 % im Kreis", 0.1)):
+        print(f"{label}, je {args.debts} Schulden:")
+        for persons in sizes:
+            matrix = random_matrix(persons, args.debts, cyclic_share, random.Random(0))
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                transactions = settle_obligations(matrix)
+                best = min(best, time.perf_counter() - start)
+            print(
+                f"\t{persons:>6} Personen, {len(matrix):>7} Schulden: "
+                f"{len(transactions):>6} Überweisungen in {best:.3f} s"
+            )
+
+
+if __name__ == "__main__":
+    main()
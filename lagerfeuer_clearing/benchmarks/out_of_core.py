@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Settle a generated multi-gigabyte ledger out of core under an address space limit.
+
+Example:
+    python -m lagerfeuer_clearing.benchmarks.out_of_core --size-gb 2 --limit-mb 256
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from lagerfeuer_clearing.benchmarks.generate import write_ledger
+
+# Approximate size of one generated expense record in the file
+_RECORD_BYTES = 90
+
+
+def run_limited(filename, limit_mb):
+    """Run the streaming settlement in a child process with a memory limit.
+
+    Args:
+        filename: Path to the ledger file
+        limit_mb: Address space limit of the child process in megabytes
+
+    Returns:
+        subprocess.CompletedProcess: The finished child process
+    """
+    limit = limit_mb * 1024 * 1024
+
+    def apply_limit():
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    code = (
+        "import resource, sys\n"
+        "from lagerfeuer_clearing.core.streaming import calculate_transactions_streaming\n"
+        "result = calculate_transactions_streaming(sys.argv[1])\n"
+        "print(len(result['transactions']), 'Transaktionen')\n"
+        "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024, 'MB max. RSS')\n"
+    )
+    return subprocess.run(
+        [sys.executable, "-c", code, filename],
+        preexec_fn=apply_limit,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+
+def main():
+    """Generate a ledger and settle it under a memory limit."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-gb", type=float, default=2.0)
+    parser.add_argument("--limit-mb", type=int, default=256)
+    parser.add_argument("--directory", default=tempfile.gettempdir())
+    args = parser.parse_args()
+
+    expenses = int(args.size_gb * 1024**3 / _RECORD_BYTES)
+    filename = os.path.join(args.directory, "lagerfeuer_out_of_core.json")
+    try:
+        start = time.perf_counter()
+        with open(filename, "w", encoding="utf-8") as f:
+            write_ledger(f, expenses, expenses // 10)
+        size = os.path.getsize(filename) / 1024**3
+        print(f"Ledger mit {size:.2f} GB in {time.perf_counter() - start:.1f} s erzeugt")
+
+        start = time.perf_counter()
+        result = run_limited(filename, args.limit_mb)
+        print(result.stdout.strip() or result.stderr.strip())
+        print(f"Abrechnung in {time.perf_counter() - start:.1f} s (Limit {args.limit_mb} MB)")
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Measure how the parallel balance calculation scales with the number of workers.
+
+Example:
+    python -m lagerfeuer_clearing.benchmarks.parallel_scaling --expenses 2000000
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+
+from lagerfeuer_clearing.benchmarks.generate import write_ledger
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.parallel import calculate_balances_parallel
+
+
+def measure(manager, workers, repeat):
+    """Return the best run time of the balance calculation with the given workers."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        calculate_balances_parallel(
+            manager.expenses,
+            manager.prepayments,
+            manager.persons,
+            manager.members,
+            workers=workers,
+            min_records=0,
+        )
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    """Print run times and speedups for 1 to N workers."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--expenses", type=int, default=1_000_000)
+    parser.add_argument("--prepayments", type=int, default=100_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    out = io.StringIO()
+    write_ledger(out, args.expenses, args.prepayments, persons=200, groups=30)
+    data = json.loads(out.getvalue())
+    manager = ExpenseManager(data["persons"], data["groups"], data["expenses"], data["prepayments"])
+
+    start = time.perf_counter()
+    manager.calculate_balances()
+    print(f"Seriell (calculate_balances): {time.perf_counter() - start:.3f} s")
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        elapsed = measure(manager, workers, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{workers:>2} Prozesse: {elapsed:.3f} s, Beschleunigung {baseline / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
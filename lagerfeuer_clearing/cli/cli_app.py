@@ -3,16 +3,538 @@
 Command line application for expense sharing calculations.
 """
 
+import argparse
+import json
+import os
+import sys
+
 from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.export import (
+    BALANCE_FIELDS,
+    FORMATS,
+    TRANSACTION_FIELDS,
+    export_balances,
+    export_expenses,
+    export_transactions,
+    iter_balance_rows,
+    iter_transaction_rows,
+    write_rows,
+)
+from lagerfeuer_clearing.core.merge import merge_ledgers
+from lagerfeuer_clearing.core.registry import LedgerRegistry
+from lagerfeuer_clearing.core.settlement import SettlementConstraints, SettlementInfeasibleError
+from lagerfeuer_clearing.core.streaming import (
+    DEFAULT_BUFFER_LIMIT,
+    calculate_transactions_streaming,
+)
+from lagerfeuer_clearing.core.validation import LedgerValidationError, fatal_issues
+
+# Descriptions of the problems found when validating a ledger
+PROBLEM_LABELS = {
+    "unknown": "unbekannt",
+    "unlisted": "nicht in der Personenliste",
+    "duplicate": "doppelt",
+    "invalid": "ungültig",
+    "missing": "fehlt",
+    "empty": "Gruppe ohne Mitglieder",
+    "cyclic": "zyklische Definition",
+}
+
+
+def build_parser():
+    """Create the argument parser for the CLI application.
+
+    Returns:
+        argparse.ArgumentParser: The configured parser
+    """
+    parser = argparse.ArgumentParser(
+        prog="lagerfeuer-cli", description="Reisekostenaufteilung auf der Kommandozeile."
+    )
+    parser.add_argument(
+        "-f",
+        "--file",
+        help="JSON-Datei mit den Daten (ohne Angabe werden Beispieldaten verwendet)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=("text",) + FORMATS,
+        default="text",
+        help="Ausgabeformat der Ergebnisse (Standard: text)",
+    )
+    parser.add_argument(
+        "--export",
+        choices=("transactions", "balances", "expenses"),
+        default="transactions",
+        help="Was im Format csv/jsonl ausgegeben wird (Standard: transactions)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="Ausgabedatei (Standard: - für die Standardausgabe)",
+    )
+    parser.add_argument(
+        "--pairwise",
+        action="store_true",
+        help="Nur zwischen Personen ausgleichen, die gemeinsame Kosten hatten",
+    )
+    parser.add_argument(
+        "--constraints",
+        metavar="DATEI",
+        help="JSON-Datei mit erlaubten Paaren (allowed) und Höchstbeträgen (capacities)",
+    )
+    parser.add_argument(
+        "--max-transfer",
+        type=float,
+        metavar="BETRAG",
+        help="Höchstbetrag jeder einzelnen Überweisung",
+    )
+    parser.add_argument(
+        "--out-of-core",
+        action="store_true",
+        help="Datei stückweise lesen, ohne alle Ausgaben in den Speicher zu laden",
+    )
+    parser.add_argument(
+        "--buffer-limit",
+        type=int,
+        metavar="ZEICHEN",
+        help=(
+            "Höchstens so viele Zeichen der Datei gleichzeitig im Speicher halten, "
+            f"nur mit --out-of-core (Standard: {DEFAULT_BUFFER_LIMIT})"
+        ),
+    )
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("summary", help="Zusammenfassung und Transaktionen ausgeben (Standard)")
+    commands.add_parser("history", help="Kontostände am Ende jedes Tages ausgeben")
+    obligations = commands.add_parser(
+        "obligations", help="Schulden und Forderungen einer Person aufschlüsseln"
+    )
+    obligations.add_argument("person", help="Name der Person")
+    top = commands.add_parser(
+        "top", help="Personen mit den größten offenen Beträgen ausgeben (Standard: Gläubiger)"
+    )
+    top.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        default=20,
+        metavar="ANZAHL",
+        help="Höchstens so viele Personen ausgeben, 0 für alle (Standard: 20)",
+    )
+    top.add_argument(
+        "--over",
+        type=float,
+        default=0,
+        metavar="BETRAG",
+        help="Nur Personen mit einem offenen Betrag über BETRAG",
+    )
+    top.add_argument("--debtors", action="store_true", help="Schuldner statt Gläubiger ausgeben")
+    batch = commands.add_parser(
+        "batch", help="Mehrere Dateien abrechnen (ohne Angabe: ein Pfad pro Zeile von stdin)"
+    )
+    batch.add_argument("paths", nargs="*", metavar="DATEI", help="JSON-Dateien mit den Daten")
+    statements = commands.add_parser(
+        "statements", help="Eine Abrechnung pro Person in ein Verzeichnis schreiben"
+    )
+    statements.add_argument("directory", metavar="VERZEICHNIS", help="Zielverzeichnis")
+    statements.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        help="Anzahl der Prozesse (Standard: Anzahl der CPUs, kleine Mengen seriell)",
+    )
+    merge = commands.add_parser(
+        "merge", help="Zwei getrennt bearbeitete Kopien einer Datei nach --output zusammenführen"
+    )
+    merge.add_argument("base", metavar="BASIS", help="Gemeinsame Ausgangsversion")
+    merge.add_argument("ours", metavar="UNSERE", help="Unsere bearbeitete Kopie")
+    merge.add_argument("theirs", metavar="DEREN", help="Deren bearbeitete Kopie")
+    return parser
+
+
+def load_manager(filename):
+    """Load the expense manager for the given file or the example data.
+
+    Args:
+        filename: Path to a JSON file or None
+
+    Returns:
+        ExpenseManager: The loaded manager
+    """
+    if filename:
+        return ExpenseManager.load_from_file(filename)
+    return ExpenseManager.create_with_defaults()
+
+
+def describe_issues(error, limit=10):
+    """Describe the problems of an invalid ledger, one per line.
+
+    Args:
+        error: LedgerValidationError raised while loading
+        limit: Maximum number of problems listed
+
+    Returns:
+        str: Description of the first problems and the number of the others
+    """
+    lines = [
+        f"{issue['section']}[{issue['index']}].{issue['field']}: "
+        f"{PROBLEM_LABELS[issue['problem']]} ({issue['value']!r})"
+        for issue in error.issues[:limit]
+    ]
+    if len(error.issues) > limit:
+        lines.append(f"... und {len(error.issues) - limit} weitere")
+    return "\n".join(lines)
+
+
+def print_history(manager):
+    """Print the balance of every person at the end of each recorded day.
+
+    Args:
+        manager: An ExpenseManager instance
+    """
+    history = manager.balance_history()
+    if not history:
+        print("Keine datierten Ausgaben oder Anzahlungen vorhanden.")
+        return
+
+    print("Kontostände im Zeitverlauf:")
+    for day, balance in history:
+        print(f"\n{day.isoformat()}")
+        for person in sorted(balance):
+            print(f"\t{person:<11} {balance[person]:>10.2f} €")
+
+
+def print_obligations(manager, person):
+    """Print whom a person owes how much and why, and who owes them.
+
+    Args:
+        manager: An ExpenseManager instance
+        person: Name of the person
+    """
+    matrix = manager.calculate_obligations()
+    print(f"{person} schuldet:")
+    for creditor, amount in sorted(matrix.owed_by(person).items()):
+        print(f"\t{creditor:<11} {amount:>10.2f} €")
+        for detail in manager.explain_obligation(person, creditor):
+            if detail["section"] == "expenses":
+                reason = manager.expenses[detail["index"]]["subject"]
+            else:
+                reason = "Anzahlung"
+            print(f"\t\t{reason:<20} {detail['amount']:>10.2f} €")
+
+    print(f"\n{person} bekommt von:")
+    for debtor, amount in sorted(matrix.owed_to(person).items()):
+        print(f"\t{debtor:<11} {amount:>10.2f} €")
+
+
+def write_top_balances(manager, args, out):
+    """Write the creditors or debtors with the largest open amounts.
+
+    Args:
+        manager: An ExpenseManager instance
+        args: Parsed command line arguments
+        out: Text file object to write to
+    """
+    ranking = manager.rank_balances(args.debtors, args.count or None, args.over)
+    if args.format != "text":
+        rows = ({"person": person, "balance": round(amount, 2)} for person, amount in ranking)
+        write_rows(rows, out, args.format, ("person", "balance"))
+        return
+    label = "Schuldner" if args.debtors else "Gläubiger"
+    if not ranking:
+        print(f"Keine {label} gefunden.", file=out)
+        return
+    print(f"{label}:", file=out)
+    for person, amount in ranking:
+        print(f"\t{person:<11} {abs(amount):>10.2f} €", file=out)
+
+
+def print_transactions(transactions, out):
+    """Print transactions as an indented list.
+
+    Args:
+        transactions: List of transaction dictionaries
+        out: Text file object to write to
+    """
+    for trans in transactions:
+        print(f"\t{trans['from']:<11} zahlt  {trans['to']:<11} {trans['amount']:.2f} €", file=out)
+
+
+def load_constraints(args):
+    """Read the settlement constraints given on the command line.
+
+    Args:
+        args: Parsed command line arguments
+
+    Returns:
+        SettlementConstraints: The constraints, or None if none were given
+    """
+    if not args.constraints and args.max_transfer is None:
+        return None
+    data = {}
+    if args.constraints:
+        with open(args.constraints, encoding="utf-8") as f:
+            data = json.load(f)
+    if args.max_transfer is not None:
+        data["max_transfer"] = args.max_transfer
+    return SettlementConstraints.from_dict(data)
+
+
+def write_results(manager, args, out, constraints=None):
+    """Write the settlement results in the requested format.
+
+    Args:
+        manager: An ExpenseManager instance
+        args: Parsed command line arguments
+        out: Text file object to write to
+        constraints: Optional SettlementConstraints for the transactions
+    """
+    if args.format == "text":
+        print(manager.get_summary(pairwise=args.pairwise, constraints=constraints), file=out)
+    elif args.export == "balances":
+        export_balances(manager, out, args.format)
+    elif args.export == "expenses":
+        export_expenses(manager, out, args.format)
+    else:
+        export_transactions(
+            manager, out, args.format, pairwise=args.pairwise, constraints=constraints
+        )
+
+
+def write_out_of_core_results(results, args, out):
+    """Write the results of a ledger file settled in bounded memory.
+
+    Args:
+        results: Result of calculate_transactions_streaming
+        args: Parsed command line arguments
+        out: Text file object to write to
+    """
+    if args.format == "text":
+        print("Transaktionen die jetzt folgen müssen:\n", file=out)
+        print_transactions(results["transactions"], out)
+    elif args.export == "balances":
+        balances = results["balances"]
+        rows = iter_balance_rows(balances, balances["balance"])
+        write_rows(rows, out, args.format, BALANCE_FIELDS)
+    else:
+        rows = iter_transaction_rows(results["transactions"])
+        write_rows(rows, out, args.format, TRANSACTION_FIELDS)
+
+
+def iter_batch_results(registry, paths, pairwise=False):
+    """Settle several ledger files, reporting missing and invalid files on stderr.
+
+    Args:
+        registry: LedgerRegistry the ledgers are loaded through
+        paths: Iterable of paths to ledger files
+        pairwise: If True, the transactions only connect persons who shared costs
+
+    Yields:
+        tuple: Path and result of calculate_transactions for every existing, valid file
+    """
+    for path in paths:
+        try:
+            yield path, registry.transactions(path, pairwise=pairwise)
+        except FileNotFoundError:
+            print(f"{path}: Datei nicht gefunden", file=sys.stderr)
+        except LedgerValidationError as error:
+            print(f"{path}: Ungültige Daten\n{describe_issues(error)}", file=sys.stderr)
+
+
+def write_batch_results(paths, args, out, registry=None):
+    """Settle several ledger files and write the results one after another.
+
+    Ledgers listed more than once are only loaded and settled once.
+
+    Args:
+        paths: Iterable of paths to ledger files
+        args: Parsed command line arguments
+        out: Text file object to write to
+        registry: Optional LedgerRegistry to load the ledgers through
+    """
+    registry = registry or LedgerRegistry()
+    results = iter_batch_results(registry, paths, args.pairwise)
+    if args.format == "text":
+        for path, result in results:
+            print(f"{path}:", file=out)
+            print_transactions(result["transactions"], out)
+        stats = registry.stats()
+        print(
+            f"\nCache: {stats['hits']} Treffer, {stats['misses']} geladen, "
+            f"{stats['evictions']} verdrängt",
+            file=out,
+        )
+        return
+
+    def rows():
+        for path, result in results:
+            if args.export == "balances":
+                balances = result["balances"]
+                ledger_rows = iter_balance_rows(balances, registry.get(path).persons)
+            else:
+                ledger_rows = iter_transaction_rows(result["transactions"])
+            for row in ledger_rows:
+                yield {"ledger": path, **row}
+
+    fields = BALANCE_FIELDS if args.export == "balances" else TRANSACTION_FIELDS
+    write_rows(rows(), out, args.format, ("ledger",) + fields)
+
+
+def write_statement_files(manager, args, constraints=None):
+    """Write the personal statement of every person and report where.
+
+    Args:
+        manager: An ExpenseManager instance
+        args: Parsed command line arguments
+        constraints: Optional SettlementConstraints for the transfers
+    """
+    paths = manager.write_statements(
+        args.directory, args.workers, pairwise=args.pairwise, constraints=constraints
+    )
+    print(f"{len(paths)} Abrechnungen in {args.directory} geschrieben")
+
+
+def merge_files(base, ours, theirs, output):
+    """Merge two edited copies of a ledger file and report conflicts.
+
+    Args:
+        base: Path to the common original version
+        ours: Path to our edited copy
+        theirs: Path to their edited copy
+        output: Path of the merged ledger file to write
+
+    Raises:
+        LedgerValidationError: If an input file or the merged ledger is
+            invalid; nothing is written then
+    """
+    result = merge_ledgers(*(ExpenseManager.load_from_file(path) for path in (base, ours, theirs)))
+    # A change on one side may refer to a group the other side removed
+    issues = fatal_issues(result.manager.validate())
+    if issues:
+        print(
+            f"Die zusammengeführten Daten sind ungültig, {output} wurde nicht geschrieben",
+            file=sys.stderr,
+        )
+        raise LedgerValidationError(issues)
+    result.manager.save_to_file(output)
+    print(
+        f"{output}: {len(result.manager.expenses)} Ausgaben, "
+        f"{len(result.manager.prepayments)} Anzahlungen, {len(result.conflicts)} Konflikte"
+    )
+    for conflict in result.conflicts:
+        print(
+            f"Konflikt in {conflict['section']} ({conflict['key']}): "
+            f"unsere {conflict['ours']}, deren {conflict['theirs']}; "
+            "übernommen wurde unsere bzw. die nicht gelöschte Version",
+            file=sys.stderr,
+        )
+
+
+def main(argv=None):
+    """Run the CLI application.
+
+    Args:
+        argv: Optional list of command line arguments (defaults to sys.argv)
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.export == "expenses" and (args.out_of_core or args.command == "batch"):
+        parser.error("--export expenses ist nur für eine einzelne geladene Datei möglich")
+
+    if args.command == "top" and args.count < 0:
+        parser.error("--count darf nicht negativ sein")
+
+    constrained = args.constraints or args.max_transfer is not None
+    if constrained and (
+        args.pairwise
+        or args.out_of_core
+        or args.command in ("history", "obligations", "batch", "merge", "top")
+    ):
+        parser.error(
+            "--constraints und --max-transfer sind nur für die Abrechnung einer "
+            "geladenen Datei ohne --pairwise möglich"
+        )
+    if args.constraints and not os.path.exists(args.constraints):
+        parser.error(f"Datei nicht gefunden: {args.constraints}")
+
+    if args.buffer_limit is not None and not args.out_of_core:
+        parser.error("--buffer-limit ist nur mit --out-of-core möglich")
+    if args.buffer_limit is not None and args.buffer_limit <= 0:
+        parser.error("--buffer-limit muss größer als 0 sein")
+
+    if args.out_of_core:
+        if (
+            not args.file
+            or args.command in ("history", "obligations", "batch", "merge", "statements", "top")
+            or args.pairwise
+        ):
+            parser.error(
+                "--out-of-core benötigt --file und ist nur für Ergebnisse ohne --pairwise möglich"
+            )
+
+        buffer_limit = args.buffer_limit or DEFAULT_BUFFER_LIMIT
+        try:
+            results = calculate_transactions_streaming(args.file, buffer_limit=buffer_limit)
+        except MemoryError:
+            parser.error(
+                f"Ein einzelner Eintrag in {args.file} ist länger als "
+                f"{buffer_limit} Zeichen (--buffer-limit)"
+            )
+
+        def write(out):
+            write_out_of_core_results(results, args, out)
+
+    elif args.command == "merge":
+        missing = [path for path in (args.base, args.ours, args.theirs) if not os.path.exists(path)]
+        if missing:
+            parser.error(f"Datei nicht gefunden: {', '.join(missing)}")
+        if args.output == "-":
+            parser.error("merge benötigt --output für die zusammengeführte Datei")
+        try:
+            merge_files(args.base, args.ours, args.theirs, args.output)
+        except LedgerValidationError as error:
+            parser.error(f"Ungültige Daten:\n{describe_issues(error)}")
+        return
+    elif args.command == "batch":
+        paths = args.paths or [line.strip() for line in sys.stdin if line.strip()]
+
+        def write(out):
+            write_batch_results(paths, args, out)
+
+    else:
+        try:
+            manager = load_manager(args.file)
+        except LedgerValidationError as error:
+            parser.error(f"Ungültige Daten in {args.file}:\n{describe_issues(error)}")
+        if args.command == "history":
+            print_history(manager)
+            return
+        if args.command == "obligations":
+            print_obligations(manager, args.person)
+            return
 
+        constraints = load_constraints(args)
 
-def main():
-    """Run the CLI application."""
-    # Create an expense manager with default data
-    manager = ExpenseManager.create_with_defaults()
+        def write(out):
+            if args.command == "top":
+                write_top_balances(manager, args, out)
+            else:
+                write_results(manager, args, out, constraints)
 
-    # Generate and print the summary
-    print(manager.get_summary())
+    try:
+        if args.command == "statements":
+            write_statement_files(manager, args, constraints)
+        elif args.output == "-":
+            write(sys.stdout)
+        else:
+            with open(args.output, "w", encoding="utf-8", newline="") as out:
+                write(out)
+    except SettlementInfeasibleError as error:
+        unsettled = ", ".join(
+            f"{person} {amount:.2f} €" for person, amount in error.unsettled.items()
+        )
+        parser.error(f"Ausgleich unter den Einschränkungen nicht möglich, offen: {unsettled}")
 
 
 if __name__ == "__main__":
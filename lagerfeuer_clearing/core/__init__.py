@@ -3,5 +3,6 @@ Core functionality for Lagerfeuer Clearing - an expense sharing tool.
 """
 
 from lagerfeuer_clearing.core.expense_manager import ExpenseManager
+from lagerfeuer_clearing.core.settlement import settle_balances
 
-__all__ = ["ExpenseManager"]
+__all__ = ["ExpenseManager", "settle_balances"]
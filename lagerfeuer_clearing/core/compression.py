@@ -0,0 +1,50 @@
+"""
+Transparent compression of ledger files chosen by file extension.
+"""
+
+import bz2
+import gzip
+import lzma
+import os
+
+# Compression level of gzip; level 9 is several times slower for files that
+# are only a few percent smaller
+GZIP_LEVEL = 6
+
+COMPRESSED_EXTENSIONS = (".gz", ".bz2", ".xz", ".lzma")
+
+
+def is_compressed(filename):
+    """Check whether a ledger file is compressed, judging by its extension.
+
+    Args:
+        filename: Path to the ledger file
+
+    Returns:
+        bool: True for .gz, .bz2, .xz and .lzma files
+    """
+    return os.path.splitext(filename)[1].lower() in COMPRESSED_EXTENSIONS
+
+
+def open_ledger(filename, mode="r"):
+    """Open a ledger file as UTF-8 text, compressing or decompressing on the fly.
+
+    Data passes through the codec in chunks, so neither the compressed nor the
+    uncompressed document has to fit into memory at once.
+
+    Args:
+        filename: Path to the ledger file; the extension selects the codec
+        mode: Either "r" or "w"
+
+    Returns:
+        file object: Text file object to read from or write to
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".gz":
+        return gzip.open(filename, mode + "t", compresslevel=GZIP_LEVEL, encoding="utf-8")
+    if extension == ".bz2":
+        return bz2.open(filename, mode + "t", encoding="utf-8")
+    if extension in (".xz", ".lzma"):
+        file_format = lzma.FORMAT_XZ if extension == ".xz" else lzma.FORMAT_ALONE
+        return lzma.open(filename, mode + "t", format=file_format, encoding="utf-8")
+    return open(filename, mode, encoding="utf-8")
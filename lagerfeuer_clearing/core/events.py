@@ -0,0 +1,105 @@
+"""
+Change events describing modifications of a ledger.
+"""
+
+from collections import namedtuple
+
+EXPENSE_ADDED = "expense_added"
+EXPENSE_UPDATED = "expense_updated"
+EXPENSE_REMOVED = "expense_removed"
+PREPAYMENT_ADDED = "prepayment_added"
+PREPAYMENT_UPDATED = "prepayment_updated"
+PREPAYMENT_REMOVED = "prepayment_removed"
+PERSON_ADDED = "person_added"
+PERSON_REMOVED = "person_removed"
+GROUP_ADDED = "group_added"
+GROUP_CHANGED = "group_changed"
+GROUP_REMOVED = "group_removed"
+GROUP_RENAMED = "group_renamed"
+SETTLEMENT_RECORDED = "settlement_recorded"
+
+ChangeEvent = namedtuple("ChangeEvent", ("kind", "key", "value", "old"), defaults=(None, None))
+ChangeEvent.__doc__ = """A single change of a ledger.
+
+Attributes:
+    kind: One of the event kind constants of this module
+    key: Index of the expense, prepayment, person or settlement, or the
+        name of the group (the old name for GROUP_RENAMED)
+    value: The new record, person name, member list or group definition
+        (the new name for GROUP_RENAMED)
+    old: The replaced or removed record, member list or group definition
+"""
+
+
+def _collection(kind):
+    """Return the collection and the action of an event kind."""
+    collection, _, action = kind.rpartition("_")
+    return collection, action
+
+
+def coalesce(events):
+    """Merge events of one batch that describe successive changes of the same item.
+
+    Subscribers that apply the result in order end up in the same state as
+    with the original events:
+
+    - an update following the addition or an update of the same expense or
+      prepayment is merged into the earlier event, as long as no record was
+      added or removed in between,
+    - a record or person that is removed right after being added is dropped,
+    - a group that is removed and added again with the same members under
+      another name becomes a single GROUP_RENAMED event,
+    - successive changes of a group are merged.
+
+    Args:
+        events: List of ChangeEvent in the order they happened
+
+    Returns:
+        list: The coalesced events
+    """
+    result = []
+    # Position in result of the last event per (collection, index) and per
+    # group name that later events of the same item may be merged into
+    records = {}
+    groups = {}
+    removed_groups = {}
+    for event in events:
+        collection, action = _collection(event.kind)
+        if collection in ("expense", "prepayment", "person"):
+            key = (collection, event.key)
+            position = records.get(key)
+            if action == "updated" and position is not None:
+                result[position] = result[position]._replace(value=event.value)
+                continue
+            if action == "removed" and position == len(result) - 1:
+                if _collection(result[position].kind)[1] == "added":
+                    result.pop()
+                    records.pop(key)
+                    continue
+            if action != "updated":
+                # Indexes of the collection shift
+                records = {k: v for k, v in records.items() if k[0] != collection}
+            if action != "removed":
+                # A later event at the index of a removed item concerns the next item
+                records[key] = len(result)
+            result.append(event)
+        elif collection == "group":
+            position = groups.get(event.key)
+            if action == "changed" and position is not None:
+                result[position] = result[position]._replace(value=event.value)
+                continue
+            renamed = removed_groups.pop(id(event.value), None) if action == "added" else None
+            if renamed is not None and result[renamed].key != event.key:
+                old_name = result[renamed].key
+                result[renamed] = ChangeEvent(GROUP_RENAMED, old_name, event.key)
+                groups.pop(old_name, None)
+                continue
+            if action == "removed":
+                removed_groups[id(event.old)] = len(result)
+                groups.pop(event.key, None)
+            else:
+                groups[event.key] = len(result)
+            result.append(event)
+        else:
+            result.append(event)
+    return result
@@ -3,27 +3,130 @@ Core class for expense tracking and calculation to support shared expense manage
 """
 
 from collections import defaultdict
+from contextlib import contextmanager
+import functools
+import heapq
+from itertools import islice
 import json
 import os
 
+from lagerfeuer_clearing.core.compression import is_compressed, open_ledger
+from lagerfeuer_clearing.core.events import (
+    EXPENSE_ADDED,
+    EXPENSE_REMOVED,
+    EXPENSE_UPDATED,
+    GROUP_ADDED,
+    GROUP_CHANGED,
+    GROUP_REMOVED,
+    PERSON_ADDED,
+    PERSON_REMOVED,
+    PREPAYMENT_ADDED,
+    PREPAYMENT_REMOVED,
+    PREPAYMENT_UPDATED,
+    SETTLEMENT_RECORDED,
+    ChangeEvent,
+    coalesce,
+)
+from lagerfeuer_clearing.core.groups import GroupResolver, depends_on
+from lagerfeuer_clearing.core.history import History
+from lagerfeuer_clearing.core.ids import assign_ids, new_record_id
+from lagerfeuer_clearing.core.obligations import ObligationMatrix, settle_obligations
+from lagerfeuer_clearing.core.parallel import (
+    calculate_balances_parallel,
+    partial_totals,
+    split_group_totals,
+)
+from lagerfeuer_clearing.core.query import IdIndex, PrefixIndex, RecordIndex
+from lagerfeuer_clearing.core.ranking import rank_balances
+from lagerfeuer_clearing.core.recurrence import (
+    INTERVAL_LABELS,
+    expand_expense,
+    expense_total,
+    occurrences,
+    validate_repeat,
+)
+from lagerfeuer_clearing.core.scenarios import ScenarioLedger, evaluate_scenarios
+from lagerfeuer_clearing.core.settlement import EPSILON, settle_balances, settle_constrained
+from lagerfeuer_clearing.core.statements import StatementWriter, write_statements
+from lagerfeuer_clearing.core.streaming import read_ledger
+from lagerfeuer_clearing.core.timeline import BalanceTimeline, format_date
+from lagerfeuer_clearing.core.tracker import BalanceTracker
+from lagerfeuer_clearing.core.validation import (
+    LedgerValidationError,
+    fatal_issues,
+    validate_ledger,
+)
+
+# Event kinds for inserting, setting and deleting list entries
+_EVENT_KINDS = {
+    "expenses": (EXPENSE_ADDED, EXPENSE_UPDATED, EXPENSE_REMOVED),
+    "prepayments": (PREPAYMENT_ADDED, PREPAYMENT_UPDATED, PREPAYMENT_REMOVED),
+    "persons": (PERSON_ADDED, None, PERSON_REMOVED),
+}
+
 
 class ExpenseManager:
     """Core class to handle expense tracking and calculations for group expenses."""
 
-    def __init__(self, persons=None, groups=None, expenses=None, prepayments=None):
+    def __init__(
+        self,
+        persons=None,
+        groups=None,
+        expenses=None,
+        prepayments=None,
+        settlements=None,
+        group_definitions=None,
+    ):
         """Initialize the expense manager with the provided data or empty structures.
 
+        Expenses and prepayments without an "id" get one derived from their
+        content.
+
         Args:
             persons: List of person names
             groups: Dictionary mapping group names to lists of persons
             expenses: List of expense dictionaries
             prepayments: List of prepayment dictionaries
+            settlements: List of executed settlement dictionaries
+            group_definitions: Dictionary mapping derived group names to
+                definitions with "include" and "exclude" lists of group names
         """
         # Initialize with default values if not provided
         self.persons = persons or []
         self.groups = groups or {}
         self.expenses = expenses or []
         self.prepayments = prepayments or []
+        self.settlements = settlements or []
+        self.group_definitions = group_definitions or {}
+        assign_ids(self.expenses)
+        assign_ids(self.prepayments)
+        self._resolver = GroupResolver()
+        self._timeline = None
+        self._obligations = None
+        self._tracker = BalanceTracker()
+        # Persons whose balance changed since the last call to balance_changes,
+        # None if every balance has to be reported
+        self._balance_changes = None
+        self._history = History(self._apply)
+        self._subscribers = []
+        self._pending_events = []
+        self._batch_depth = 0
+        self._indexes = {
+            "expenses": RecordIndex(("person", "group"), text_field="subject"),
+            "prepayments": RecordIndex(("person", "recipient")),
+        }
+        self._ids = {"expenses": IdIndex(), "prepayments": IdIndex()}
+        self._name_indexes = {
+            "persons": PrefixIndex(),
+            "groups": PrefixIndex(),
+            "group_definitions": PrefixIndex(),
+        }
+        # Sum of all executed transfers per person and the persons left with an
+        # open amount after the last settlement
+        self._settled = defaultdict(float)
+        self._open = set()
+        for settlement in self.settlements:
+            self._apply_settlement(settlement["transactions"])
 
     @classmethod
     def create_with_defaults(cls):
@@ -71,26 +174,64 @@ class ExpenseManager:
     def load_from_file(cls, filename):
         """Load data from a JSON file.
 
+        Files ending in .gz, .bz2, .xz or .lzma are decompressed while reading.
+        The data is validated once while loading, so a file referring to
+        unknown groups or containing invalid values is rejected before any
+        calculation.
+
         Args:
             filename: Path to the JSON file to load
 
         Returns:
             ExpenseManager: An instance initialized with data from the file or defaults if file not found
+
+        Raises:
+            LedgerValidationError: If the file contains issues other than
+                persons missing from the person list
         """
         if os.path.exists(filename):
-            with open(filename, "r", encoding="utf-8") as f:
-                saved_data = json.load(f)
+            with open_ledger(filename) as f:
+                # Decompressed text is parsed record by record instead of being
+                # read completely, plain files are parsed faster by json.load
+                saved_data = read_ledger(f) if is_compressed(filename) else json.load(f)
+            # Checked before the records are indexed, so a broken file fails fast
+            issues = fatal_issues(
+                validate_ledger(
+                    saved_data["persons"],
+                    saved_data["groups"],
+                    saved_data["expenses"],
+                    saved_data["prepayments"],
+                    saved_data.get("group_definitions", {}),
+                )
+            )
+            if issues:
+                raise LedgerValidationError(issues)
             return cls(
                 saved_data["persons"],
                 {k: v for k, v in saved_data["groups"].items()},
                 saved_data["expenses"],
                 saved_data["prepayments"],
+                saved_data.get("settlements", []),
+                saved_data.get("group_definitions", {}),
             )
         return cls.create_with_defaults()
 
+    def validate(self):
+        """Check that all records refer to existing persons and groups and have valid values.
+
+        Returns:
+            list: Issues as described for LedgerValidationError; empty if the
+                ledger is valid
+        """
+        return validate_ledger(
+            self.persons, self.groups, self.expenses, self.prepayments, self.group_definitions
+        )
+
     def save_to_file(self, filename):
         """Save data to a JSON file.
 
+        Files ending in .gz, .bz2, .xz or .lzma are compressed while writing.
+
         Args:
             filename: Path where to save the JSON file
         """
@@ -100,7 +241,11 @@ class ExpenseManager:
             "expenses": self.expenses,
             "prepayments": self.prepayments,
         }
-        with open(filename, "w", encoding="utf-8") as f:
+        if self.settlements:
+            data["settlements"] = self.settlements
+        if self.group_definitions:
+            data["group_definitions"] = self.group_definitions
+        with open_ledger(filename, "w") as f:
             json.dump(data, f, ensure_ascii=False, indent=4)
 
     def add_person(self, person, group=None):
@@ -110,10 +255,12 @@ class ExpenseManager:
             person: Name of the person to add
             group: Optional group name to add the person to
         """
-        if person not in self.persons:
-            self.persons.append(person)
-        if group and group in self.groups and person not in self.groups[group]:
-            self.groups[group].append(person)
+        with self.batch():
+            if person not in self.persons:
+                self._execute(("insert", "persons", len(self.persons), person))
+            if group and group in self.groups and person not in self.groups[group]:
+                members = self.groups[group]
+                self._execute(("insert", ("groups", group), len(members), person))
 
     def remove_person_from_group(self, person, group):
         """Remove a person from a group.
@@ -126,12 +273,14 @@ class ExpenseManager:
             group: Group name to remove the person from
         """
         if group in self.groups and person in self.groups[group]:
-            self.groups[group].remove(person)
-            # If the person is not in any group anymore, remove from persons list
-            if not any(person in members for members in self.groups.values()):
-                self.persons.remove(person)
+            with self.batch():
+                position = self.groups[group].index(person)
+                self._execute(("delete", ("groups", group), position))
+                # If the person is not in any group anymore, remove from persons list
+                if not any(person in members for members in self.groups.values()):
+                    self._execute(("delete", "persons", self.persons.index(person)))
 
-    def add_or_update_expense(self, person, amount, group, subject, index=None):
+    def add_or_update_expense(self, person, amount, group, subject, index=None, date=None):
         """Add a new expense or update an existing one at the given index.
 
         Args:
@@ -140,12 +289,93 @@ class ExpenseManager:
             group: Name of the group to split the expense among
             subject: Description of what the expense was for
             index: Optional index for updating an existing expense
+            date: Optional date of the expense; an update without a date keeps the old one
+
+        Raises:
+            ValueError: If the group has no members to split the expense among
+        """
+        self._check_splittable(group)
+        expense = {"person": person, "amount": amount, "group": group, "subject": subject}
+        if index is not None and 0 <= index < len(self.expenses):
+            previous = self.expenses[index]
+            self._apply_date(expense, date, previous)
+            if "repeat" in previous:
+                # An update keeps the schedule of a recurring expense
+                expense["repeat"] = previous["repeat"]
+            expense["id"] = previous["id"]
+            self._execute(("set", "expenses", index, expense))
+        else:
+            self._apply_date(expense, date)
+            expense["id"] = new_record_id()
+            self._execute(("insert", "expenses", len(self.expenses), expense))
+
+    def update_expense_by_id(self, record_id, person, amount, group, subject, date=None):
+        """Update the expense with the given id.
+
+        Args:
+            record_id: Id of the expense
+            person: Name of the person who paid
+            amount: Amount paid
+            group: Name of the group to split the expense among
+            subject: Description of what the expense was for
+            date: Optional date of the expense; an update without a date keeps the old one
+
+        Returns:
+            bool: True if an expense with this id exists
+        """
+        index = self.expense_index(record_id)
+        if index is None:
+            return False
+        self.add_or_update_expense(person, amount, group, subject, index, date)
+        return True
+
+    def add_recurring_expense(
+        self, person, amount, group, subject, start, every="day", count=None, until=None, index=None
+    ):
+        """Add a new recurring expense or replace an existing expense with one.
+
+        The expense is stored as a single record, no matter how often it occurs.
+
+        Args:
+            person: Name of the person who pays
+            amount: Amount paid per occurrence
+            group: Name of the group to split the expense among
+            subject: Description of what the expense is for
+            start: Date of the first occurrence
+            every: Interval between occurrences, "day", "week" or "month"
+            count: Number of occurrences
+            until: Date of the last possible occurrence, instead of a count
+            index: Optional index of an existing expense to replace
+
+        Raises:
+            ValueError: If the schedule is invalid or the group has no members
         """
+        self._check_splittable(group)
+        repeat = {"every": every}
+        if count is not None:
+            repeat["count"] = count
+        if until is not None:
+            repeat["until"] = format_date(until)
+        validate_repeat(repeat)
         expense = {"person": person, "amount": amount, "group": group, "subject": subject}
+        self._apply_date(expense, start)
+        expense["repeat"] = repeat
         if index is not None and 0 <= index < len(self.expenses):
-            self.expenses[index] = expense
+            expense["id"] = self.expenses[index]["id"]
+            self._execute(("set", "expenses", index, expense))
         else:
-            self.expenses.append(expense)
+            expense["id"] = new_record_id()
+            self._execute(("insert", "expenses", len(self.expenses), expense))
+
+    def iter_expanded_expenses(self):
+        """Iterate over all expenses with recurring expenses expanded into single ones.
+
+        Yields:
+            tuple: Index of the stored expense and a single expense dictionary
+        """
+        for index, expense in enumerate(self.expenses):
+            for single in expand_expense(expense):
+                yield index, single
 
     def remove_expense(self, index):
         """Remove an expense at the given index.
@@ -154,9 +384,35 @@ class ExpenseManager:
             index: Index of the expense to remove
         """
         if 0 <= index < len(self.expenses):
-            del self.expenses[index]
+            self._execute(("delete", "expenses", index))
+
+    def remove_expense_by_id(self, record_id):
+        """Remove the expense with the given id.
+
+        Args:
+            record_id: Id of the expense to remove
+
+        Returns:
+            bool: True if an expense with this id existed
+        """
+        index = self.expense_index(record_id)
+        if index is None:
+            return False
+        self._execute(("delete", "expenses", index))
+        return True
 
-    def add_or_update_prepayment(self, person, amount, recipient, index=None):
+    def expense_index(self, record_id):
+        """Return the current index of the expense with the given id.
+
+        Args:
+            record_id: Id of the expense
+
+        Returns:
+            int: Index in the expenses list, or None if there is no such expense
+        """
+        return self._ids["expenses"].position(self.expenses, record_id)
+
+    def add_or_update_prepayment(self, person, amount, recipient, index=None, date=None):
         """Add a new prepayment or update an existing one at the given index.
 
         Args:
@@ -164,12 +420,36 @@ class ExpenseManager:
             amount: Amount paid
             recipient: Name of the person who received the payment
             index: Optional index for updating an existing prepayment
+            date: Optional date of the prepayment; an update without a date keeps the old one
         """
         prepayment = {"person": person, "amount": amount, "recipient": recipient}
         if index is not None and 0 <= index < len(self.prepayments):
-            self.prepayments[index] = prepayment
+            self._apply_date(prepayment, date, self.prepayments[index])
+            prepayment["id"] = self.prepayments[index]["id"]
+            self._execute(("set", "prepayments", index, prepayment))
         else:
-            self.prepayments.append(prepayment)
+            self._apply_date(prepayment, date)
+            prepayment["id"] = new_record_id()
+            self._execute(("insert", "prepayments", len(self.prepayments), prepayment))
+
+    def update_prepayment_by_id(self, record_id, person, amount, recipient, date=None):
+        """Update the prepayment with the given id.
+
+        Args:
+            record_id: Id of the prepayment
+            person: Name of the person who paid
+            amount: Amount paid
+            recipient: Name of the person who received the payment
+            date: Optional date of the prepayment; an update without a date keeps the old one
+
+        Returns:
+            bool: True if a prepayment with this id exists
+        """
+        index = self.prepayment_index(record_id)
+        if index is None:
+            return False
+        self.add_or_update_prepayment(person, amount, recipient, index, date)
+        return True
 
     def remove_prepayment(self, index):
         """Remove a prepayment at the given index.
@@ -178,7 +458,33 @@ class ExpenseManager:
             index: Index of the prepayment to remove
         """
         if 0 <= index < len(self.prepayments):
-            del self.prepayments[index]
+            self._execute(("delete", "prepayments", index))
+
+    def remove_prepayment_by_id(self, record_id):
+        """Remove the prepayment with the given id.
+
+        Args:
+            record_id: Id of the prepayment to remove
+
+        Returns:
+            bool: True if a prepayment with this id existed
+        """
+        index = self.prepayment_index(record_id)
+        if index is None:
+            return False
+        self._execute(("delete", "prepayments", index))
+        return True
+
+    def prepayment_index(self, record_id):
+        """Return the current index of the prepayment with the given id.
+
+        Args:
+            record_id: Id of the prepayment
+
+        Returns:
+            int: Index in the prepayments list, or None if there is no such prepayment
+        """
+        return self._ids["prepayments"].position(self.prepayments, record_id)
 
     def rename_group(self, old_name, new_name):
         """Rename a group and update all references to it.
@@ -187,85 +493,765 @@ class ExpenseManager:
             old_name: Original name of the group
             new_name: New name for the group
         """
-        if old_name in self.groups and new_name and new_name not in self.groups:
-            self.groups[new_name] = self.groups.pop(old_name)
-            for expense in self.expenses:
-                if expense["group"] == old_name:
-                    expense["group"] = new_name
+        names = self.group_names()
+        if old_name in names and new_name and new_name not in names:
+            target = "groups" if old_name in self.groups else "group_definitions"
+            with self.batch():
+                value = getattr(self, target)[old_name]
+                self._execute(("pop", target, old_name))
+                self._execute(("put", target, new_name, value))
+                for name, definition in list(self.group_definitions.items()):
+                    renamed = {
+                        key: [new_name if part == old_name else part for part in parts]
+                        for key, parts in definition.items()
+                    }
+                    if renamed != definition:
+                        self._execute(("put", "group_definitions", name, renamed))
+                for index, expense in enumerate(self.expenses):
+                    if expense["group"] == old_name:
+                        self._execute(("set", "expenses", index, {**expense, "group": new_name}))
 
-    def calculate_balances(self):
-        """Calculate what each person paid, owes, and their final balance.
+    def define_group(self, name, include, exclude=()):
+        """Define or redefine a group as the union of groups minus other groups.
+
+        Derived groups can be used for expenses like any other group. Their
+        members are expanded once and cached until one of the groups they are
+        built from changes.
+
+        Args:
+            name: Name of the derived group
+            include: Names of the groups whose members belong to the group
+            exclude: Names of the groups whose members are removed again
+
+        Raises:
+            ValueError: If the name is used by a base group, a referenced group
+                does not exist or the definition would be cyclic
+        """
+        definition = {"include": list(include), "exclude": list(exclude)}
+        if name in self.groups:
+            raise ValueError(f"'{name}' is already a group with explicit members")
+        for part in definition["include"] + definition["exclude"]:
+            if part == name or depends_on(part, name, self.group_definitions):
+                raise ValueError(f"Group definition of '{name}' is cyclic")
+            if part not in self.groups and part not in self.group_definitions:
+                raise ValueError(f"Unknown group '{part}'")
+        self._execute(("put", "group_definitions", name, definition))
+
+    def remove_group_definition(self, name):
+        """Remove a derived group.
+
+        Args:
+            name: Name of the derived group
+
+        Raises:
+            ValueError: If the group is still used by an expense or another definition
+        """
+        if name not in self.group_definitions:
+            return
+        used = any(
+            depends_on(other, name, self.group_definitions)
+            for other in self.group_definitions
+            if other != name
+        )
+        if used or next(self.query_expenses(group=name), None):
+            raise ValueError(f"Group '{name}' is still in use")
+        self._execute(("pop", "group_definitions", name))
+
+    def members(self, group):
+        """Return the flat member list of a base or derived group.
+
+        The returned list must not be modified; use add_person and
+        remove_person_from_group to change base groups.
+
+        Args:
+            group: Name of the group
 
         Returns:
-            dict: Dictionary containing paid, received, owed amounts and final balances
+            list: Names of the group members
+
+        Raises:
+            KeyError: If the group does not exist
         """
-        paid = defaultdict(float)
-        received = defaultdict(float)
-        owes = defaultdict(float)
+        return self._resolver.members(group, self.groups, self.group_definitions)
 
-        # Process expenses
-        for expense in self.expenses:
-            person = expense["person"]
-            amount = expense["amount"]
-            group = self.groups[expense["group"]]
+    def _check_splittable(self, group):
+        """Raise ValueError if an expense cannot be split among an existing group."""
+        if (group in self.groups or group in self.group_definitions) and not self.members(group):
+            raise ValueError(f"Group '{group}' has no members to split an expense among")
 
-            paid[person] += amount
-            per_person = amount / len(group)
-            for member in group:
-                owes[member] += per_person
+    def group_names(self):
+        """Return the names of all base and derived groups.
 
-        # Process prepayments
-        for prepayment in self.prepayments:
-            person = prepayment["person"]
-            amount = prepayment["amount"]
-            recipient = prepayment["recipient"]
+        Returns:
+            list: Group names, base groups first
+        """
+        derived = [name for name in self.group_definitions if name not in self.groups]
+        return list(self.groups) + derived
+
+    def complete_persons(self, prefix, limit=None):
+        """Find the persons whose name starts with a prefix, ignoring case.
+
+        Args:
+            prefix: Text the names have to start with
+            limit: Optional maximum number of names to return
+
+        Returns:
+            list: Matching names in alphabetical order
+        """
+        return self._name_indexes["persons"].complete(self.persons, prefix, limit)
+
+    def complete_groups(self, prefix, limit=None, derived=True):
+        """Find the groups whose name starts with a prefix, ignoring case.
+
+        Args:
+            prefix: Text the names have to start with
+            limit: Optional maximum number of names to return
+            derived: Whether derived groups are included
+
+        Returns:
+            list: Matching names in alphabetical order
+        """
+        names = self._name_indexes["groups"].complete(self.groups, prefix, limit)
+        if not derived:
+            return names
+        derived_names = self._name_indexes["group_definitions"].complete(
+            self.group_definitions, prefix, limit
+        )
+        # A derived group may share its name with a base group
+        merged = dict.fromkeys(heapq.merge(names, derived_names, key=str.casefold))
+        return list(islice(merged, limit))
+
+    def query_expenses(self, payer=None, group=None, text=None):
+        """Find expenses matching all given criteria using the maintained indexes.
+
+        Args:
+            payer: Optional name of the person who paid
+            group: Optional name of the group the expense is split among
+            text: Optional search text; every word must start a word of the subject
+
+        Returns:
+            iterator: Lazy iterator of (index, expense) tuples in list order
+        """
+        return self._indexes["expenses"].search(self.expenses, text=text, person=payer, group=group)
+
+    def query_prepayments(self, payer=None, recipient=None):
+        """Find prepayments matching all given criteria using the maintained indexes.
+
+        Args:
+            payer: Optional name of the person who paid
+            recipient: Optional name of the person who received the payment
+
+        Returns:
+            iterator: Lazy iterator of (index, prepayment) tuples in list order
+        """
+        return self._indexes["prepayments"].search(
+            self.prepayments, person=payer, recipient=recipient
+        )
+
+    def undo(self):
+        """Revert the most recent change.
 
-            paid[person] += amount
-            received[recipient] += amount
+        Returns:
+            bool: True if a change was reverted
+        """
+        with self._collect_events():
+            return self._history.undo()
+
+    def redo(self):
+        """Apply the most recently undone change again.
+
+        Returns:
+            bool: True if a change was applied
+        """
+        with self._collect_events():
+            return self._history.redo()
+
+    @property
+    def can_undo(self):
+        """bool: Whether there is a change that can be undone."""
+        return self._history.can_undo
+
+    @property
+    def can_redo(self):
+        """bool: Whether there is an undone change that can be redone."""
+        return self._history.can_redo
+
+    def snapshot(self):
+        """Return a token for the current state of the ledger.
 
-        # Calculate balance for each person
+        Taking a snapshot does not copy any data.
+
+        Returns:
+            int: Token that can be passed to restore
+        """
+        return self._history.snapshot()
+
+    def restore(self, token):
+        """Return the ledger to the state of a snapshot by undoing or redoing changes.
+
+        Args:
+            token: Token returned by snapshot
+
+        Raises:
+            ValueError: If the snapshot can no longer be reached
+            RuntimeError: If called inside batch()
+        """
+        with self._collect_events():
+            self._history.restore(token)
+
+    def subscribe(self, callback):
+        """Register a callable that is notified about every change of the ledger.
+
+        The callable receives a list of ChangeEvent. All events caused by one
+        call, like add_or_update_expense, rename_group, undo or a batch, are
+        coalesced and delivered together once the call has completed.
+
+        Args:
+            callback: Callable taking a list of change events
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Stop notifying a callable registered with subscribe.
+
+        Args:
+            callback: The registered callable
+        """
+        self._subscribers.remove(callback)
+
+    @contextmanager
+    def batch(self):
+        """Group all changes within the block into one undo step and one batch of events."""
+        with self._collect_events(), self._history.transaction():
+            yield
+
+    @contextmanager
+    def _collect_events(self):
+        """Deliver the change events of all changes within the block at its end."""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._publish()
+
+    def _emit(self, events):
+        """Queue change events, delivering them at once if no batch is open."""
+        self._pending_events.extend(events)
+        if self._batch_depth == 0:
+            self._publish()
+
+    def _publish(self):
+        """Deliver the queued change events to all subscribers."""
+        events, self._pending_events = coalesce(self._pending_events), []
+        if events:
+            for callback in list(self._subscribers):
+                callback(events)
+
+    @staticmethod
+    def _change_events(action, target, key, value, old):
+        """Describe a primitive change as change events."""
+        if isinstance(target, tuple):
+            return [ChangeEvent(GROUP_CHANGED, target[1], value)]
+        if target in ("groups", "group_definitions"):
+            if action == "pop":
+                return [ChangeEvent(GROUP_REMOVED, key, old=old)]
+            return [ChangeEvent(GROUP_ADDED if old is None else GROUP_CHANGED, key, value, old)]
+        added, updated, removed = _EVENT_KINDS[target]
+        if action == "insert":
+            return [ChangeEvent(added, key, value)]
+        if action == "delete":
+            return [ChangeEvent(removed, key, old=old)]
+        if updated is None:
+            return [ChangeEvent(removed, key, old=old), ChangeEvent(added, key, value)]
+        return [ChangeEvent(updated, key, value, old)]
+
+    def _execute(self, op):
+        """Apply a primitive change and record its inverse in the history."""
+        # Subscribers are only notified once the inverse is recorded, so a
+        # failing subscriber cannot leave a change behind that undo misses
+        with self._collect_events():
+            self._history.record(self._apply(op))
+
+    def _apply(self, op):
+        """Apply a primitive change to the ledger.
+
+        Operations are tuples of an action, a target and arguments. Targets are
+        the "persons", "expenses" and "prepayments" lists, the "groups"
+        dictionary or the member list of a group as ("groups", name). Lists
+        support "insert", "delete" and "set" by index, the groups dictionary
+        "put" and "pop" by name.
+
+        Args:
+            op: The operation to apply
+
+        Returns:
+            tuple: The operation reverting the change
+        """
+        action, target, key, *value = op
+        if target in ("groups", "group_definitions"):
+            mapping = getattr(self, target)
+            old = mapping.get(key)
+            if action == "put":
+                mapping[key] = value[0]
+            else:
+                del mapping[key]
+            inverse = ("pop", target, key) if old is None else ("put", target, key, old)
+            if action == "pop":
+                self._name_indexes[target].remove(key)
+            elif old is None:
+                self._name_indexes[target].add(key)
+            self._resolver.invalidate(key)
+            self._tracker.invalidate()
+            self._balance_changes = None
+            self._invalidate_caches()
+            if self._subscribers:
+                self._emit(self._change_events(action, target, key, mapping.get(key), old))
+            return inverse
+
+        if isinstance(target, tuple):
+            records = self.groups[target[1]]
+            self._resolver.invalidate(target[1])
+            self._tracker.invalidate()
+        else:
+            records = getattr(self, target)
+
+        old = records[key] if action != "insert" else None
+        # The totals are updated first, so a record the tracker rejects (e.g.
+        # an expense of a group without members) leaves the ledger unchanged
+        touched = self._track_change(target, old, value[0] if action != "delete" else None)
+        if action == "insert":
+            records.insert(key, value[0])
+            inverse = ("delete", target, key)
+        elif action == "delete":
+            del records[key]
+            inverse = ("insert", target, key, old)
+        else:
+            records[key] = value[0]
+            inverse = ("set", target, key, old)
+
+        if target in self._indexes:
+            self._update_index(self._indexes[target], action, key, old, value, len(records))
+            ids = self._ids[target]
+            if action == "insert":
+                ids.insert(key, value[0].get("id"))
+            elif action == "delete":
+                ids.remove(old.get("id"))
+            else:
+                ids.replace(old.get("id"), value[0].get("id"))
+        elif target == "persons":
+            if old is not None:
+                self._name_indexes[target].remove(old)
+            if action != "delete":
+                self._name_indexes[target].add(value[0])
+        if target == "persons" or self._tracker.stale:
+            self._balance_changes = None
+        elif self._balance_changes is not None:
+            self._balance_changes.update(touched)
+        self._invalidate_caches()
+        if self._subscribers:
+            if isinstance(target, tuple):
+                # Changes of group members report the complete member list
+                new = records
+            else:
+                new = value[0] if value else None
+            self._emit(self._change_events(action, target, key, new, old))
+        return inverse
+
+    def _track_change(self, target, old, new):
+        """Replace the contribution of a record in the tracked totals.
+
+        Args:
+            target: Name of the list the record belongs to
+            old: The record before the change, or None if it is inserted
+            new: The record after the change, or None if it is deleted
+
+        Returns:
+            set: The persons whose totals changed
+
+        Raises:
+            ZeroDivisionError: If an expense is split among a group without
+                members; the totals are left as they were
+        """
+        if target == "expenses":
+            apply = functools.partial(self._tracker.apply_expense, members=self.members)
+        elif target == "prepayments":
+            apply = self._tracker.apply_prepayment
+        else:
+            return set()
+        touched = set()
+        if old is not None:
+            touched |= apply(old, sign=-1)
+        if new is not None:
+            try:
+                touched |= apply(new)
+            except Exception:
+                if old is not None:
+                    apply(old)
+                raise
+        return touched
+
+    @staticmethod
+    def _update_index(index, action, position, old, value, length):
+        """Keep a record index in sync with a primitive list change."""
+        if action == "set":
+            index.remove(position, old)
+            index.add(position, value[0])
+        elif action == "insert" and position == length - 1:
+            index.add(position, value[0])
+        elif action == "delete" and position == length:
+            index.remove(position, old)
+        else:
+            # Inserting or deleting in the middle shifts all later positions
+            index.invalidate()
+
+    @staticmethod
+    def _apply_date(record, date, previous=None):
+        """Store the date on a record, falling back to the date of the record it replaces."""
+        if date is not None:
+            record["date"] = format_date(date)
+        elif previous is not None and "date" in previous:
+            record["date"] = previous["date"]
+
+    def _invalidate_caches(self):
+        """Drop derived data structures after the ledger was modified."""
+        self._timeline = None
+        self._obligations = None
+
+    def _get_timeline(self):
+        """Return the time index over all records, building it if necessary."""
+        if self._timeline is None:
+            self._timeline = BalanceTimeline(self.expenses, self.prepayments, self.members)
+        return self._timeline
+
+    def _get_tracker(self):
+        """Return the incremental balance tracker, rebuilding it if it is stale."""
+        if self._tracker.stale:
+            self._tracker.rebuild(self.expenses, self.prepayments, self.members)
+            # Persons without any records may still have executed transfers
+            self._tracker.changed.update(self._settled)
+        return self._tracker
+
+    def balance_changes(self):
+        """Return the current balance of every person affected since the previous call.
+
+        The balances come from the incrementally maintained totals, so after
+        adding, updating or removing a record only the payer and the group
+        members of that record are reported. The first call and the first call
+        after persons or group members changed report every person.
+
+        Returns:
+            dict: Current balance per affected person
+        """
+        tracker = self._get_tracker()
+        if self._balance_changes is None:
+            persons = self.persons
+        else:
+            known = set(self.persons)
+            persons = [person for person in self._balance_changes if person in known]
+        self._balance_changes = set()
+        return {person: tracker.balance_of(person) for person in persons}
+
+    def rank_balances(self, debtors=False, count=None, threshold=0):
+        """Return the creditors or debtors with the largest open amounts.
+
+        The balances come from the incrementally maintained totals, so
+        repeated queries between changes do not recalculate the ledger.
+
+        Args:
+            debtors: If True, return the persons who have to pay instead of
+                the persons who receive money
+            count: Optional maximum number of persons, e.g. 20 for the 20
+                largest debtors
+            threshold: Only persons with an open amount above this are returned
+
+        Returns:
+            list: (person, balance) tuples ordered by the open amount, largest first
+        """
+        tracker = self._get_tracker()
+        balance = {person: tracker.balance_of(person) for person in self.persons}
+        return rank_balances(balance, debtors, count, threshold)
+
+    def _balances_from_totals(self, paid, received, owes):
+        """Combine per-person totals into the result of calculate_balances."""
         balance = {
             person: paid.get(person, 0) - received.get(person, 0) - owes.get(person, 0)
             for person in self.persons
         }
-
         return {"paid": paid, "received": received, "owes": owes, "balance": balance}
 
-    def calculate_transactions(self):
+    def calculate_balances(self, as_of=None, workers=None):
+        """Calculate what each person paid, owes, and their final balance.
+
+        Args:
+            as_of: Optional date; only records dated up to and including it are
+                considered. Records without a date are always included.
+            workers: Optional number of processes to split the calculation over;
+                small ledgers are still calculated serially
+
+        Returns:
+            dict: Dictionary containing paid, received, owed amounts and final balances
+        """
+        if as_of is not None:
+            return self._balances_from_totals(*self._get_timeline().totals_as_of(as_of))
+        if workers is not None and workers != 1:
+            return calculate_balances_parallel(
+                self.expenses, self.prepayments, self.persons, self.members, workers
+            )
+
+        paid, received, group_totals = partial_totals(self.expenses, self.prepayments)
+        owes = split_group_totals(group_totals, self.members)
+        return self._balances_from_totals(paid, received, owes)
+
+    def calculate_balances_between(self, start=None, end=None):
+        """Calculate paid, received and owed amounts for records within a period.
+
+        Args:
+            start: First date of the period (inclusive), or None for the beginning
+            end: Last date of the period (inclusive), or None for the end
+
+        Returns:
+            dict: Dictionary with the same structure as calculate_balances
+        """
+        return self._balances_from_totals(*self._get_timeline().totals_between(start, end))
+
+    def balance_history(self):
+        """Calculate the balance of every person at the end of each recorded day.
+
+        Returns:
+            list: List of (date, balance dictionary) tuples in chronological order
+        """
+        timeline = self._get_timeline()
+        return [
+            (day, self._balances_from_totals(*timeline.totals_as_of(day))["balance"])
+            for day in timeline.days()
+        ]
+
+    def calculate_transactions(self, workers=None, pairwise=False, constraints=None):
         """Calculate the optimal transactions to settle debts.
 
+        Args:
+            workers: Optional number of processes for calculating the balances
+            pairwise: If True, money is only transferred between persons who
+                shared costs, see calculate_obligations
+            constraints: Optional SettlementConstraints restricting who may pay
+                whom and how much; cannot be combined with pairwise
+
         Returns:
             dict: Dictionary containing balances and optimal transactions
+
+        Raises:
+            ValueError: If both pairwise and constraints are given
+            SettlementInfeasibleError: If the constraints leave some balances unsettled
         """
-        balances = self.calculate_balances()
-        balance = balances["balance"]
+        if pairwise and constraints is not None:
+            raise ValueError("pairwise and constraints cannot be combined")
+        balances = self.calculate_balances(workers=workers)
+        if pairwise:
+            transactions = settle_obligations(self.calculate_obligations())
+        elif constraints is not None:
+            transactions = settle_constrained(balances["balance"], constraints)
+        else:
+            transactions = settle_balances(balances["balance"])
+        return {"balances": balances, "transactions": transactions}
+
+    def calculate_obligations(self):
+        """Calculate how much every person owes every other person.
+
+        The matrix is built once and reused until the ledger changes.
 
-        creditors = [(p, b) for p, b in balance.items() if b > 0]
-        debtors = [(p, -b) for p, b in balance.items() if b < 0]
+        Returns:
+            ObligationMatrix: Gross obligations between all pairs of persons
+        """
+        if self._obligations is None:
+            self._obligations = ObligationMatrix.from_ledger(
+                self.expenses, self.prepayments, self.members
+            )
+        return self._obligations
 
-        transactions = []
-        i, j = 0, 0
-        while i < len(creditors) and j < len(debtors):
-            creditor, credit = creditors[i]
-            debtor, debt = debtors[j]
-            amount = min(credit, debt)
+    def explain_obligation(self, debtor, creditor):
+        """List the records that make one person owe another.
 
-            if amount > 0:
-                transactions.append({"from": debtor, "to": creditor, "amount": amount})
+        Args:
+            debtor: Person who owes the amount
+            creditor: Person the amount is owed to
 
-            creditors[i] = (creditor, credit - amount)
-            debtors[j] = (debtor, debt - amount)
+        Returns:
+            list: Dictionaries with the section ("expenses" or "prepayments"),
+                the index of the record and the share owed because of it
+        """
+        details = []
+        if debtor == creditor:
+            return details
+        groups = {}
+        for index, expense in self.query_expenses(payer=creditor):
+            group = expense["group"]
+            if group not in groups:
+                group_members = self.members(group)
+                groups[group] = len(group_members) if debtor in group_members else 0
+            if groups[group]:
+                share = expense_total(expense) / groups[group]
+                details.append({"section": "expenses", "index": index, "amount": share})
+        for index, prepayment in self.query_prepayments(payer=creditor, recipient=debtor):
+            details.append(
+                {"section": "prepayments", "index": index, "amount": prepayment["amount"]}
+            )
+        return details
 
-            if creditors[i][1] <= 0:
-                i += 1
-            if debtors[j][1] <= 0:
-                j += 1
+    def _statement_args(self, pairwise=False, constraints=None):
+        """Return the arguments of StatementWriter for the current ledger."""
+        results = self.calculate_transactions(pairwise=pairwise, constraints=constraints)
+        groups = {expense["group"] for expense in self.expenses}
+        group_members = {group: self.members(group) for group in groups}
+        return (
+            self.expenses,
+            self.prepayments,
+            group_members,
+            results["balances"],
+            results["transactions"],
+        )
 
-        return {"balances": balances, "transactions": transactions}
+    def get_statement(self, person, pairwise=False, constraints=None):
+        """Generate the personal statement of one person.
+
+        Args:
+            person: Name of the person
+            pairwise: If True, the transfers only connect persons who shared costs
+            constraints: Optional SettlementConstraints for the transfers
+
+        Returns:
+            str: Statement listing the expenses the person paid or shares in,
+                their prepayments, their transfers and their balance
+        """
+        return StatementWriter(*self._statement_args(pairwise, constraints)).statement(person)
+
+    def write_statements(self, directory, workers=None, pairwise=False, constraints=None):
+        """Write the personal statement of every person into a directory.
+
+        The ledger is indexed once by person, so each statement only visits
+        the records of its person; large numbers of statements are written by
+        a process pool.
+
+        Args:
+            directory: Directory for the statements, created if necessary
+            workers: Optional number of worker processes
+            pairwise: If True, the transfers only connect persons who shared costs
+            constraints: Optional SettlementConstraints for the transfers
+
+        Returns:
+            dict: Path of the statement file per person
+        """
+        args = self._statement_args(pairwise, constraints)
+        return write_statements(args, self.persons, directory, workers)
+
+    def evaluate_scenarios(self, scenarios, workers=None):
+        """Calculate balances and transactions for hypothetical edits of the ledger.
+
+        Every scenario is applied as an overlay on the current totals: only the
+        records it edits and the expenses of groups whose members it changes
+        are recalculated, and the ledger itself stays unchanged.
+
+        Args:
+            scenarios: Iterable of Scenario instances
+            workers: Optional number of processes to split large batches over
+
+        Returns:
+            list: Dictionaries with the name, the balances, the change of the
+                balance per affected person and the transactions per scenario
+
+        Raises:
+            KeyError: If a scenario refers to an unknown record id or group
+            ValueError: If a scenario leaves a group with expenses without members
+        """
+        tracker = self._get_tracker()
+        ledger = ScenarioLedger(
+            self.expenses,
+            self.prepayments,
+            self.groups,
+            self.group_definitions,
+            self.persons,
+            (dict(tracker.paid), dict(tracker.received), dict(tracker.owes)),
+            members=self.members,
+            expense_position=self.expense_index,
+            prepayment_position=self.prepayment_index,
+            group_expenses=lambda group: [index for index, _ in self.query_expenses(group=group)],
+        )
+        return evaluate_scenarios(ledger, scenarios, workers)
+
+    def _apply_settlement(self, transactions):
+        """Add executed transfers to the settled amounts per person."""
+        for transaction in transactions:
+            self._settled[transaction["from"]] += transaction["amount"]
+            self._settled[transaction["to"]] -= transaction["amount"]
+
+    def _outstanding(self):
+        """Return the open amount of every person that may have changed since the last settlement."""
+        tracker = self._get_tracker()
+        candidates = tracker.changed | self._open
+        return {
+            person: tracker.balance_of(person) + self._settled.get(person, 0)
+            for person in candidates
+        }
+
+    def calculate_delta_transactions(self):
+        """Calculate the transactions still needed after the recorded settlements.
 
-    def get_summary(self):
+        Only persons whose balance changed since the last recorded settlement
+        (or who were not fully settled by it) are considered, so the result
+        covers just the late changes instead of recomputing all transfers.
+
+        Returns:
+            dict: Dictionary containing the open amount per person and the transactions
+        """
+        outstanding = {
+            person: amount
+            for person, amount in self._outstanding().items()
+            if abs(amount) > EPSILON
+        }
+        transactions = settle_balances(outstanding, EPSILON)
+        return {"delta": outstanding, "transactions": transactions}
+
+    def record_settlement(self, transactions=None, date=None):
+        """Record that a settlement was paid out.
+
+        Args:
+            transactions: Executed transfers; defaults to the result of
+                calculate_delta_transactions
+            date: Optional date of the settlement
+
+        Returns:
+            dict: The recorded settlement
+        """
+        if transactions is None:
+            transactions = self.calculate_delta_transactions()["transactions"]
+        settlement = {"transactions": [dict(t) for t in transactions]}
+        if date is not None:
+            settlement["date"] = format_date(date)
+
+        tracker = self._get_tracker()
+        candidates = tracker.changed | self._open
+        for transaction in settlement["transactions"]:
+            candidates.update((transaction["from"], transaction["to"]))
+        self._apply_settlement(settlement["transactions"])
+        self._open = {
+            person
+            for person in candidates
+            if abs(tracker.balance_of(person) + self._settled.get(person, 0)) > EPSILON
+        }
+        tracker.mark_clean()
+        self.settlements.append(settlement)
+        if self._subscribers:
+            self._emit([ChangeEvent(SETTLEMENT_RECORDED, len(self.settlements) - 1, settlement)])
+        return settlement
+
+    def get_summary(self, pairwise=False, constraints=None):
         """Generate a text summary of expenses, prepayments, and calculations.
 
+        Args:
+            pairwise: If True, the transactions only connect persons who shared costs
+            constraints: Optional SettlementConstraints for the transactions
+
         Returns:
             str: Formatted summary text
         """
@@ -276,28 +1262,41 @@ class ExpenseManager:
         summary.append("\nAusgaben:")
         for expense in self.expenses:
             group_name = expense["group"]
+            if "repeat" in expense:
+                interval = INTERVAL_LABELS[expense["repeat"]["every"]]
+                amount = (
+                    f"{occurrences(expense)}× {interval} {expense['amount']:.2f} € "
+                    f"(insgesamt {expense_total(expense):.2f} €)"
+                )
+                when = f" ab {expense['date']}"
+            else:
+                amount = f"{expense['amount']:.2f} €"
+                when = f" am {expense['date']}" if "date" in expense else ""
             summary.append(
-                f"- {expense['person']} hat {expense['amount']:.2f} € für {expense['subject']} ausgegeben, "
-                f"aufgeteilt auf die Gruppe '{group_name}' ({len(self.groups[group_name])} Personen)."
+                f"- {expense['person']} hat{when} {amount} für {expense['subject']} ausgegeben, "
+                f"aufgeteilt auf die Gruppe '{group_name}' ({len(self.members(group_name))} Personen)."
             )
 
         # Prepayments summary
         summary.append("\nAnzahlungen:")
         for prepayment in self.prepayments:
+            when = f" am {prepayment['date']}" if "date" in prepayment else ""
             summary.append(
-                f"- {prepayment['person']} hat {prepayment['amount']:.2f} € als Anzahlung an {prepayment['recipient']} gezahlt."
+                f"- {prepayment['person']} hat{when} {prepayment['amount']:.2f} € als Anzahlung an {prepayment['recipient']} gezahlt."
             )
 
         summary.append("\n" + "=" * 60)
 
         # Calculated transactions
-        results = self.calculate_transactions()
+        results = self.calculate_transactions(pairwise=pairwise, constraints=constraints)
         balances = results["balances"]
         transactions = results["transactions"]
 
         summary.append("\n\tTransaktionen die jetzt folgen müssen:\n")
         for trans in transactions:
-            summary.append(f"\t{trans['from']:<11} zahlt  {trans['to']:<11} {trans['amount']:.2f} €")
+            summary.append(
+                f"\t{trans['from']:<11} zahlt  {trans['to']:<11} {trans['amount']:.2f} €"
+            )
 
         # Verification summary
         paid = balances["paid"]
@@ -0,0 +1,155 @@
+"""
+Streaming machine-readable export of balances, transactions and expenses.
+"""
+
+import csv
+import json
+
+BALANCE_FIELDS = ("person", "paid", "received", "owes", "balance")
+TRANSACTION_FIELDS = ("from", "to", "amount")
+EXPENSE_FIELDS = ("index", "id", "date", "person", "amount", "group", "subject")
+FORMATS = ("csv", "jsonl")
+
+
+def iter_balance_rows(balances, persons):
+    """Yield one row per person from the result of calculate_balances.
+
+    Args:
+        balances: Dictionary returned by ExpenseManager.calculate_balances
+        persons: Iterable of person names in output order
+
+    Yields:
+        dict: Row with the person and their rounded amounts
+    """
+    for person in persons:
+        yield {
+            "person": person,
+            "paid": round(balances["paid"].get(person, 0.0), 2),
+            "received": round(balances["received"].get(person, 0.0), 2),
+            "owes": round(balances["owes"].get(person, 0.0), 2),
+            "balance": round(balances["balance"].get(person, 0.0), 2),
+        }
+
+
+def iter_transaction_rows(transactions):
+    """Yield one row per transaction.
+
+    Args:
+        transactions: Iterable of transaction dictionaries
+
+    Yields:
+        dict: Row with payer, recipient and rounded amount
+    """
+    for transaction in transactions:
+        yield {
+            "from": transaction["from"],
+            "to": transaction["to"],
+            "amount": round(transaction["amount"], 2),
+        }
+
+
+def iter_expense_rows(expenses):
+    """Yield one row per single expense.
+
+    Args:
+        expenses: Iterable of (index, expense) tuples, e.g. from
+            ExpenseManager.iter_expanded_expenses
+
+    Yields:
+        dict: Row with the index and id of the stored expense and the expense fields
+    """
+    for index, expense in expenses:
+        yield {
+            "index": index,
+            "id": expense.get("id", ""),
+            "date": expense.get("date", ""),
+            "person": expense["person"],
+            "amount": round(expense["amount"], 2),
+            "group": expense["group"],
+            "subject": expense["subject"],
+        }
+
+
+def write_rows(rows, fp, fmt, fields):
+    """Write rows one by one in the given format.
+
+    Args:
+        rows: Iterable of row dictionaries
+        fp: Text file object to write to (open CSV files with newline="")
+        fmt: Either "csv" or "jsonl"
+        fields: Column names in output order
+
+    Returns:
+        int: Number of rows written
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    if fmt == "csv":
+        writer = csv.DictWriter(fp, fieldnames=fields)
+        writer.writeheader()
+        write = writer.writerow
+    elif fmt == "jsonl":
+
+        def write(row):
+            fp.write(json.dumps(row, ensure_ascii=False))
+            fp.write("\n")
+
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    count = 0
+    for row in rows:
+        write(row)
+        count += 1
+    return count
+
+
+def export_balances(manager, fp, fmt="csv"):
+    """Write the balance of every person.
+
+    Args:
+        manager: An ExpenseManager instance
+        fp: Text file object to write to
+        fmt: Either "csv" or "jsonl"
+
+    Returns:
+        int: Number of rows written
+    """
+    rows = iter_balance_rows(manager.calculate_balances(), manager.persons)
+    return write_rows(rows, fp, fmt, BALANCE_FIELDS)
+
+
+def export_transactions(manager, fp, fmt="csv", pairwise=False, constraints=None):
+    """Write the transactions needed to settle all balances.
+
+    Args:
+        manager: An ExpenseManager instance
+        fp: Text file object to write to
+        fmt: Either "csv" or "jsonl"
+        pairwise: If True, the transactions only connect persons who shared costs
+        constraints: Optional SettlementConstraints for the transactions
+
+    Returns:
+        int: Number of rows written
+    """
+    transactions = manager.calculate_transactions(pairwise=pairwise, constraints=constraints)[
+        "transactions"
+    ]
+    rows = iter_transaction_rows(transactions)
+    return write_rows(rows, fp, fmt, TRANSACTION_FIELDS)
+
+
+def export_expenses(manager, fp, fmt="csv"):
+    """Write every single expense, with recurring expenses expanded one row per occurrence.
+
+    Args:
+        manager: An ExpenseManager instance
+        fp: Text file object to write to
+        fmt: Either "csv" or "jsonl"
+
+    Returns:
+        int: Number of rows written
+    """
+    rows = iter_expense_rows(manager.iter_expanded_expenses())
+    return write_rows(rows, fp, fmt, EXPENSE_FIELDS)
@@ -0,0 +1,184 @@
+"""
+Minimum-cost flow on integer capacities for settling under constraints.
+"""
+
+import heapq
+
+_INFINITY = float("inf")
+
+
+class MinCostFlow:
+    """Residual network solved with the primal-dual successive shortest path method.
+
+    Edges are stored in flat lists, every edge directly followed by its
+    reverse edge, so the reverse of edge e is e ^ 1. Node potentials keep
+    the reduced costs non-negative, which allows Dijkstra instead of
+    Bellman-Ford for the shortest paths. After each shortest path search,
+    a blocking flow is pushed along all shortest paths at once, so the
+    number of searches grows with the number of distinct path costs and
+    not with the number of augmenting paths.
+    """
+
+    def __init__(self, nodes):
+        """Initialize a network without edges.
+
+        Args:
+            nodes: Number of nodes, numbered from 0
+        """
+        self.nodes = nodes
+        self._adjacent = [[] for _ in range(nodes)]
+        self._head = []
+        self._capacity = []
+        self._cost = []
+
+    def add_edge(self, tail, head, capacity, cost):
+        """Add a directed edge.
+
+        Args:
+            tail: Node the edge starts at
+            head: Node the edge ends at
+            capacity: Maximum flow over the edge as non-negative integer
+            cost: Non-negative cost per unit of flow
+
+        Returns:
+            int: Number of the edge, for flow_of
+        """
+        edge = len(self._head)
+        self._adjacent[tail].append(edge)
+        self._head.append(head)
+        self._capacity.append(capacity)
+        self._cost.append(cost)
+        self._adjacent[head].append(edge + 1)
+        self._head.append(tail)
+        self._capacity.append(0)
+        self._cost.append(-cost)
+        return edge
+
+    def flow_of(self, edge):
+        """Return the flow over an edge."""
+        return self._capacity[edge ^ 1]
+
+    def _distances(self, source, sink, potential):
+        """Return the reduced shortest path distances from the source in the residual network.
+
+        The search stops after the sink; nodes farther away than the sink
+        cannot lie on a shortest path and keep an infinite distance.
+        """
+        adjacent, heads, capacity, cost = self._adjacent, self._head, self._capacity, self._cost
+        distance = [_INFINITY] * self.nodes
+        distance[source] = 0
+        done = [False] * self.nodes
+        heap = [(0, source)]
+        limit = _INFINITY
+        while heap:
+            dist, node = heapq.heappop(heap)
+            if dist > limit:
+                break
+            if done[node]:
+                continue
+            done[node] = True
+            if node == sink:
+                # Nodes as far away as the sink may still lead to it over free edges
+                limit = dist
+                continue
+            base = dist + potential[node]
+            for edge in adjacent[node]:
+                if capacity[edge]:
+                    head = heads[edge]
+                    candidate = base + cost[edge] - potential[head]
+                    if candidate < distance[head]:
+                        distance[head] = candidate
+                        heapq.heappush(heap, (candidate, head))
+        return [
+            dist if finished else _INFINITY for dist, finished in zip(distance, done, strict=True)
+        ]
+
+    def _blocking_flow(self, source, sink, potential, distance, limit):
+        """Push flow along edges of zero reduced cost until no such path is left."""
+        heads, capacity, cost = self._head, self._capacity, self._cost
+        # Only edges of zero reduced cost into nodes not farther away than the sink are admissible
+        admissible = [
+            [
+                edge
+                for edge in edges
+                if distance[heads[edge]] != _INFINITY
+                and cost[edge] + potential[node] == potential[heads[edge]]
+            ]
+            if distance[node] != _INFINITY
+            else []
+            for node, edges in enumerate(self._adjacent)
+        ]
+        current = [0] * self.nodes
+        on_path = [False] * self.nodes
+        on_path[source] = True
+        path = []
+        node = source
+        pushed = 0
+        while pushed < limit:
+            # Extend the path depth-first, resuming every node at its current edge
+            edges = admissible[node]
+            position = current[node]
+            while position < len(edges):
+                edge = edges[position]
+                if capacity[edge] and not on_path[heads[edge]]:
+                    break
+                position += 1
+            current[node] = position
+            if position == len(edges):
+                if not path:
+                    break
+                # Dead end: retreat and skip the edge leading here
+                on_path[node] = False
+                node = heads[path.pop() ^ 1]
+                current[node] += 1
+                continue
+            path.append(edge)
+            node = heads[edge]
+            on_path[node] = True
+            if node != sink:
+                continue
+
+            amount = min(limit - pushed, *(capacity[edge] for edge in path))
+            saturated = None
+            for position, edge in enumerate(path):
+                capacity[edge] -= amount
+                capacity[edge ^ 1] += amount
+                if saturated is None and not capacity[edge]:
+                    saturated = position
+            pushed += amount
+            if saturated is None:
+                break
+            # Continue from the tail of the first saturated edge
+            for edge in path[saturated:]:
+                on_path[heads[edge]] = False
+            node = heads[path[saturated] ^ 1]
+            del path[saturated:]
+        return pushed
+
+    def solve(self, source, sink, limit=_INFINITY):
+        """Send as much flow as possible from the source to the sink at minimum cost.
+
+        Args:
+            source: Node the flow starts at
+            sink: Node the flow ends at
+            limit: Optional maximum amount of flow
+
+        Returns:
+            tuple: Amount of flow sent and its total cost
+        """
+        potential = [0] * self.nodes
+        flow = 0
+        while flow < limit:
+            distance = self._distances(source, sink, potential)
+            if distance[sink] == _INFINITY:
+                break
+            for node in range(self.nodes):
+                potential[node] += min(distance[node], distance[sink])
+            pushed = self._blocking_flow(source, sink, potential, distance, limit - flow)
+            if not pushed:
+                break
+            flow += pushed
+        cost = sum(
+            self._cost[edge] * self._capacity[edge ^ 1] for edge in range(0, len(self._head), 2)
+        )
+        return flow, cost
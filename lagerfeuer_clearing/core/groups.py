@@ -0,0 +1,120 @@
+"""
+Derived groups defined as unions and differences of other groups.
+"""
+
+from collections import defaultdict
+
+
+class GroupResolver:
+    """Expand derived groups into flat member lists with memoization.
+
+    Base groups map directly to their member lists. A derived group is defined
+    by the groups whose members it includes and the groups whose members it
+    excludes. Expanded members are cached, and every expansion records which
+    groups it depends on, so a change to one group only drops the cached
+    expansions that (transitively) depend on it.
+    """
+
+    def __init__(self):
+        """Initialize an empty resolver."""
+        self._groups = None
+        self._definitions = None
+        self._cache = {}
+        self._dependents = defaultdict(set)
+
+    def _sync(self, groups, definitions):
+        """Drop everything if the resolver is used with different dictionaries."""
+        if groups is not self._groups or definitions is not self._definitions:
+            self._groups = groups
+            self._definitions = definitions
+            self.clear()
+
+    def clear(self):
+        """Drop all cached expansions."""
+        self._cache = {}
+        self._dependents = defaultdict(set)
+
+    def invalidate(self, name):
+        """Drop the cached expansion of a group and of all groups depending on it.
+
+        Args:
+            name: Name of the changed group
+        """
+        pending = [name]
+        while pending:
+            current = pending.pop()
+            self._cache.pop(current, None)
+            pending.extend(self._dependents.pop(current, ()))
+
+    def members(self, name, groups, definitions):
+        """Return the flat member list of a base or derived group.
+
+        Args:
+            name: Name of the group
+            groups: Dictionary mapping base group names to member lists
+            definitions: Dictionary mapping derived group names to definitions
+                with "include" and "exclude" lists of group names
+
+        Returns:
+            list: Members of the group; must not be modified
+
+        Raises:
+            KeyError: If the group or one of its parts does not exist
+            ValueError: If the definition refers back to itself
+        """
+        if name in groups:
+            return groups[name]
+        self._sync(groups, definitions)
+        if name not in self._cache:
+            self._expand(name, groups, definitions, set())
+        return self._cache[name]
+
+    def _expand(self, name, groups, definitions, visiting):
+        """Expand a derived group and all derived groups it depends on."""
+        if name in groups:
+            return groups[name]
+        if name in self._cache:
+            return self._cache[name]
+        if name in visiting:
+            raise ValueError(f"Group definition of '{name}' is cyclic")
+        definition = definitions[name]
+        visiting.add(name)
+
+        members = {}
+        for part in definition.get("include", ()):
+            self._dependents[part].add(name)
+            members.update(dict.fromkeys(self._expand(part, groups, definitions, visiting)))
+        for part in definition.get("exclude", ()):
+            self._dependents[part].add(name)
+            for member in self._expand(part, groups, definitions, visiting):
+                members.pop(member, None)
+
+        visiting.discard(name)
+        self._cache[name] = list(members)
+        return self._cache[name]
+
+
+def depends_on(name, target, definitions):
+    """Check whether a group definition refers to another group, directly or not.
+
+    Args:
+        name: Name of the group whose definition is checked
+        target: Name of the group that might be referenced
+        definitions: Dictionary mapping derived group names to definitions
+
+    Returns:
+        bool: True if target is part of the definition of name
+    """
+    pending = [name]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        if current == target:
+            return True
+        if current in seen or current not in definitions:
+            continue
+        seen.add(current)
+        definition = definitions[current]
+        pending.extend(definition.get("include", ()))
+        pending.extend(definition.get("exclude", ()))
+    return False
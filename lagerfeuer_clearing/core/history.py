@@ -0,0 +1,136 @@
+"""
+Undo/redo history based on a log of inverse operations.
+"""
+
+from contextlib import contextmanager
+from itertools import count
+
+
+class History:
+    """Log of reversible changes with undo, redo and cheap snapshots.
+
+    Changes are primitive operations understood by an apply callable, which
+    performs an operation and returns the operation reverting it. The history
+    only stores these inverse operations together with references to the
+    records they contain, so its memory grows with the size of the changes and
+    not with the size of the ledger. A snapshot is just a position in the log.
+    """
+
+    def __init__(self, apply, max_entries=None):
+        """Initialize an empty history.
+
+        Args:
+            apply: Callable performing an operation and returning its inverse
+            max_entries: Optional number of undo steps to keep
+        """
+        self._apply = apply
+        self._max_entries = max_entries
+        self._serials = count(1)
+        self._undo = []
+        self._redo = []
+        # Serial of the state below the oldest undo step
+        self._base = 0
+        self._pending = None
+        self._depth = 0
+
+    @contextmanager
+    def transaction(self):
+        """Group all operations recorded within the block into one undo step."""
+        if self._depth == 0:
+            self._pending = []
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                ops, self._pending = self._pending, None
+                if ops:
+                    self._push(ops)
+
+    def record(self, inverse):
+        """Record the inverse of an operation that was just applied.
+
+        Args:
+            inverse: Operation reverting the applied change
+        """
+        if self._pending is not None:
+            self._pending.append(inverse)
+        else:
+            self._push([inverse])
+
+    def _push(self, ops):
+        """Add a new undo step and drop everything that could be redone."""
+        self._undo.append((next(self._serials), ops))
+        self._redo.clear()
+        if self._max_entries is not None and len(self._undo) > self._max_entries:
+            self._base = self._undo.pop(0)[0]
+
+    def _replay(self, ops):
+        """Apply logged operations in reverse order and return their inverses."""
+        return [self._apply(op) for op in reversed(ops)]
+
+    @property
+    def can_undo(self):
+        """bool: Whether there is a change that can be undone."""
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        """bool: Whether there is an undone change that can be redone."""
+        return bool(self._redo)
+
+    def undo(self):
+        """Revert the most recent change.
+
+        Returns:
+            bool: True if a change was reverted
+        """
+        if self._depth or not self._undo:
+            return False
+        serial, ops = self._undo.pop()
+        self._redo.append((serial, self._replay(ops)))
+        return True
+
+    def redo(self):
+        """Apply the most recently undone change again.
+
+        Returns:
+            bool: True if a change was applied
+        """
+        if self._depth or not self._redo:
+            return False
+        serial, ops = self._redo.pop()
+        self._undo.append((serial, self._replay(ops)))
+        return True
+
+    def snapshot(self):
+        """Return a token for the current state.
+
+        Returns:
+            int: Token that can be passed to restore
+        """
+        return self._undo[-1][0] if self._undo else self._base
+
+    def restore(self, token):
+        """Undo or redo changes until the state of a snapshot is reached.
+
+        Args:
+            token: Token returned by snapshot
+
+        Raises:
+            ValueError: If the snapshot is no longer reachable, because it was
+                discarded by a new change after undoing or by the entry limit
+            RuntimeError: If called while a transaction is open
+        """
+        if self._depth:
+            raise RuntimeError("Cannot restore a snapshot inside a transaction")
+        if token == self._base or any(serial == token for serial, _ in self._undo):
+            step = self.undo
+        elif any(serial == token for serial, _ in self._redo):
+            step = self.redo
+        else:
+            raise ValueError("Snapshot is no longer part of the history")
+        while self.snapshot() != token:
+            if not step():
+                break
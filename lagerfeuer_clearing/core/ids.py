@@ -0,0 +1,36 @@
+"""
+Stable identifiers of expense and prepayment records.
+"""
+
+from collections import Counter
+import hashlib
+import json
+import uuid
+
+
+def new_record_id():
+    """Return a new identifier that is unique across devices.
+
+    Returns:
+        str: Random identifier as 32 hexadecimal digits
+    """
+    return uuid.uuid4().hex
+
+
+def assign_ids(records):
+    """Give every record without an id one derived from its content.
+
+    Ledgers saved before records had ids get the same ids on every device,
+    so independently edited copies of such a ledger can still be merged
+    record by record. Identical records are numbered in list order.
+
+    Args:
+        records: List of record dictionaries, changed in place
+    """
+    seen = Counter()
+    for record in records:
+        if "id" not in record:
+            content = json.dumps(record, sort_keys=True, ensure_ascii=False)
+            digest = hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+            seen[digest] += 1
+            record["id"] = digest if seen[digest] == 1 else f"{digest}-{seen[digest]}"
@@ -0,0 +1,222 @@
+"""
+Three-way merge of ledgers that were edited independently, e.g. on several devices.
+"""
+
+from collections import Counter, namedtuple
+
+from lagerfeuer_clearing.core.expense_manager import ExpenseManager
+
+# Sections whose records are merged one by one
+RECORD_SECTIONS = ("expenses", "prepayments", "settlements")
+
+MergeResult = namedtuple("MergeResult", ("manager", "conflicts"))
+MergeResult.__doc__ = """Result of merge_ledgers.
+
+Attributes:
+    manager: ExpenseManager with the merged ledger
+    conflicts: List of conflict dictionaries with section, key, base, ours and
+        theirs; the merged ledger contains the version of ours, or the
+        changed version if one side removed the item
+"""
+
+
+def _freeze(value):
+    """Convert a JSON value into a hashable value with the same equality."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def record_key(record):
+    """Return the key that identifies a record across copies of a ledger.
+
+    Records with a stable "id" are identified by it, so a changed record is
+    still recognized as the same one. Other records are identified by their
+    content; changing them is a removal of the old and an addition of the
+    new record.
+
+    Args:
+        record: Record dictionary
+
+    Returns:
+        Hashable key of the record
+    """
+    if "id" in record:
+        return ("id", record["id"])
+    try:
+        return frozenset(record.items())
+    except TypeError:
+        # Nested values like the schedule of a recurring expense
+        return _freeze(record)
+
+
+def _merge_value(base, ours, theirs):
+    """Merge a single item, None meaning absent.
+
+    Returns:
+        tuple: The merged value (None if removed) and whether both sides
+            changed it differently
+    """
+    if ours == theirs or theirs == base:
+        return ours, False
+    if ours == base:
+        return theirs, False
+    # Both changed the item differently; a removal loses against a change
+    return (ours if ours is not None else theirs), True
+
+
+def _conflict(section, key, base, ours, theirs):
+    """Describe a conflict of an item both sides changed differently."""
+    return {"section": section, "key": key, "base": base, "ours": ours, "theirs": theirs}
+
+
+def _merge_records(section, base, ours, theirs, conflicts):
+    """Merge the records of one section in linear time.
+
+    Records keep the order of ours, records added only in theirs follow in
+    their order. Identical records without an id are counted: if both sides
+    added (or removed) copies of the same record, they are assumed to have
+    entered the same change, otherwise the changes of both sides add up.
+    """
+    # Copies usually share a long unchanged beginning, which is taken over
+    # without hashing its records
+    shared = 0
+    for base_record, our_record, their_record in zip(base, ours, theirs, strict=False):
+        if not base_record == our_record == their_record:
+            break
+        shared += 1
+    merged = list(ours[:shared])
+    base, ours, theirs = base[shared:], ours[shared:], theirs[shared:]
+
+    base_keys = [record_key(record) for record in base]
+    our_keys = [record_key(record) for record in ours]
+    their_keys = [record_key(record) for record in theirs]
+    base_count, our_count, their_count = Counter(base_keys), Counter(our_keys), Counter(their_keys)
+    base_records = dict(zip(base_keys, base, strict=True))
+    their_records = dict(zip(their_keys, theirs, strict=True))
+
+    def wanted(key):
+        """Return how often a record should occur in the merged ledger."""
+        count, ours_count, theirs_count = base_count[key], our_count[key], their_count[key]
+        if (ours_count - count) * (theirs_count - count) > 0:
+            if ours_count > count:
+                return max(ours_count, theirs_count)
+            return min(ours_count, theirs_count)
+        return ours_count + theirs_count - count
+
+    taken = Counter()
+    for key, record in zip(our_keys, ours, strict=True):
+        if "id" in record:
+            base_record, their_record = base_records.get(key), their_records.get(key)
+            value, conflict = _merge_value(base_record, record, their_record)
+            if conflict:
+                conflicts.append(
+                    _conflict(section, record["id"], base_record, record, their_record)
+                )
+            if value is not None:
+                merged.append(value)
+        elif their_count[key] == base_count[key]:
+            # Unchanged in theirs, so ours decides
+            merged.append(record)
+        elif taken[key] < wanted(key):
+            taken[key] += 1
+            merged.append(record)
+
+    for key, record in zip(their_keys, theirs, strict=True):
+        if "id" in record:
+            if key in our_count:
+                continue
+            base_record = base_records.get(key)
+            value, conflict = _merge_value(base_record, None, record)
+            if conflict:
+                conflicts.append(_conflict(section, record["id"], base_record, None, record))
+            if value is not None:
+                merged.append(value)
+        elif their_count[key] != base_count[key] and taken[key] < wanted(key):
+            # Copies added by theirs beyond the ones already taken from ours
+            taken[key] += 1
+            merged.append(record)
+    return merged
+
+
+def _merge_names(base, ours, theirs):
+    """Merge two edited copies of a list of unique names."""
+    base, our_names, their_names = set(base), set(ours), set(theirs)
+    merged = [name for name in ours if name in their_names or name not in base]
+    merged.extend(name for name in theirs if name not in our_names and name not in base)
+    return merged
+
+
+def _merge_groups(base, ours, theirs, conflicts):
+    """Merge group member lists, merging the members of groups both sides changed."""
+    merged = {}
+    for name in list(ours) + [name for name in theirs if name not in ours]:
+        base_members, our_members, their_members = base.get(name), ours.get(name), theirs.get(name)
+        if our_members is not None and their_members is not None:
+            merged[name] = _merge_names(base_members or (), our_members, their_members)
+            continue
+        members, conflict = _merge_value(base_members, our_members, their_members)
+        if conflict:
+            conflicts.append(_conflict("groups", name, base_members, our_members, their_members))
+        if members is not None:
+            merged[name] = members
+    return merged
+
+
+def _merge_definitions(base, ours, theirs, conflicts):
+    """Merge the definitions of derived groups as a whole."""
+    merged = {}
+    for name in list(ours) + [name for name in theirs if name not in ours]:
+        values = base.get(name), ours.get(name), theirs.get(name)
+        definition, conflict = _merge_value(*values)
+        if conflict:
+            conflicts.append(_conflict("group_definitions", name, *values))
+        if definition is not None:
+            merged[name] = definition
+    return merged
+
+
+def merge_ledgers(base, ours, theirs):
+    """Merge two ledgers that were both edited starting from a common version.
+
+    Every change made on only one side is taken over. Persons, group members
+    and records without an id are merged as sets, records with an id and
+    group definitions are merged item by item, reporting a conflict if both
+    sides changed the same item differently. All sections are merged with
+    hash maps in time linear in the size of the ledgers. Changes that are
+    valid on their own may not be valid together, e.g. an expense added on
+    one side for a group removed on the other; check the merged ledger with
+    ExpenseManager.validate before saving it.
+
+    Args:
+        base: ExpenseManager with the common original version
+        ours: ExpenseManager with our edited copy
+        theirs: ExpenseManager with their edited copy
+
+    Returns:
+        MergeResult: The merged ledger and the list of conflicts
+    """
+    conflicts = []
+    records = {
+        section: _merge_records(
+            section,
+            getattr(base, section),
+            getattr(ours, section),
+            getattr(theirs, section),
+            conflicts,
+        )
+        for section in RECORD_SECTIONS
+    }
+    manager = ExpenseManager(
+        _merge_names(base.persons, ours.persons, theirs.persons),
+        _merge_groups(base.groups, ours.groups, theirs.groups, conflicts),
+        records["expenses"],
+        records["prepayments"],
+        records["settlements"],
+        _merge_definitions(
+            base.group_definitions, ours.group_definitions, theirs.group_definitions, conflicts
+        ),
+    )
+    return MergeResult(manager, conflicts)
@@ -0,0 +1,214 @@
+"""
+Pairwise obligations between persons and settlement along shared costs.
+"""
+
+from collections import defaultdict
+
+from lagerfeuer_clearing.core.recurrence import expense_total
+from lagerfeuer_clearing.core.settlement import EPSILON
+
+
+class ObligationMatrix:
+    """Sparse matrix of how much each person owes each other person.
+
+    Only pairs of persons that actually shared costs (or exchanged a
+    prepayment) have an entry. The amounts are stored as a dictionary of
+    dictionaries from debtor to creditor to amount, together with the
+    transposed dictionaries, so that both the debts and the claims of a
+    person can be looked up without scanning the matrix.
+    """
+
+    def __init__(self):
+        """Initialize an empty matrix."""
+        self._debts = defaultdict(lambda: defaultdict(float))
+        self._claims = defaultdict(lambda: defaultdict(float))
+
+    @classmethod
+    def from_ledger(cls, expenses, prepayments, members):
+        """Build the obligations of a ledger in a single pass over its records.
+
+        Every group member owes the payer of an expense their share of it, and
+        the recipient of a prepayment owes it back to the payer. Expense
+        amounts are summed per payer and group first, so every group is only
+        expanded once per payer.
+
+        Args:
+            expenses: Iterable of expense dictionaries
+            prepayments: Iterable of prepayment dictionaries
+            members: Callable returning the members of a group name
+
+        Returns:
+            ObligationMatrix: The gross obligations between all persons
+        """
+        matrix = cls()
+        totals = defaultdict(float)
+        for expense in expenses:
+            totals[expense["person"], expense["group"]] += expense_total(expense)
+        for prepayment in prepayments:
+            matrix.add(prepayment["recipient"], prepayment["person"], prepayment["amount"])
+        for (payer, group), total in totals.items():
+            group_members = members(group)
+            share = total / len(group_members)
+            for member in group_members:
+                matrix.add(member, payer, share)
+        return matrix
+
+    def add(self, debtor, creditor, amount):
+        """Add an obligation; obligations of a person to themselves are ignored.
+
+        Args:
+            debtor: Person who owes the amount
+            creditor: Person the amount is owed to
+            amount: Owed amount
+        """
+        if debtor != creditor:
+            self._debts[debtor][creditor] += amount
+            self._claims[creditor][debtor] += amount
+
+    def amount(self, debtor, creditor):
+        """Return how much one person owes another.
+
+        Args:
+            debtor: Person who owes the amount
+            creditor: Person the amount is owed to
+
+        Returns:
+            float: The gross owed amount
+        """
+        return self._debts.get(debtor, {}).get(creditor, 0.0)
+
+    def owed_by(self, debtor):
+        """Return everything a person owes, per creditor.
+
+        Args:
+            debtor: Name of the person
+
+        Returns:
+            dict: Creditor names mapped to the owed amounts
+        """
+        return dict(self._debts.get(debtor, {}))
+
+    def owed_to(self, creditor):
+        """Return everything a person is owed, per debtor.
+
+        Args:
+            creditor: Name of the person
+
+        Returns:
+            dict: Debtor names mapped to the owed amounts
+        """
+        return dict(self._claims.get(creditor, {}))
+
+    def __iter__(self):
+        """Iterate over all obligations as (debtor, creditor, amount) tuples."""
+        for debtor, creditors in self._debts.items():
+            for creditor, amount in creditors.items():
+                yield debtor, creditor, amount
+
+    def __len__(self):
+        """Return the number of pairs with an obligation."""
+        return sum(len(creditors) for creditors in self._debts.values())
+
+    def balances(self):
+        """Return the balance of every person with an obligation.
+
+        Returns:
+            dict: Claims minus debts per person, as in calculate_balances
+        """
+        balance = defaultdict(float)
+        for debtor, creditor, amount in self:
+            balance[creditor] += amount
+            balance[debtor] -= amount
+        return dict(balance)
+
+    def net(self, tolerance=EPSILON):
+        """Offset the obligations of every pair of persons against each other.
+
+        Args:
+            tolerance: Net amounts up to this value are dropped
+
+        Returns:
+            ObligationMatrix: Matrix with at most one direction per pair
+        """
+        netted = ObligationMatrix()
+        for debtor, creditor, amount in self:
+            remaining = amount - self.amount(creditor, debtor)
+            if remaining > tolerance:
+                netted.add(debtor, creditor, remaining)
+        return netted
+
+
+def _cancel_cycles(debts, tolerance):
+    """Reduce every cycle in the debt graph by its smallest amount, in place."""
+    # A single iterative depth-first search. Every person keeps the position
+    # of the debt it follows, which only moves on once that debt is paid off
+    # or leads to a person without cycles, so after cancelling a cycle the
+    # search backtracks to its first paid-off debt and resumes right there.
+    creditors = {debtor: list(owed) for debtor, owed in debts.items()}
+    position = dict.fromkeys(creditors, 0)
+    done = set()
+    for start in creditors:
+        if start in done:
+            continue
+        path = [start]
+        on_path = {start: 0}
+        while path:
+            debtor = path[-1]
+            owed = creditors.get(debtor, ())
+            index = position.get(debtor, 0)
+            if index == len(owed):
+                del on_path[path.pop()]
+                done.add(debtor)
+                continue
+            creditor = owed[index]
+            if creditor in done or creditor not in debts[debtor]:
+                position[debtor] = index + 1
+            elif creditor in on_path:
+                first = on_path[creditor]
+                cycle = path[first:]
+                cycle.append(creditor)
+                edges = [(debts[d], c) for d, c in zip(cycle, cycle[1:], strict=False)]
+                smallest = min(owed_by[c] for owed_by, c in edges)
+                keep = None
+                for length, (owed_by, c) in enumerate(edges, first + 1):
+                    owed_by[c] -= smallest
+                    if owed_by[c] <= tolerance:
+                        del owed_by[c]
+                        if keep is None:
+                            keep = length
+                for person in path[keep:]:
+                    del on_path[person]
+                del path[keep:]
+            else:
+                on_path[creditor] = len(path)
+                path.append(creditor)
+
+
+def settle_obligations(matrix, tolerance=EPSILON):
+    """Calculate transactions that only transfer money between persons owing each other.
+
+    The obligations of every pair are netted first. Circular debts like A
+    owes B, B owes C and C owes A are then reduced by their smallest amount
+    until no cycle is left, which removes at least one transfer per cycle
+    while every person still pays and receives their exact balance. All
+    cycles are cancelled in one depth-first search over the debts, so this
+    takes O(V + E) plus the length of the cancelled cycles.
+
+    Args:
+        matrix: ObligationMatrix with the gross obligations
+        tolerance: Amounts up to this value are treated as settled
+
+    Returns:
+        list: List of transaction dictionaries with from, to and amount keys
+    """
+    debts = {}
+    for debtor, creditor, amount in matrix.net(tolerance):
+        debts.setdefault(debtor, {})[creditor] = amount
+
+    _cancel_cycles(debts, tolerance)
+
+    return [
+        {"from": debtor, "to": creditor, "amount": amount}
+        for debtor, creditors in debts.items()
+        for creditor, amount in creditors.items()
+    ]
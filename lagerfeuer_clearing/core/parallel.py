@@ -0,0 +1,141 @@
+"""
+Parallel balance calculation for large ledgers using a process pool.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+from lagerfeuer_clearing.core.recurrence import expense_total
+
+# Ledgers with fewer records are calculated serially, because starting the
+# worker processes costs more than the calculation itself
+MIN_PARALLEL_RECORDS = 200_000
+
+# Records of the ledger, set once per worker process by the pool initializer
+_ledger = None
+
+
+def _init_worker(expenses, prepayments):
+    """Store the ledger in the worker process."""
+    global _ledger
+    _ledger = (expenses, prepayments)
+
+
+def partial_totals(expenses, prepayments):
+    """Sum up paid and received amounts per person and expense amounts per group.
+
+    Args:
+        expenses: Iterable of expense dictionaries
+        prepayments: Iterable of prepayment dictionaries
+
+    Returns:
+        tuple: Dictionaries of paid and received amounts per person and of
+            expense totals per group
+    """
+    paid = defaultdict(float)
+    received = defaultdict(float)
+    group_totals = defaultdict(float)
+    for expense in expenses:
+        amount = expense_total(expense) if "repeat" in expense else expense["amount"]
+        paid[expense["person"]] += amount
+        group_totals[expense["group"]] += amount
+    for prepayment in prepayments:
+        paid[prepayment["person"]] += prepayment["amount"]
+        received[prepayment["recipient"]] += prepayment["amount"]
+    return paid, received, group_totals
+
+
+def split_group_totals(group_totals, members):
+    """Split expense totals per group evenly among the group members.
+
+    Summing up amounts per group first and splitting them once is equivalent
+    to splitting every single expense, but independent of the group sizes.
+
+    Args:
+        group_totals: Dictionary mapping group names to expense totals
+        members: Callable returning the members of a group name
+
+    Returns:
+        defaultdict: Owed amount per person
+    """
+    owes = defaultdict(float)
+    for group, total in group_totals.items():
+        group_members = members(group)
+        per_person = total / len(group_members)
+        for member in group_members:
+            owes[member] += per_person
+    return owes
+
+
+def _range_totals(ranges):
+    """Calculate the partial totals of a slice of the ledger in a worker."""
+    (expense_start, expense_stop), (prepayment_start, prepayment_stop) = ranges
+    expenses, prepayments = _ledger
+    return partial_totals(
+        expenses[expense_start:expense_stop], prepayments[prepayment_start:prepayment_stop]
+    )
+
+
+def _split(length, parts):
+    """Split a range of the given length into consecutive (start, stop) pairs."""
+    size = -(-length // parts) if length else 0
+    return [(min(i * size, length), min((i + 1) * size, length)) for i in range(parts)]
+
+
+def calculate_balances_parallel(
+    expenses, prepayments, persons, members, workers=None, min_records=MIN_PARALLEL_RECORDS
+):
+    """Calculate balances by splitting the ledger over several processes.
+
+    Every worker receives the ledger once when it starts (without copying on
+    platforms that fork) and then sums up its share of the records. The
+    partial totals are merged and expense totals are split among the group
+    members at the end, so group definitions are only needed in this process.
+
+    Args:
+        expenses: List of expense dictionaries
+        prepayments: List of prepayment dictionaries
+        persons: List of person names
+        members: Callable returning the members of a group name
+        workers: Number of worker processes (defaults to the number of CPUs)
+        min_records: Ledgers with fewer records are calculated serially
+
+    Returns:
+        dict: Dictionary with the same structure as ExpenseManager.calculate_balances
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(expenses) + len(prepayments) < min_records:
+        partials = [partial_totals(expenses, prepayments)]
+    else:
+        ranges = list(
+            zip(_split(len(expenses), workers), _split(len(prepayments), workers), strict=True)
+        )
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(expenses, prepayments),
+        ) as executor:
+            partials = list(executor.map(_range_totals, ranges))
+
+    paid = defaultdict(float)
+    received = defaultdict(float)
+    group_totals = defaultdict(float)
+    for partial_paid, partial_received, partial_groups in partials:
+        for person, amount in partial_paid.items():
+            paid[person] += amount
+        for person, amount in partial_received.items():
+            received[person] += amount
+        for group, amount in partial_groups.items():
+            group_totals[group] += amount
+
+    owes = split_group_totals(group_totals, members)
+    balance = {
+        person: paid.get(person, 0) - received.get(person, 0) - owes.get(person, 0)
+        for person in persons
+    }
+    return {"paid": paid, "received": received, "owes": owes, "balance": balance}
@@ -0,0 +1,367 @@
+"""
+Secondary indexes for querying and addressing expense and prepayment records.
+"""
+
+from bisect import bisect_left, insort
+from collections import defaultdict
+import re
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split a text into lowercase search tokens.
+
+    Args:
+        text: Text to split
+
+    Returns:
+        list: The tokens in order of appearance
+    """
+    return _TOKEN.findall(text.casefold())
+
+
+class RecordIndex:
+    """Secondary indexes from field values to record positions.
+
+    Every indexed field maps its values to the set of positions of records
+    with that value. An optional text field is additionally split into tokens
+    which are stored in an inverted index with a sorted vocabulary, so that
+    tokens can be searched by prefix.
+    """
+
+    def __init__(self, fields, text_field=None):
+        """Initialize an empty index.
+
+        Args:
+            fields: Names of the record fields to index by value
+            text_field: Optional name of a field to index by tokens
+        """
+        self.fields = tuple(fields)
+        self.text_field = text_field
+        self.stale = True
+        self.size = 0
+        self._postings = {}
+        self._tokens = defaultdict(set)
+        self._vocabulary = []
+
+    def rebuild(self, records):
+        """Index all records from scratch.
+
+        Args:
+            records: List of record dictionaries
+        """
+        self._postings = {field: defaultdict(set) for field in self.fields}
+        self._tokens = defaultdict(set)
+        self._vocabulary = []
+        self.size = 0
+        self.stale = False
+        for position, record in enumerate(records):
+            self.add(position, record)
+
+    def invalidate(self):
+        """Mark the index as outdated so the next query rebuilds it."""
+        self.stale = True
+
+    def add(self, position, record):
+        """Add a record at the given position.
+
+        Args:
+            position: Position of the record in its list
+            record: Record dictionary
+        """
+        if self.stale:
+            return
+        for field in self.fields:
+            self._postings[field][record.get(field)].add(position)
+        if self.text_field:
+            for token in set(tokenize(record.get(self.text_field, ""))):
+                if not self._tokens[token]:
+                    insort(self._vocabulary, token)
+                self._tokens[token].add(position)
+        self.size += 1
+
+    def remove(self, position, record):
+        """Remove a record from the given position.
+
+        Args:
+            position: Position of the record in its list
+            record: Record dictionary
+        """
+        if self.stale:
+            return
+        for field in self.fields:
+            self._postings[field][record.get(field)].discard(position)
+        if self.text_field:
+            for token in set(tokenize(record.get(self.text_field, ""))):
+                self._tokens[token].discard(position)
+                if not self._tokens[token]:
+                    del self._tokens[token]
+                    del self._vocabulary[bisect_left(self._vocabulary, token)]
+        self.size -= 1
+
+    def _text_positions(self, token):
+        """Return the positions of records containing a token starting with the given prefix."""
+        positions = set()
+        index = bisect_left(self._vocabulary, token)
+        while index < len(self._vocabulary) and self._vocabulary[index].startswith(token):
+            positions |= self._tokens[self._vocabulary[index]]
+            index += 1
+        return positions
+
+    def search(self, records, text=None, **criteria):
+        """Find records matching all given criteria.
+
+        Args:
+            records: List of record dictionaries the index was built for
+            text: Optional search text; every token must prefix a token of the text field
+            **criteria: Field names mapped to the required value; None values are ignored
+
+        Yields:
+            tuple: Position and record dictionary of each match in list order
+        """
+        if self.stale or self.size != len(records):
+            self.rebuild(records)
+
+        candidates = [
+            self._postings[field].get(value, set())
+            for field, value in criteria.items()
+            if value is not None
+        ]
+        if text:
+            candidates.extend(self._text_positions(token) for token in tokenize(text))
+        if not candidates:
+            yield from enumerate(records)
+            return
+
+        candidates.sort(key=len)
+        smallest, others = candidates[0], candidates[1:]
+        for position in sorted(smallest):
+            if all(position in other for other in others):
+                yield position, records[position]
+
+
+class PrefixIndex:
+    """Sorted index of names for case-insensitive completion by prefix.
+
+    The names are kept in a list sorted by their case-folded form, so the
+    matches of a prefix form a contiguous range that is found by bisection.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self.stale = True
+        self._entries = []
+
+    def rebuild(self, names):
+        """Index all names from scratch.
+
+        Args:
+            names: Iterable of names
+        """
+        self._entries = sorted((name.casefold(), name) for name in names)
+        self.stale = False
+
+    def invalidate(self):
+        """Mark the index as outdated so the next completion rebuilds it."""
+        self.stale = True
+
+    def add(self, name):
+        """Add a name.
+
+        Args:
+            name: Name to add
+        """
+        if not self.stale:
+            insort(self._entries, (name.casefold(), name))
+
+    def remove(self, name):
+        """Remove a name.
+
+        Args:
+            name: Name to remove
+        """
+        if self.stale:
+            return
+        entry = (name.casefold(), name)
+        position = bisect_left(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            del self._entries[position]
+
+    def complete(self, names, prefix, limit=None):
+        """Find the names starting with a prefix, ignoring case.
+
+        Args:
+            names: Collection of names the index was built for
+            prefix: Text the names have to start with
+            limit: Optional maximum number of names to return
+
+        Returns:
+            list: Matching names in case-insensitive alphabetical order
+        """
+        if self.stale or len(self._entries) != len(names):
+            self.rebuild(names)
+        prefix = prefix.casefold()
+        position = bisect_left(self._entries, (prefix,))
+        stop = len(self._entries) if limit is None else min(position + limit, len(self._entries))
+        matches = []
+        for key, name in self._entries[position:stop]:
+            if not key.startswith(prefix):
+                break
+            matches.append(name)
+        return matches
+
+
+class IdIndex:
+    """Map from stable record ids to their current positions.
+
+    Every record occupies a slot in insertion order. Removing a record only
+    marks its slot as a tombstone, so the slots of all other records stay
+    valid, and a Fenwick tree over the live slots turns a slot into the
+    current list position in logarithmic time. Undoing a removal revives the
+    tombstone. The slots are compacted once tombstones outnumber the records.
+    """
+
+    # Tombstones tolerated before compacting regardless of the number of records
+    MIN_COMPACTION = 64
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self.stale = True
+        self.size = 0
+        self._slots = []
+        self._slot_of = {}
+        self._tombstones = {}
+        self._tree = [0]
+
+    def rebuild(self, records):
+        """Index all records from scratch.
+
+        Args:
+            records: List of record dictionaries with an "id" field
+        """
+        self._build([record.get("id") for record in records])
+
+    def _build(self, ids):
+        """Fill the slots with the given live ids in list order."""
+        self._slots = list(ids)
+        self._slot_of = {record_id: slot for slot, record_id in enumerate(self._slots)}
+        self._tombstones = {}
+        self.size = len(self._slots)
+        # Fenwick tree in linear time: every node passes its sum on to its parent
+        self._tree = [0] + [1] * self.size
+        for node in range(1, self.size + 1):
+            parent = node + (node & -node)
+            if parent <= self.size:
+                self._tree[parent] += self._tree[node]
+        self.stale = False
+
+    def invalidate(self):
+        """Mark the index as outdated so the next lookup rebuilds it."""
+        self.stale = True
+
+    def _add(self, slot, delta):
+        """Add a delta to the live count of a slot."""
+        node = slot + 1
+        while node < len(self._tree):
+            self._tree[node] += delta
+            node += node & -node
+
+    def _live_before(self, slot):
+        """Count the live slots before the given slot."""
+        count = 0
+        node = slot
+        while node:
+            count += self._tree[node]
+            node -= node & -node
+        return count
+
+    def _append(self, record_id):
+        """Add an id in a new slot after all others."""
+        self._slots.append(record_id)
+        self._slot_of[record_id] = len(self._slots) - 1
+        node = len(self._slots)
+        # The new node covers itself and the nodes of its range below it
+        total = 1
+        child = node - 1
+        while child > node - (node & -node):
+            total += self._tree[child]
+            child -= child & -child
+        self._tree.append(total)
+        self.size += 1
+
+    def insert(self, position, record_id):
+        """Register a record inserted at the given position.
+
+        Args:
+            position: Position of the record in its list
+            record_id: Id of the record
+        """
+        if self.stale:
+            return
+        if record_id in self._slot_of:
+            # Duplicate ids are resolved by the next rebuild
+            self.stale = True
+            return
+        slot = self._tombstones.pop(record_id, None)
+        if slot is not None and self._live_before(slot) == position:
+            self._slots[slot] = record_id
+            self._slot_of[record_id] = slot
+            self._add(slot, 1)
+            self.size += 1
+        elif position == self.size:
+            self._append(record_id)
+        else:
+            # Slots cannot be inserted in the middle
+            self.stale = True
+
+    def remove(self, record_id):
+        """Register the removal of a record, leaving a tombstone in its slot.
+
+        Args:
+            record_id: Id of the removed record
+        """
+        slot = None if self.stale else self._slot_of.pop(record_id, None)
+        if slot is None:
+            self.stale = True
+            return
+        self._slots[slot] = None
+        self._tombstones[record_id] = slot
+        self._add(slot, -1)
+        self.size -= 1
+        if len(self._tombstones) > max(self.MIN_COMPACTION, self.size):
+            self._build([record_id for record_id in self._slots if record_id is not None])
+
+    def replace(self, old_id, new_id):
+        """Register that a record was replaced by one with another id.
+
+        Args:
+            old_id: Id of the replaced record
+            new_id: Id of the new record
+        """
+        if self.stale or old_id == new_id:
+            return
+        slot = self._slot_of.pop(old_id, None)
+        if slot is None or new_id in self._slot_of:
+            self.stale = True
+            return
+        self._slots[slot] = new_id
+        self._slot_of[new_id] = slot
+
+    def position(self, records, record_id):
+        """Find the current position of a record.
+
+        Args:
+            records: List of record dictionaries the index was built for
+            record_id: Id of the record
+
+        Returns:
+            int: Position of the record in the list, or None if there is none
+                with this id
+        """
+        if self.stale or self.size != len(records):
+            self.rebuild(records)
+        slot = self._slot_of.get(record_id)
+        if slot is None:
+            return None
+        return self._live_before(slot)
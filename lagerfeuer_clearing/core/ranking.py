@@ -0,0 +1,34 @@
+"""
+Selection of the largest creditors and debtors without sorting all balances.
+"""
+
+import heapq
+
+from lagerfeuer_clearing.core.settlement import EPSILON
+
+
+def rank_balances(balance, debtors=False, count=None, threshold=0):
+    """Select the creditors or debtors with the largest open amounts.
+
+    With a count, a heap of that size is kept while scanning the balances,
+    so selecting k persons out of n takes O(n log k) instead of sorting all
+    of them.
+
+    Args:
+        balance: Dictionary mapping persons to their balance, positive for
+            money still to be received and negative for money still to be paid
+        debtors: If True, select the persons who have to pay instead of the
+            persons who receive money
+        count: Optional maximum number of persons to return
+        threshold: Only persons with an open amount above this are selected
+
+    Returns:
+        list: (person, balance) tuples ordered by the open amount, largest
+            first; persons with equal amounts keep their order in balance
+    """
+    sign = -1 if debtors else 1
+    limit = max(threshold, EPSILON)
+    candidates = ((person, amount) for person, amount in balance.items() if sign * amount > limit)
+    if count is None:
+        return sorted(candidates, key=lambda item: -sign * item[1])
+    return heapq.nlargest(count, candidates, key=lambda item: sign * item[1])
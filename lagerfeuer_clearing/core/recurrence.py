@@ -0,0 +1,143 @@
+"""
+Recurring expenses stored as a single record with a schedule.
+
+A recurring expense is an ordinary expense record with the ISO "date" of its
+first occurrence and an additional "repeat" entry, e.g.
+{"every": "day", "count": 14} or {"every": "week", "until": "2024-08-31"}.
+Its amount is the amount of a single occurrence. Totals are calculated from
+the number of occurrences, individual rows are only created when needed.
+"""
+
+import calendar
+from datetime import datetime, time, timedelta
+
+INTERVALS = ("day", "week", "month")
+
+# Labels of the intervals in summaries and the GUI
+INTERVAL_LABELS = {"day": "täglich", "week": "wöchentlich", "month": "monatlich"}
+
+_STEPS = {"day": timedelta(days=1), "week": timedelta(weeks=1)}
+
+
+def validate_repeat(repeat):
+    """Check that a schedule is complete and consistent.
+
+    Args:
+        repeat: Dictionary with "every" and either "count" or "until"
+
+    Raises:
+        ValueError: If the schedule is invalid
+    """
+    if repeat.get("every") not in INTERVALS:
+        raise ValueError(f"Unknown interval '{repeat.get('every')}', expected one of {INTERVALS}")
+    if ("count" in repeat) == ("until" in repeat):
+        raise ValueError("A recurring expense needs either a count or an end date")
+    if "count" in repeat and (not isinstance(repeat["count"], int) or repeat["count"] < 1):
+        raise ValueError("The count of a recurring expense must be a positive integer")
+
+
+def _add_months(moment, months):
+    """Move a datetime by whole months, clamping the day to the end of the month."""
+    month_index = moment.month - 1 + months
+    year, month = moment.year + month_index // 12, month_index % 12 + 1
+    day = min(moment.day, calendar.monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def _occurrence(start, every, number):
+    """Return the time of the occurrence with the given number, starting at 0."""
+    if every == "month":
+        return _add_months(start, number)
+    return start + number * _STEPS[every]
+
+
+def _count_until(start, every, moment):
+    """Count the occurrences of an unlimited schedule up to and including a moment."""
+    if moment < start:
+        return 0
+    if every == "month":
+        months = (moment.year - start.year) * 12 + moment.month - start.month
+        if _add_months(start, months) > moment:
+            months -= 1
+        return months + 1
+    return (moment - start) // _STEPS[every] + 1
+
+
+def _end(repeat):
+    """Return the last moment covered by the ISO end date of a schedule."""
+    until = datetime.fromisoformat(repeat["until"])
+    if len(repeat["until"]) == 10:
+        return datetime.combine(until.date(), time.max)
+    return until
+
+
+def occurrences(expense, moment=None):
+    """Count how often an expense occurs, in total or up to a moment.
+
+    Args:
+        expense: Expense dictionary, recurring or not
+        moment: Optional datetime; only occurrences up to and including it count
+
+    Returns:
+        int: Number of occurrences
+    """
+    repeat = expense.get("repeat")
+    if repeat is None:
+        if moment is None or not expense.get("date"):
+            return 1
+        return int(datetime.fromisoformat(expense["date"]) <= moment)
+    start = datetime.fromisoformat(expense["date"])
+    if "count" in repeat:
+        total = repeat["count"]
+    else:
+        total = _count_until(start, repeat["every"], _end(repeat))
+    if moment is None:
+        return total
+    return min(total, _count_until(start, repeat["every"], moment))
+
+
+def expense_total(expense):
+    """Return the total amount of an expense over all its occurrences.
+
+    Args:
+        expense: Expense dictionary, recurring or not
+
+    Returns:
+        float: Amount times the number of occurrences
+    """
+    if "repeat" not in expense:
+        return expense["amount"]
+    return expense["amount"] * occurrences(expense)
+
+
+def occurrence_dates(expense):
+    """Iterate over the dates of all occurrences of a recurring expense.
+
+    Args:
+        expense: Recurring expense dictionary
+
+    Yields:
+        datetime: Time of each occurrence in order
+    """
+    repeat = expense["repeat"]
+    start = datetime.fromisoformat(expense["date"])
+    for number in range(occurrences(expense)):
+        yield _occurrence(start, repeat["every"], number)
+
+
+def expand_expense(expense):
+    """Iterate over the individual expenses a record stands for.
+
+    Args:
+        expense: Expense dictionary, recurring or not
+
+    Yields:
+        dict: One expense per occurrence without a schedule
+    """
+    if "repeat" not in expense:
+        yield expense
+        return
+    single = {key: value for key, value in expense.items() if key != "repeat"}
+    whole_days = len(expense["date"]) == 10
+    for when in occurrence_dates(expense):
+        yield {**single, "date": (when.date() if whole_days else when).isoformat()}
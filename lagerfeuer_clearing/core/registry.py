@@ -0,0 +1,199 @@
+"""
+Cache of loaded ledgers for tools and services that work with many files.
+"""
+
+from collections import OrderedDict
+import os
+import sys
+import threading
+
+from lagerfeuer_clearing.core.expense_manager import ExpenseManager
+
+# Number of records whose size is measured to estimate the size of a ledger
+_SAMPLE_SIZE = 100
+
+
+def _sample_size(records):
+    """Estimate the memory used by a list of flat dictionaries."""
+    size = sys.getsizeof(records)
+    if not records:
+        return size
+    step = max(1, len(records) // _SAMPLE_SIZE)
+    sample = records[::step][:_SAMPLE_SIZE]
+    measured = sum(
+        sys.getsizeof(record) + sum(sys.getsizeof(value) for value in record.values())
+        for record in sample
+    )
+    return size + measured * len(records) // len(sample)
+
+
+def estimate_size(manager):
+    """Estimate the memory used by the data of an expense manager.
+
+    Args:
+        manager: An ExpenseManager instance
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    size = sum(sys.getsizeof(person) for person in manager.persons)
+    for members in manager.groups.values():
+        size += sys.getsizeof(members)
+    return size + _sample_size(manager.expenses) + _sample_size(manager.prepayments)
+
+
+class _Entry:
+    """A loaded ledger together with results calculated from it."""
+
+    def __init__(self, key, manager, size):
+        """Initialize the entry.
+
+        Args:
+            key: Path, modification time and size of the file
+            manager: The loaded ExpenseManager
+            size: Estimated memory of the ledger in bytes
+        """
+        self.key = key
+        self.manager = manager
+        self.size = size
+        self.results = {}
+        # Results are dropped as soon as the manager is modified
+        manager.subscribe(lambda events: self.results.clear())
+
+
+class LedgerRegistry:
+    """Least recently used cache of loaded ledgers.
+
+    Ledgers are cached by their absolute path together with the modification
+    time and size of the file, so a changed file is loaded again on the next
+    access. The cache is bounded by the number of ledgers and optionally by
+    their estimated memory; the least recently used ledgers are evicted first.
+    All methods may be called from several threads.
+    """
+
+    def __init__(self, max_entries=16, max_bytes=None, loader=ExpenseManager.load_from_file):
+        """Initialize an empty registry.
+
+        Args:
+            max_entries: Maximum number of cached ledgers
+            max_bytes: Optional limit for the estimated memory of all cached ledgers
+            loader: Callable loading an ExpenseManager from a path
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._loader = loader
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _key(path):
+        """Return the cache key of a file.
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size
+
+    def _entry(self, path):
+        """Return the cache entry of a file, loading it if necessary."""
+        key = self._key(path)
+        with self._lock:
+            entry = self._entries.get(key[0])
+            if entry is not None and entry.key == key:
+                self._entries.move_to_end(key[0])
+                self._hits += 1
+                return entry
+            self._misses += 1
+
+        # Load without holding the lock, so other ledgers stay available
+        manager = self._loader(key[0])
+        entry = _Entry(key, manager, estimate_size(manager))
+        with self._lock:
+            old = self._entries.pop(key[0], None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key[0]] = entry
+            self._bytes += entry.size
+            self._evict()
+        return entry
+
+    def _evict(self):
+        """Drop least recently used ledgers until the limits are met again."""
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self._evictions += 1
+
+    def get(self, path):
+        """Return the expense manager of a ledger file.
+
+        The returned manager is shared with other callers of the registry.
+
+        Args:
+            path: Path to the ledger file
+
+        Returns:
+            ExpenseManager: The loaded manager
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+        """
+        return self._entry(path).manager
+
+    def transactions(self, path, pairwise=False):
+        """Return the settlement of a ledger file, calculating it only once.
+
+        Args:
+            path: Path to the ledger file
+            pairwise: If True, the transactions only connect persons who shared costs
+
+        Returns:
+            dict: Result of ExpenseManager.calculate_transactions
+        """
+        entry = self._entry(path)
+        key = ("transactions", pairwise)
+        results = entry.results.get(key)
+        if results is None:
+            results = entry.manager.calculate_transactions(pairwise=pairwise)
+            entry.results[key] = results
+        return results
+
+    def invalidate(self, path=None):
+        """Drop a cached ledger, or all of them.
+
+        Args:
+            path: Optional path of the ledger to drop
+        """
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                entry = self._entries.pop(os.path.realpath(path), None)
+                if entry is not None:
+                    self._bytes -= entry.size
+
+    def stats(self):
+        """Return usage statistics of the registry.
+
+        Returns:
+            dict: Number of hits, misses, evictions, cached ledgers and their
+                estimated size in bytes
+        """
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,381 @@
+"""
+What-if scenarios evaluated as overlays on a ledger without copying it.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+
+from lagerfeuer_clearing.core.groups import GroupResolver, depends_on
+from lagerfeuer_clearing.core.recurrence import expense_total
+from lagerfeuer_clearing.core.settlement import EPSILON, settle_balances
+
+# Batches with fewer scenarios are evaluated serially, because starting the
+# worker processes costs more than the evaluation itself
+MIN_PARALLEL_SCENARIOS = 1_000
+
+# Ledger of the batch, set once per worker process by the pool initializer
+_ledger = None
+
+
+class Scenario:
+    """A set of hypothetical edits of a ledger.
+
+    Records are addressed by their ids. The edits are only stored; the ledger
+    itself is never changed by a scenario.
+    """
+
+    def __init__(self, name=None):
+        """Initialize a scenario without edits.
+
+        Args:
+            name: Optional name reported with the results
+        """
+        self.name = name
+        # Record ids mapped to changed fields, or to None for removed records
+        self.expenses = {}
+        self.prepayments = {}
+        self.added_expenses = []
+        self.added_prepayments = []
+        # Base groups mapped to their hypothetical member lists
+        self.groups = {}
+        self.leaving = set()
+
+    def update_expense(self, record_id, **changes):
+        """Change fields of an expense, e.g. group="Fahrgemeinschaft".
+
+        Args:
+            record_id: Id of the expense
+            **changes: Field names mapped to their hypothetical values
+        """
+        self.expenses[record_id] = {**(self.expenses.get(record_id) or {}), **changes}
+
+    def remove_expense(self, record_id):
+        """Leave out an expense.
+
+        Args:
+            record_id: Id of the expense
+        """
+        self.expenses[record_id] = None
+
+    def add_expense(self, person, amount, group, subject):
+        """Add a hypothetical expense.
+
+        Args:
+            person: Name of the person who pays
+            amount: Amount paid
+            group: Name of the group to split the expense among
+            subject: Description of the expense
+        """
+        self.added_expenses.append(
+            {"person": person, "amount": amount, "group": group, "subject": subject}
+        )
+
+    def update_prepayment(self, record_id, **changes):
+        """Change fields of a prepayment.
+
+        Args:
+            record_id: Id of the prepayment
+            **changes: Field names mapped to their hypothetical values
+        """
+        self.prepayments[record_id] = {**(self.prepayments.get(record_id) or {}), **changes}
+
+    def remove_prepayment(self, record_id):
+        """Leave out a prepayment.
+
+        Args:
+            record_id: Id of the prepayment
+        """
+        self.prepayments[record_id] = None
+
+    def add_prepayment(self, person, amount, recipient):
+        """Add a hypothetical prepayment.
+
+        Args:
+            person: Name of the person who pays
+            amount: Amount paid
+            recipient: Name of the person who receives the payment
+        """
+        self.added_prepayments.append({"person": person, "amount": amount, "recipient": recipient})
+
+    def set_members(self, group, members):
+        """Replace the members of a base group.
+
+        Args:
+            group: Name of the base group
+            members: Hypothetical list of members
+        """
+        self.groups[group] = list(members)
+
+    def remove_person(self, person):
+        """Take a person out of every base group, e.g. because they leave early.
+
+        Args:
+            person: Name of the person
+        """
+        self.leaving.add(person)
+
+
+class ScenarioLedger:
+    """Read-only view of a ledger with its current totals for evaluating scenarios.
+
+    Only the records touched by a scenario are looked at: the edited records
+    and the expenses of groups whose members change. Their contributions are
+    subtracted from the current totals and added again in their hypothetical
+    form. Lookups by id and by group come from the indexes of the expense
+    manager if given, otherwise they are built once when first needed.
+    """
+
+    def __init__(
+        self,
+        expenses,
+        prepayments,
+        groups,
+        definitions,
+        persons,
+        totals,
+        members=None,
+        expense_position=None,
+        prepayment_position=None,
+        group_expenses=None,
+    ):
+        """Initialize the view.
+
+        Args:
+            expenses: List of expense dictionaries
+            prepayments: List of prepayment dictionaries
+            groups: Dictionary mapping base group names to member lists
+            definitions: Dictionary mapping derived group names to definitions
+            persons: List of person names
+            totals: Current paid, received and owed amounts per person
+            members: Optional callable returning the members of a group name
+            expense_position: Optional callable returning the position of an expense id
+            prepayment_position: Optional callable returning the position of a prepayment id
+            group_expenses: Optional callable returning the positions of the
+                expenses of a group name
+        """
+        self.expenses = expenses
+        self.prepayments = prepayments
+        self.groups = groups
+        self.definitions = definitions
+        self.persons = persons
+        self.totals = totals
+        self._resolver = GroupResolver()
+        self._members = members
+        self._expense_position = expense_position
+        self._prepayment_position = prepayment_position
+        self._group_expenses = group_expenses
+        self._positions = None
+
+    def portable(self):
+        """Return the arguments recreating the view in another process."""
+        return (
+            self.expenses,
+            self.prepayments,
+            self.groups,
+            self.definitions,
+            self.persons,
+            self.totals,
+        )
+
+    def members(self, group):
+        """Return the current members of a group."""
+        if self._members is not None:
+            return self._members(group)
+        return self._resolver.members(group, self.groups, self.definitions)
+
+    def _build_positions(self):
+        """Build the lookups that were not given by the expense manager."""
+        expense_ids = {record.get("id"): position for position, record in enumerate(self.expenses)}
+        prepayment_ids = {
+            record.get("id"): position for position, record in enumerate(self.prepayments)
+        }
+        by_group = defaultdict(list)
+        for position, record in enumerate(self.expenses):
+            by_group[record["group"]].append(position)
+        self._positions = (expense_ids, prepayment_ids, by_group)
+
+    def expense_position(self, record_id):
+        """Return the position of an expense id, or None."""
+        if self._expense_position is not None:
+            return self._expense_position(record_id)
+        if self._positions is None:
+            self._build_positions()
+        return self._positions[0].get(record_id)
+
+    def prepayment_position(self, record_id):
+        """Return the position of a prepayment id, or None."""
+        if self._prepayment_position is not None:
+            return self._prepayment_position(record_id)
+        if self._positions is None:
+            self._build_positions()
+        return self._positions[1].get(record_id)
+
+    def group_expenses(self, group):
+        """Return the positions of the expenses split among a group."""
+        if self._group_expenses is not None:
+            return self._group_expenses(group)
+        if self._positions is None:
+            self._build_positions()
+        return self._positions[2].get(group, ())
+
+    def _scenario_groups(self, scenario):
+        """Return the hypothetical base groups and the groups whose members changed."""
+        groups = dict(self.groups)
+        groups.update(scenario.groups)
+        for name, group_members in groups.items():
+            if scenario.leaving.intersection(group_members):
+                groups[name] = [
+                    member for member in group_members if member not in scenario.leaving
+                ]
+        changed = {name for name in groups if groups[name] != self.groups.get(name)}
+        changed |= {
+            name
+            for name in self.definitions
+            if any(depends_on(name, group, self.definitions) for group in changed)
+        }
+        return groups, changed
+
+    def evaluate(self, scenario):
+        """Calculate the balances and transfers of the ledger with the edits of a scenario.
+
+        Args:
+            scenario: Scenario to evaluate
+
+        Returns:
+            dict: Name of the scenario, balances like calculate_balances, the
+                change of the balance per affected person and the transactions
+
+        Raises:
+            KeyError: If the scenario refers to an unknown record id or group
+            ValueError: If an expense would be split among a group without members
+        """
+        groups, changed_groups = self._scenario_groups(scenario)
+        resolver = GroupResolver()
+
+        def new_members(group):
+            """Return the hypothetical members of a group."""
+            return resolver.members(group, groups, self.definitions)
+
+        delta_paid = defaultdict(float)
+        delta_received = defaultdict(float)
+        delta_owes = defaultdict(float)
+
+        def apply_expense(expense, members, sign):
+            """Add or subtract the contribution of an expense."""
+            amount = sign * expense_total(expense)
+            group_members = members(expense["group"])
+            if not group_members:
+                raise ValueError(
+                    f"Scenario '{scenario.name}' leaves group '{expense['group']}' without "
+                    f"members, but the expense '{expense.get('subject')}' is split among it"
+                )
+            delta_paid[expense["person"]] += amount
+            for member in group_members:
+                delta_owes[member] += amount / len(group_members)
+
+        def apply_prepayment(prepayment, sign):
+            """Add or subtract the contribution of a prepayment."""
+            delta_paid[prepayment["person"]] += sign * prepayment["amount"]
+            delta_received[prepayment["recipient"]] += sign * prepayment["amount"]
+
+        edited = {}
+        for record_id, changes in scenario.expenses.items():
+            position = self.expense_position(record_id)
+            if position is None:
+                raise KeyError(f"Unknown expense id '{record_id}'")
+            edited[position] = None if changes is None else {**self.expenses[position], **changes}
+        touched = set(edited)
+        for group in changed_groups:
+            touched.update(self.group_expenses(group))
+        for position in touched:
+            expense = self.expenses[position]
+            apply_expense(expense, self.members, -1)
+            expense = edited.get(position, expense)
+            if expense is not None:
+                apply_expense(expense, new_members, 1)
+        for expense in scenario.added_expenses:
+            apply_expense(expense, new_members, 1)
+
+        for record_id, changes in scenario.prepayments.items():
+            position = self.prepayment_position(record_id)
+            if position is None:
+                raise KeyError(f"Unknown prepayment id '{record_id}'")
+            prepayment = self.prepayments[position]
+            apply_prepayment(prepayment, -1)
+            if changes is not None:
+                apply_prepayment({**prepayment, **changes}, 1)
+        for prepayment in scenario.added_prepayments:
+            apply_prepayment(prepayment, 1)
+
+        paid, received, owes = self.totals
+        affected = list(dict.fromkeys([*delta_paid, *delta_received, *delta_owes]))
+        known = set(self.persons)
+        persons = list(self.persons) + [person for person in affected if person not in known]
+        balances = {
+            "paid": {person: paid.get(person, 0) + delta_paid.get(person, 0) for person in persons},
+            "received": {
+                person: received.get(person, 0) + delta_received.get(person, 0)
+                for person in persons
+            },
+            "owes": {person: owes.get(person, 0) + delta_owes.get(person, 0) for person in persons},
+        }
+        balances["balance"] = {
+            person: balances["paid"][person]
+            - balances["received"][person]
+            - balances["owes"][person]
+            for person in persons
+        }
+        delta = {}
+        for person in affected:
+            change = delta_paid[person] - delta_received[person] - delta_owes[person]
+            if abs(change) > EPSILON:
+                delta[person] = change
+        return {
+            "name": scenario.name,
+            "balances": balances,
+            "delta": delta,
+            "transactions": settle_balances(balances["balance"], EPSILON),
+        }
+
+
+def _init_worker(args):
+    """Store the ledger in the worker process."""
+    global _ledger
+    _ledger = ScenarioLedger(*args)
+
+
+def _evaluate(scenario):
+    """Evaluate a scenario in a worker."""
+    return _ledger.evaluate(scenario)
+
+
+def evaluate_scenarios(ledger, scenarios, workers=None, min_scenarios=MIN_PARALLEL_SCENARIOS):
+    """Evaluate many scenarios on the same ledger.
+
+    Args:
+        ledger: ScenarioLedger of the current ledger
+        scenarios: Iterable of Scenario instances
+        workers: Optional number of worker processes; small batches are
+            evaluated serially
+        min_scenarios: Batches with fewer scenarios are evaluated serially
+
+    Returns:
+        list: Result of ScenarioLedger.evaluate per scenario, in order
+    """
+    scenarios = list(scenarios)
+    workers = workers or 1
+    if workers == 1 or len(scenarios) < min_scenarios:
+        return [ledger.evaluate(scenario) for scenario in scenarios]
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    chunk_size = max(1, len(scenarios) // (4 * min(workers, os.cpu_count() or 1)))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(ledger.portable(),),
+    ) as executor:
+        return list(executor.map(_evaluate, scenarios, chunksize=chunk_size))
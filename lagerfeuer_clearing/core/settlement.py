@@ -0,0 +1,220 @@
+"""
+Settlement algorithms turning per-person balances into transactions.
+"""
+
+from lagerfeuer_clearing.core.flow import MinCostFlow
+
+# Amounts below this threshold are treated as settled when working with
+# incrementally updated balances, which accumulate floating point noise.
+EPSILON = 1e-9
+
+
+def settle_balances(balance, tolerance=0.0):
+    """Calculate transactions that settle the given balances.
+
+    Creditors (positive balance) are paid by debtors (negative balance) in
+    order, which needs at most one transaction less than there are persons
+    with a non-zero balance.
+
+    Args:
+        balance: Dictionary mapping person names to their balance
+        tolerance: Balances with an absolute value up to this amount are ignored
+
+    Returns:
+        list: List of transaction dictionaries with from, to and amount keys
+    """
+    creditors = [(p, b) for p, b in balance.items() if b > tolerance]
+    debtors = [(p, -b) for p, b in balance.items() if b < -tolerance]
+
+    transactions = []
+    i, j = 0, 0
+    while i < len(creditors) and j < len(debtors):
+        creditor, credit = creditors[i]
+        debtor, debt = debtors[j]
+        amount = min(credit, debt)
+
+        if amount > tolerance:
+            transactions.append({"from": debtor, "to": creditor, "amount": amount})
+
+        creditors[i] = (creditor, credit - amount)
+        debtors[j] = (debtor, debt - amount)
+
+        if creditors[i][1] <= tolerance:
+            i += 1
+        if debtors[j][1] <= tolerance:
+            j += 1
+
+    return transactions
+
+
+class SettlementInfeasibleError(ValueError):
+    """Raised when the balances cannot be settled within the given constraints.
+
+    Attributes:
+        unsettled: Dictionary mapping every person whose balance cannot be
+            settled completely to the amount left over, positive for money
+            still to be received and negative for money still to be paid
+    """
+
+    def __init__(self, unsettled):
+        """Initialize the error.
+
+        Args:
+            unsettled: Amount left over per person
+        """
+        self.unsettled = unsettled
+        details = ", ".join(f"{person}: {amount:.2f}" for person, amount in unsettled.items())
+        super().__init__(f"Balances cannot be settled within the constraints ({details})")
+
+
+class SettlementConstraints:
+    """Restrictions on who may pay whom and how much in a single transfer.
+
+    Attributes:
+        allowed: Set of (payer, recipient) pairs allowed to transfer money, or
+            None if every person may pay every other person
+        capacities: Dictionary mapping (payer, recipient) pairs to the
+            maximum amount transferred between them
+        max_transfer: Optional maximum amount of every transfer
+    """
+
+    def __init__(self, allowed=None, capacities=None, max_transfer=None):
+        """Initialize the constraints.
+
+        Args:
+            allowed: Optional iterable of (payer, recipient) pairs
+            capacities: Optional dictionary mapping pairs to maximum amounts
+            max_transfer: Optional maximum amount of every transfer
+        """
+        self.allowed = None if allowed is None else {tuple(pair) for pair in allowed}
+        self.capacities = {tuple(pair): amount for pair, amount in (capacities or {}).items()}
+        self.max_transfer = max_transfer
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create constraints from their JSON form.
+
+        Args:
+            data: Dictionary with optional "allowed" (list of [payer, recipient]),
+                "capacities" (list of [payer, recipient, amount]) and
+                "max_transfer" entries
+
+        Returns:
+            SettlementConstraints: The constraints
+        """
+        capacities = {
+            (payer, recipient): amount for payer, recipient, amount in data.get("capacities", ())
+        }
+        return cls(data.get("allowed"), capacities, data.get("max_transfer"))
+
+    def pairs(self, persons):
+        """Return the pairs money may be transferred between.
+
+        Args:
+            persons: Names of all persons taking part in the settlement
+
+        Returns:
+            list: (payer, recipient) pairs
+        """
+        if self.allowed is None:
+            return [
+                (payer, recipient)
+                for payer in persons
+                for recipient in persons
+                if payer != recipient
+            ]
+        return sorted(pair for pair in self.allowed if pair[0] != pair[1])
+
+    def capacity(self, payer, recipient):
+        """Return the maximum amount that may be transferred between two persons.
+
+        Returns:
+            float: The maximum amount, or None if it is unlimited
+        """
+        limits = [
+            limit
+            for limit in (self.capacities.get((payer, recipient)), self.max_transfer)
+            if limit is not None
+        ]
+        return min(limits) if limits else None
+
+
+def _to_cents(balance):
+    """Round balances to whole cents that still add up to zero."""
+    cents = {person: round(amount * 100) for person, amount in balance.items()}
+    residual = sum(cents.values())
+    if residual:
+        if abs(residual) > len(cents):
+            raise ValueError("Balances do not add up to zero")
+        # Rounding errors go to the persons with the largest balances
+        for person in sorted(cents, key=lambda p: -abs(balance[p]))[: abs(residual)]:
+            cents[person] -= 1 if residual > 0 else -1
+    return cents
+
+
+def settle_constrained(balance, constraints):
+    """Calculate transactions that settle the balances within constraints.
+
+    Settling is solved as a minimum-cost flow in whole cents: every debtor
+    supplies their debt, every creditor demands their credit and money flows
+    only between allowed pairs, up to their capacities. With a cost of one per
+    transferred cent, the result moves as little money as possible, and money
+    is only passed on by other persons where no allowed direct way is left.
+
+    Args:
+        balance: Dictionary mapping person names to their balance
+        constraints: SettlementConstraints to respect
+
+    Returns:
+        list: List of transaction dictionaries with from, to and amount keys
+
+    Raises:
+        SettlementInfeasibleError: If the constraints leave some balances unsettled
+    """
+    if (
+        constraints.allowed is None
+        and not constraints.capacities
+        and constraints.max_transfer is None
+    ):
+        # Without constraints every transfer is direct, so any settlement moves the least money
+        return settle_balances(balance, EPSILON)
+    cents = _to_cents(balance)
+    debtors = [person for person, amount in cents.items() if amount < 0]
+    creditors = [person for person, amount in cents.items() if amount > 0]
+    pairs = constraints.pairs(list(cents))
+
+    nodes = {person: number for number, person in enumerate(cents)}
+    for pair in pairs:
+        for person in pair:
+            nodes.setdefault(person, len(nodes))
+    source, sink = len(nodes), len(nodes) + 1
+    network = MinCostFlow(len(nodes) + 2)
+    supply = {
+        person: network.add_edge(source, nodes[person], -cents[person], 0) for person in debtors
+    }
+    demand = {
+        person: network.add_edge(nodes[person], sink, cents[person], 0) for person in creditors
+    }
+    total = sum(-cents[debtor] for debtor in debtors)
+    edges = []
+    for payer, recipient in pairs:
+        capacity = constraints.capacity(payer, recipient)
+        limit = total if capacity is None else round(capacity * 100)
+        edges.append((payer, recipient, network.add_edge(nodes[payer], nodes[recipient], limit, 1)))
+
+    flow, _ = network.solve(source, sink, total)
+    if flow < total:
+        unsettled = {}
+        for person, edge in supply.items():
+            if network.flow_of(edge) < -cents[person]:
+                unsettled[person] = (cents[person] + network.flow_of(edge)) / 100
+        for person, edge in demand.items():
+            if network.flow_of(edge) < cents[person]:
+                unsettled[person] = (cents[person] - network.flow_of(edge)) / 100
+        raise SettlementInfeasibleError(unsettled)
+
+    return [
+        {"from": payer, "to": recipient, "amount": network.flow_of(edge) / 100}
+        for payer, recipient, edge in edges
+        if network.flow_of(edge)
+    ]
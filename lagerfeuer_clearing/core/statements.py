@@ -0,0 +1,254 @@
+"""
+Personal statements listing the records and transfers of every participant.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import multiprocessing
+import os
+import re
+
+from lagerfeuer_clearing.core.recurrence import INTERVAL_LABELS, expense_total, occurrences
+
+# Fewer statements are written serially, because starting the worker
+# processes costs more than writing them
+MIN_PARALLEL_STATEMENTS = 500
+
+# Characters not allowed in the file name of a statement
+_UNSAFE = re.compile(r"[^\w.-]+")
+
+# Data of the ledger, set once per worker process by the pool initializer
+_statements = None
+
+
+class PersonIndex:
+    """Inverted index from persons to the records they take part in.
+
+    The index is built in one pass over the ledger. Expenses are indexed by
+    payer and by group, and every person knows the groups they belong to, so
+    the expenses a person shares in are the union of the postings of their
+    groups instead of one posting per member and expense.
+    """
+
+    def __init__(self, expenses, prepayments, group_members):
+        """Index the records of a ledger.
+
+        Args:
+            expenses: List of expense dictionaries
+            prepayments: List of prepayment dictionaries
+            group_members: Dictionary mapping every group used by an expense
+                to its member list
+        """
+        self.paid = defaultdict(list)
+        self.by_group = defaultdict(list)
+        self.prepayments = defaultdict(list)
+        for position, expense in enumerate(expenses):
+            self.paid[expense["person"]].append(position)
+            self.by_group[expense["group"]].append(position)
+        for position, prepayment in enumerate(prepayments):
+            self.prepayments[prepayment["person"]].append(position)
+            if prepayment["recipient"] != prepayment["person"]:
+                self.prepayments[prepayment["recipient"]].append(position)
+        self.groups_of = defaultdict(list)
+        for group, members in group_members.items():
+            for member in members:
+                self.groups_of[member].append(group)
+
+    def expenses_of(self, person):
+        """Return the positions of the expenses a person paid or shares in.
+
+        Args:
+            person: Name of the person
+
+        Returns:
+            list: Positions in list order, without duplicates
+        """
+        postings = [self.by_group.get(group, []) for group in self.groups_of.get(person, ())]
+        postings.append(self.paid.get(person, []))
+        positions = []
+        for position in heapq.merge(*postings):
+            if not positions or positions[-1] != position:
+                positions.append(position)
+        return positions
+
+    def prepayments_of(self, person):
+        """Return the positions of the prepayments a person paid or received.
+
+        Args:
+            person: Name of the person
+
+        Returns:
+            list: Positions in list order
+        """
+        return self.prepayments.get(person, [])
+
+
+class StatementWriter:
+    """Formats the statements of all persons of a ledger from one shared index."""
+
+    def __init__(self, expenses, prepayments, group_members, balances, transactions):
+        """Initialize the writer.
+
+        Args:
+            expenses: List of expense dictionaries
+            prepayments: List of prepayment dictionaries
+            group_members: Dictionary mapping every group used by an expense
+                to its member list
+            balances: Result of ExpenseManager.calculate_balances
+            transactions: List of transaction dictionaries settling the balances
+        """
+        self.expenses = expenses
+        self.prepayments = prepayments
+        self.group_members = group_members
+        self.balances = balances
+        self.index = PersonIndex(expenses, prepayments, group_members)
+        self.transfers = defaultdict(list)
+        for transaction in transactions:
+            self.transfers[transaction["from"]].append(transaction)
+            self.transfers[transaction["to"]].append(transaction)
+
+    def statement(self, person):
+        """Return the statement of a person as text.
+
+        Args:
+            person: Name of the person
+
+        Returns:
+            str: Statement listing the expenses the person paid or shares in,
+                their prepayments, their transfers and their balance
+        """
+        lines = [f"Abrechnung für {person}", "=" * 60, "", "Ausgaben:"]
+        groups = set(self.index.groups_of.get(person, ()))
+        for position in self.index.expenses_of(person):
+            expense = self.expenses[position]
+            members = self.group_members[expense["group"]]
+            share = expense_total(expense) / len(members) if expense["group"] in groups else 0
+            if "repeat" in expense:
+                interval = INTERVAL_LABELS[expense["repeat"]["every"]]
+                amount = f"{occurrences(expense)}× {interval} {expense['amount']:.2f} €"
+                when = f"ab {expense['date']}: "
+            else:
+                amount = f"{expense['amount']:.2f} €"
+                when = f"{expense['date']}: " if "date" in expense else ""
+            payer = "selbst" if expense["person"] == person else expense["person"]
+            lines.append(
+                f"- {when}{expense['subject']}, {amount} bezahlt von {payer}, "
+                f"Gruppe '{expense['group']}' ({len(members)} Personen), Anteil {share:.2f} €"
+            )
+
+        lines.extend(["", "Anzahlungen:"])
+        for position in self.index.prepayments_of(person):
+            prepayment = self.prepayments[position]
+            when = f"{prepayment['date']}: " if "date" in prepayment else ""
+            if prepayment["person"] == person:
+                lines.append(f"- {when}an {prepayment['recipient']} {prepayment['amount']:.2f} €")
+            else:
+                lines.append(f"- {when}von {prepayment['person']} {prepayment['amount']:.2f} €")
+
+        lines.extend(["", "Überweisungen:"])
+        for transaction in self.transfers.get(person, ()):
+            if transaction["from"] == person:
+                lines.append(f"- zahlt an {transaction['to']} {transaction['amount']:.2f} €")
+            else:
+                lines.append(f"- erhält von {transaction['from']} {transaction['amount']:.2f} €")
+
+        paid = self.balances["paid"].get(person, 0)
+        received = self.balances["received"].get(person, 0)
+        owes = self.balances["owes"].get(person, 0)
+        balance = self.balances["balance"].get(person, 0)
+        lines.extend(
+            [
+                "",
+                f"Geschuldet {owes:.2f} €, Bezahlt {paid:.2f} €, Erhielt {received:.2f} €, "
+                f"Saldo {balance:.2f} €",
+            ]
+        )
+        return "\n".join(lines) + "\n"
+
+    def write(self, items):
+        """Write the statements of some persons into files.
+
+        Args:
+            items: Iterable of (person, path) pairs
+        """
+        for person, path in items:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.statement(person))
+
+
+def statement_paths(persons, directory):
+    """Assign every person a distinct file in a directory.
+
+    Args:
+        persons: List of person names
+        directory: Directory for the statements
+
+    Returns:
+        dict: Path of the statement file per person
+    """
+    paths = {}
+    used = set()
+    for person in persons:
+        stem = _UNSAFE.sub("_", person).strip("._") or "person"
+        name = f"{stem}.txt"
+        number = 1
+        while name.casefold() in used:
+            number += 1
+            name = f"{stem}_{number}.txt"
+        used.add(name.casefold())
+        paths[person] = os.path.join(directory, name)
+    return paths
+
+
+def _init_worker(args):
+    """Build the statement writer in the worker process."""
+    global _statements
+    _statements = StatementWriter(*args)
+
+
+def _write_chunk(items):
+    """Write a chunk of statements in a worker."""
+    _statements.write(items)
+    return len(items)
+
+
+def write_statements(
+    args, persons, directory, workers=None, min_statements=MIN_PARALLEL_STATEMENTS
+):
+    """Write the statements of all persons into a directory.
+
+    Every worker receives the ledger once when it starts (without copying on
+    platforms that fork), builds the person index once and then writes its
+    share of the statements.
+
+    Args:
+        args: Arguments of StatementWriter
+        persons: List of person names
+        directory: Directory for the statements, created if necessary
+        workers: Number of worker processes (defaults to the number of CPUs)
+        min_statements: Fewer statements are written serially
+
+    Returns:
+        dict: Path of the statement file per person
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = statement_paths(persons, directory)
+    items = list(paths.items())
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(items) < min_statements:
+        StatementWriter(*args).write(items)
+        return paths
+
+    size = -(-len(items) // (4 * workers))
+    chunks = [items[start : start + size] for start in range(0, len(items), size)]
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(args,),
+    ) as executor:
+        list(executor.map(_write_chunk, chunks))
+    return paths
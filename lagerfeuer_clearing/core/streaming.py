@@ -0,0 +1,259 @@
+"""
+Out-of-core balance calculation for ledger files larger than memory.
+"""
+
+from collections import defaultdict
+import json
+import re
+
+from lagerfeuer_clearing.core.compression import open_ledger
+from lagerfeuer_clearing.core.groups import GroupResolver
+from lagerfeuer_clearing.core.parallel import split_group_totals
+from lagerfeuer_clearing.core.recurrence import expense_total
+from lagerfeuer_clearing.core.settlement import settle_balances
+
+# Sections of a ledger file that are read record by record
+STREAMED_SECTIONS = ("expenses", "prepayments")
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+DEFAULT_BUFFER_LIMIT = 1 << 24
+
+_WHITESPACE = re.compile(r"\s*")
+_SEPARATOR = re.compile(r"\s*([,\]])")
+
+
+class _IncrementalReader:
+    """Read JSON values one at a time from a text stream using a bounded buffer."""
+
+    def __init__(self, fp, chunk_size, buffer_limit):
+        """Initialize the reader.
+
+        Args:
+            fp: Text file object to read from
+            chunk_size: Number of characters read at once
+            buffer_limit: Maximum number of characters kept in the buffer
+        """
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._buffer_limit = buffer_limit
+        self._scan = json.JSONDecoder().scan_once
+        self._buffer = ""
+        self._position = 0
+        self._eof = False
+
+    def _fill(self):
+        """Read the next chunk, dropping everything that was already consumed."""
+        remaining = self._buffer[self._position :]
+        # Chunks are shortened so the buffer never grows beyond the limit
+        size = min(self._chunk_size, self._buffer_limit - len(remaining))
+        if size <= 0:
+            raise MemoryError(
+                f"A single value in the ledger exceeds the buffer limit of "
+                f"{self._buffer_limit} characters"
+            )
+        data = self._fp.read(size)
+        if not data:
+            self._eof = True
+            return
+        self._buffer = remaining + data
+        self._position = 0
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it.
+
+        Returns:
+            str: The character, or an empty string at the end of the stream
+        """
+        while True:
+            self._position = _WHITESPACE.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer) or self._eof:
+                return self._buffer[self._position : self._position + 1]
+            self._fill()
+
+    def expect(self, character):
+        """Consume the given character.
+
+        Args:
+            character: The expected next non-whitespace character
+
+        Raises:
+            ValueError: If a different character follows
+        """
+        found = self.peek()
+        if found != character:
+            raise ValueError(f"Expected '{character}' in ledger file but found '{found}'")
+        self._position += 1
+
+    def value(self):
+        """Decode and consume the next JSON value.
+
+        Returns:
+            object: The decoded value
+        """
+        while True:
+            self._position = _WHITESPACE.match(self._buffer, self._position).end()
+            try:
+                value, end = self._scan(self._buffer, self._position)
+            except StopIteration:
+                # Nothing that starts a value, or only the start of one was read
+                if self._eof:
+                    raise json.JSONDecodeError(
+                        "Expecting value", self._buffer, self._position
+                    ) from None
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            else:
+                # A number at the end of the buffer might continue in the next chunk
+                if end < len(self._buffer) or self._eof:
+                    self._position = end
+                    return value
+            self._fill()
+
+    def items(self):
+        """Decode and consume a JSON array value by value.
+
+        Yields:
+            object: The decoded array elements
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self._position += 1
+            return
+        while True:
+            yield self.value()
+            separator = _SEPARATOR.match(self._buffer, self._position)
+            if separator is None:
+                # The separator is not in the buffer yet
+                self.peek()
+                separator = _SEPARATOR.match(self._buffer, self._position)
+                if separator is None:
+                    raise ValueError("Expected ',' or ']' in ledger file")
+            self._position = separator.end()
+            if separator.group(1) == "]":
+                return
+
+
+def iter_ledger(fp, chunk_size=DEFAULT_CHUNK_SIZE, buffer_limit=DEFAULT_BUFFER_LIMIT):
+    """Iterate over the sections of a ledger file without loading it completely.
+
+    The expense and prepayment lists are yielded record by record, all other
+    sections (persons, groups, ...) as complete values.
+
+    Args:
+        fp: Text file object containing a ledger as written by save_to_file
+        chunk_size: Number of characters read at once
+        buffer_limit: Maximum number of characters buffered for a single value
+
+    Yields:
+        tuple: Section name and either a single record or the whole section value
+
+    Raises:
+        ValueError: If the file is not a JSON object
+        MemoryError: If a single value does not fit into the buffer limit
+    """
+    reader = _IncrementalReader(fp, chunk_size, buffer_limit)
+    reader.expect("{")
+    while reader.peek() != "}":
+        key = reader.value()
+        reader.expect(":")
+        if key in STREAMED_SECTIONS and reader.peek() == "[":
+            for item in reader.items():
+                yield key, item
+        else:
+            yield key, reader.value()
+        if reader.peek() == ",":
+            reader.expect(",")
+    reader.expect("}")
+
+
+def read_ledger(fp, chunk_size=DEFAULT_CHUNK_SIZE, buffer_limit=DEFAULT_BUFFER_LIMIT):
+    """Read a complete ledger without buffering the whole document as text.
+
+    Unlike json.load, only the records themselves are kept in memory, which
+    matters for decompressing streams that would otherwise be read completely.
+
+    Args:
+        fp: Text file object containing a ledger as written by save_to_file
+        chunk_size: Number of characters read at once
+        buffer_limit: Maximum number of characters buffered for a single value
+
+    Returns:
+        dict: The decoded ledger
+    """
+    data = {section: [] for section in STREAMED_SECTIONS}
+    for section, value in iter_ledger(fp, chunk_size, buffer_limit):
+        if section in STREAMED_SECTIONS:
+            data[section].append(value)
+        else:
+            data[section] = value
+    return data
+
+
+def calculate_balances_streaming(
+    filename, chunk_size=DEFAULT_CHUNK_SIZE, buffer_limit=DEFAULT_BUFFER_LIMIT
+):
+    """Calculate balances of a ledger file while reading it in bounded chunks.
+
+    Only per-person and per-group totals are kept in memory. Expense amounts
+    are summed per group and only split among the members at the end, so the
+    groups may appear anywhere in the file.
+
+    Args:
+        filename: Path to the ledger file
+        chunk_size: Number of characters read at once
+        buffer_limit: Maximum number of characters buffered for a single value
+
+    Returns:
+        dict: Dictionary with the same structure as ExpenseManager.calculate_balances
+    """
+    persons = []
+    groups = {}
+    definitions = {}
+    paid = defaultdict(float)
+    received = defaultdict(float)
+    group_totals = defaultdict(float)
+
+    with open_ledger(filename) as f:
+        for section, value in iter_ledger(f, chunk_size, buffer_limit):
+            if section == "expenses":
+                amount = expense_total(value) if "repeat" in value else value["amount"]
+                paid[value["person"]] += amount
+                group_totals[value["group"]] += amount
+            elif section == "prepayments":
+                paid[value["person"]] += value["amount"]
+                received[value["recipient"]] += value["amount"]
+            elif section == "persons":
+                persons = value
+            elif section == "groups":
+                groups = value
+            elif section == "group_definitions":
+                definitions = value
+
+    resolver = GroupResolver()
+    owes = split_group_totals(
+        group_totals, lambda name: resolver.members(name, groups, definitions)
+    )
+
+    balance = {
+        person: paid.get(person, 0) - received.get(person, 0) - owes.get(person, 0)
+        for person in persons
+    }
+    return {"paid": paid, "received": received, "owes": owes, "balance": balance}
+
+
+def calculate_transactions_streaming(
+    filename, chunk_size=DEFAULT_CHUNK_SIZE, buffer_limit=DEFAULT_BUFFER_LIMIT
+):
+    """Calculate the settlement of a ledger file while reading it in bounded chunks.
+
+    Args:
+        filename: Path to the ledger file
+        chunk_size: Number of characters read at once
+        buffer_limit: Maximum number of characters buffered for a single value
+
+    Returns:
+        dict: Dictionary with the same structure as ExpenseManager.calculate_transactions
+    """
+    balances = calculate_balances_streaming(filename, chunk_size, buffer_limit)
+    return {"balances": balances, "transactions": settle_balances(balances["balance"])}
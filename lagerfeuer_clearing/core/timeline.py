@@ -0,0 +1,195 @@
+"""
+Time-sorted index over dated expenses and prepayments for point-in-time balance queries.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from lagerfeuer_clearing.core.recurrence import occurrence_dates, occurrences
+
+
+def parse_date(value):
+    """Convert a date value into a datetime.
+
+    Args:
+        value: A datetime, date, ISO formatted string or None
+
+    Returns:
+        datetime: The parsed point in time, or None if no value was given
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time.min)
+    return datetime.fromisoformat(value)
+
+
+def format_date(value):
+    """Convert a date value into the ISO string stored in expense records.
+
+    Args:
+        value: A datetime, date or ISO formatted string
+
+    Returns:
+        str: ISO formatted date, without a time part if the value has none
+    """
+    if isinstance(value, str):
+        value = parse_date(value) if "T" in value or " " in value else date.fromisoformat(value)
+    if isinstance(value, datetime) and value.time() == time.min:
+        value = value.date()
+    return value.isoformat()
+
+
+def _is_day(value):
+    """Check whether a date value refers to a whole calendar day."""
+    if isinstance(value, datetime):
+        return False
+    if isinstance(value, date):
+        return True
+    return len(value) == 10
+
+
+def _end_of(value):
+    """Return the latest point in time covered by a date value."""
+    moment = parse_date(value)
+    if _is_day(value):
+        return datetime.combine(moment.date(), time.max)
+    return moment
+
+
+class BalanceTimeline:
+    """Time-sorted index over expenses and prepayments with per-person prefix sums.
+
+    Every person gets a sorted list of event times together with cumulative
+    paid, received and owed totals after each of those events. A point-in-time
+    query is therefore a binary search per person instead of a scan over the
+    whole ledger. Records without a date are treated as happening before all
+    dated records, so they are contained in every query. Recurring expenses
+    are not expanded; their occurrences up to a moment are counted per query.
+    """
+
+    def __init__(self, expenses, prepayments, members):
+        """Build the index from the given records.
+
+        Args:
+            expenses: List of expense dictionaries
+            prepayments: List of prepayment dictionaries
+            members: Callable returning the members of a group name
+        """
+        events = []
+        self._recurring = []
+        days = set()
+        for order, expense in enumerate(expenses):
+            if "repeat" in expense:
+                self._recurring.append((expense, members(expense["group"])))
+                days.update(when.date() for when in occurrence_dates(expense))
+                continue
+            events.append((self._when(expense), 0, order, expense))
+        for order, prepayment in enumerate(prepayments):
+            events.append((self._when(prepayment), 1, order, prepayment))
+        events.sort(key=lambda event: event[:3])
+
+        self._times = defaultdict(list)
+        self._paid = defaultdict(list)
+        self._received = defaultdict(list)
+        self._owes = defaultdict(list)
+
+        paid = defaultdict(float)
+        received = defaultdict(float)
+        owes = defaultdict(float)
+        for when, kind, _, record in events:
+            touched = set()
+            person = record["person"]
+            amount = record["amount"]
+            paid[person] += amount
+            touched.add(person)
+            if kind == 0:
+                group = members(record["group"])
+                per_person = amount / len(group)
+                for member in group:
+                    owes[member] += per_person
+                    touched.add(member)
+            else:
+                recipient = record["recipient"]
+                received[recipient] += amount
+                touched.add(recipient)
+
+            for name in touched:
+                self._times[name].append(when)
+                self._paid[name].append(paid[name])
+                self._received[name].append(received[name])
+                self._owes[name].append(owes[name])
+
+            if when != datetime.min:
+                days.add(when.date())
+        self._days = sorted(days)
+
+    @staticmethod
+    def _when(record):
+        """Return the sort key time of a record."""
+        return parse_date(record.get("date")) or datetime.min
+
+    def _totals(self, moment, inclusive):
+        """Collect the cumulative totals of every person at the given moment."""
+        search = bisect_right if inclusive else bisect_left
+        paid = defaultdict(float)
+        received = defaultdict(float)
+        owes = defaultdict(float)
+        for name, times in self._times.items():
+            position = search(times, moment)
+            if position:
+                paid[name] = self._paid[name][position - 1]
+                received[name] = self._received[name][position - 1]
+                owes[name] = self._owes[name][position - 1]
+        if self._recurring:
+            # Occurrences strictly before the moment for exclusive queries
+            limit = moment if inclusive else moment - timedelta.resolution
+            for expense, group in self._recurring:
+                amount = expense["amount"] * occurrences(expense, limit)
+                if amount:
+                    paid[expense["person"]] += amount
+                    per_person = amount / len(group)
+                    for member in group:
+                        owes[member] += per_person
+        return paid, received, owes
+
+    def totals_as_of(self, as_of):
+        """Return the paid, received and owed totals up to and including a date.
+
+        Args:
+            as_of: Date, datetime or ISO string; a plain date includes the whole day
+
+        Returns:
+            tuple: Dictionaries of paid, received and owed amounts per person
+        """
+        return self._totals(_end_of(as_of), inclusive=True)
+
+    def totals_between(self, start, end):
+        """Return the paid, received and owed totals of records within a period.
+
+        Args:
+            start: First date of the period (inclusive), or None for the beginning
+            end: Last date of the period (inclusive), or None for the end
+
+        Returns:
+            tuple: Dictionaries of paid, received and owed amounts per person
+        """
+        end_totals = self._totals(_end_of(end) if end is not None else datetime.max, True)
+        if start is None:
+            return end_totals
+        start_totals = self._totals(parse_date(start), inclusive=False)
+        return tuple(
+            defaultdict(float, {name: value - before.get(name, 0) for name, value in after.items()})
+            for after, before in zip(end_totals, start_totals, strict=True)
+        )
+
+    def days(self):
+        """Return the sorted calendar days on which dated records exist.
+
+        Returns:
+            list: Sorted list of dates
+        """
+        return list(self._days)
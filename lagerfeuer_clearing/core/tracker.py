@@ -0,0 +1,130 @@
+"""
+Incrementally maintained per-person totals of a ledger.
+"""
+
+from collections import defaultdict
+
+from lagerfeuer_clearing.core.recurrence import expense_total
+
+
+class BalanceTracker:
+    """Keep paid, received and owed totals up to date record by record.
+
+    The tracker starts out stale and is filled by a full rebuild. Afterwards
+    every added or removed record is applied as a delta, and the persons whose
+    totals changed are collected until the next call to mark_clean. Changes
+    that cannot be expressed as record deltas, like a changed group membership,
+    make the tracker stale again.
+    """
+
+    def __init__(self):
+        """Initialize an empty, stale tracker."""
+        self.paid = defaultdict(float)
+        self.received = defaultdict(float)
+        self.owes = defaultdict(float)
+        self.changed = set()
+        self.stale = True
+
+    def rebuild(self, expenses, prepayments, members):
+        """Recompute all totals from scratch.
+
+        Every person with a total is reported as changed afterwards.
+
+        Args:
+            expenses: Iterable of expense dictionaries
+            prepayments: Iterable of prepayment dictionaries
+            members: Callable returning the members of a group name
+
+        Raises:
+            KeyError: If an expense refers to an unknown group
+            ZeroDivisionError: If the group of an expense has no members; the
+                tracker stays stale
+        """
+        # Only a complete rebuild makes the totals valid again
+        self.stale = True
+        self.paid = defaultdict(float)
+        self.received = defaultdict(float)
+        self.owes = defaultdict(float)
+        for expense in expenses:
+            self._add_expense(expense, members(expense["group"]), 1)
+        for prepayment in prepayments:
+            self._add_prepayment(prepayment, 1)
+        self.stale = False
+
+    def invalidate(self):
+        """Mark the totals as outdated so the next access rebuilds them."""
+        self.stale = True
+
+    def apply_expense(self, expense, members, sign=1):
+        """Add (or with sign=-1 remove) the contribution of an expense.
+
+        Args:
+            expense: Expense dictionary
+            members: Callable returning the members of a group name
+            sign: 1 to add the expense, -1 to remove it
+
+        Returns:
+            set: The persons whose totals changed
+
+        Raises:
+            ZeroDivisionError: If the group of the expense has no members; the
+                totals are left unchanged
+        """
+        if self.stale:
+            return set()
+        try:
+            group = members(expense["group"])
+        except KeyError:
+            # Unknown groups are reported by the full calculation
+            self.stale = True
+            return set()
+        return self._add_expense(expense, group, sign)
+
+    def _add_expense(self, expense, group, sign):
+        """Add the contribution of an expense, computing every share before changing a total."""
+        amount = sign * expense_total(expense)
+        per_person = amount / len(group)
+        self.paid[expense["person"]] += amount
+        for member in group:
+            self.owes[member] += per_person
+        touched = {expense["person"], *group}
+        self.changed.update(touched)
+        return touched
+
+    def apply_prepayment(self, prepayment, sign=1):
+        """Add (or with sign=-1 remove) the contribution of a prepayment.
+
+        Args:
+            prepayment: Prepayment dictionary
+            sign: 1 to add the prepayment, -1 to remove it
+
+        Returns:
+            set: The persons whose totals changed
+        """
+        if self.stale:
+            return set()
+        return self._add_prepayment(prepayment, sign)
+
+    def _add_prepayment(self, prepayment, sign):
+        """Add the contribution of a prepayment."""
+        amount = sign * prepayment["amount"]
+        self.paid[prepayment["person"]] += amount
+        self.received[prepayment["recipient"]] += amount
+        touched = {prepayment["person"], prepayment["recipient"]}
+        self.changed.update(touched)
+        return touched
+
+    def balance_of(self, person):
+        """Return the current balance of a single person.
+
+        Args:
+            person: Name of the person
+
+        Returns:
+            float: Paid minus received minus owed amount
+        """
+        return self.paid.get(person, 0) - self.received.get(person, 0) - self.owes.get(person, 0)
+
+    def mark_clean(self):
+        """Forget which persons changed so far."""
+        self.changed = set()
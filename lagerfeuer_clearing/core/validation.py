@@ -0,0 +1,182 @@
+"""
+Referential validation of a ledger before it is used for calculations.
+"""
+
+import math
+
+from lagerfeuer_clearing.core.groups import GroupResolver, depends_on
+from lagerfeuer_clearing.core.recurrence import validate_repeat
+from lagerfeuer_clearing.core.timeline import parse_date
+
+# Kinds of problems reported for a field of a record
+UNKNOWN = "unknown"
+# A person with records who is not in the person list any more, e.g. after
+# leaving their last group; kept, since the ledger stays usable
+UNLISTED = "unlisted"
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+MISSING = "missing"
+EMPTY = "empty"
+CYCLIC = "cyclic"
+
+# Number of issues listed in the message of a LedgerValidationError
+MAX_REPORTED_ISSUES = 10
+
+
+class LedgerValidationError(ValueError):
+    """Raised when a ledger refers to unknown groups or contains invalid values.
+
+    Attributes:
+        issues: List of issue dictionaries with the "section" and "index" of
+            the record (the name for persons, groups and definitions), the
+            "field", its "value" and the kind of "problem"
+    """
+
+    def __init__(self, issues):
+        self.issues = issues
+        lines = [
+            f"{issue['section']}[{issue['index']!r}].{issue['field']}: "
+            f"{issue['problem']} {issue['value']!r}"
+            for issue in issues[:MAX_REPORTED_ISSUES]
+        ]
+        if len(issues) > MAX_REPORTED_ISSUES:
+            lines.append(f"... and {len(issues) - MAX_REPORTED_ISSUES} more")
+        super().__init__(f"Invalid ledger with {len(issues)} issue(s):\n" + "\n".join(lines))
+
+
+def fatal_issues(issues):
+    """Return the issues that make a ledger unusable for calculations.
+
+    Args:
+        issues: List of issue dictionaries returned by validate_ledger
+
+    Returns:
+        list: All issues except persons missing from the person list
+    """
+    return [issue for issue in issues if issue["problem"] != UNLISTED]
+
+
+def _is_amount(value):
+    """Check whether a value is a finite number."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _is_date(value):
+    """Check whether a value can be parsed as a date."""
+    try:
+        parse_date(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _parts(definition):
+    """Return the group names a derived group definition refers to."""
+    return [*definition.get("include", ()), *definition.get("exclude", ())]
+
+
+def validate_ledger(persons, groups, expenses, prepayments, group_definitions=None):
+    """Check all references and values of a ledger in a single pass over its records.
+
+    Persons, groups and record ids are collected into sets first, so every
+    reference is checked by a lookup instead of a search. All problems are
+    collected instead of stopping at the first one.
+
+    Args:
+        persons: List of person names
+        groups: Dictionary mapping base group names to member lists
+        expenses: List of expense dictionaries
+        prepayments: List of prepayment dictionaries
+        group_definitions: Optional dictionary mapping derived group names to
+            definitions with "include" and "exclude" lists of group names
+
+    Returns:
+        list: Issue dictionaries as described for LedgerValidationError, in
+            the order of the sections and records; empty if the ledger is valid
+    """
+    definitions = group_definitions or {}
+    issues = []
+
+    def report(section, index, field, value, problem):
+        issues.append(
+            {"section": section, "index": index, "field": field, "value": value, "problem": problem}
+        )
+
+    known = set()
+    for person in persons:
+        if not isinstance(person, str):
+            report("persons", person, "name", person, INVALID)
+        elif person in known:
+            report("persons", person, "name", person, DUPLICATE)
+        else:
+            known.add(person)
+
+    for group, members in groups.items():
+        for member in members:
+            if not isinstance(member, str):
+                report("groups", group, "members", member, INVALID)
+            elif member not in known:
+                report("groups", group, "members", member, UNLISTED)
+
+    for name, definition in definitions.items():
+        if name in groups:
+            report("group_definitions", name, "name", name, DUPLICATE)
+        for part in _parts(definition):
+            if part not in groups and part not in definitions:
+                report("group_definitions", name, "include/exclude", part, UNKNOWN)
+        if any(depends_on(part, name, definitions) for part in _parts(definition)):
+            report("group_definitions", name, "include/exclude", name, CYCLIC)
+
+    # Derived groups are only expanded when an expense uses them; broken
+    # definitions have no size and were reported above
+    sizes = {group: len(members) for group, members in groups.items()}
+    resolver = GroupResolver()
+
+    def group_size(group):
+        if group not in sizes:
+            try:
+                members = resolver.members(group, groups, definitions)
+            except (KeyError, ValueError):
+                members = None
+            sizes[group] = None if members is None else len(members)
+        return sizes[group]
+
+    for section, records, references in (
+        ("expenses", expenses, (("person", known), ("group", None))),
+        ("prepayments", prepayments, (("person", known), ("recipient", known))),
+    ):
+        ids = set()
+        for index, record in enumerate(records):
+            for field, names in references:
+                if field not in record:
+                    report(section, index, field, None, MISSING)
+                    continue
+                value = record[field]
+                if not isinstance(value, str):
+                    report(section, index, field, value, INVALID)
+                elif names is not None:
+                    if value not in names:
+                        report(section, index, field, value, UNLISTED)
+                elif value not in groups and value not in definitions:
+                    report(section, index, field, value, UNKNOWN)
+                elif group_size(value) == 0:
+                    report(section, index, field, value, EMPTY)
+            if "amount" not in record:
+                report(section, index, "amount", None, MISSING)
+            elif not _is_amount(record["amount"]):
+                report(section, index, "amount", record["amount"], INVALID)
+            if "date" in record and not _is_date(record["date"]):
+                report(section, index, "date", record["date"], INVALID)
+            if "repeat" in record:
+                try:
+                    validate_repeat(record["repeat"])
+                    valid = "date" in record and _is_date(record["repeat"].get("until"))
+                except (AttributeError, ValueError):
+                    valid = False
+                if not valid:
+                    report(section, index, "repeat", record["repeat"], INVALID)
+            if "id" in record:
+                if record["id"] in ids:
+                    report(section, index, "id", record["id"], DUPLICATE)
+                ids.add(record["id"])
+    return issues
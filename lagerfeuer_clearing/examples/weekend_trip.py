@@ -45,7 +45,7 @@ def main():
     print("\n\nAFTER UPDATING GAS EXPENSE TO $100")
     print("==================================")
     # Find the index of the gas expense
-    gas_index = next((i for i, e in enumerate(manager.expenses) if e["subject"] == "Gas"), None)
+    gas_index = next((i for i, _ in manager.query_expenses(payer="Charlie", text="Gas")), None)
     if gas_index is not None:
         manager.add_or_update_expense("Charlie", 100, "Drivers", "Gas", gas_index)
         print(manager.get_summary())
@@ -56,7 +56,7 @@ def main():
     manager.remove_person_from_group("Eve", "Cooking")
     # Update the expense to be split among remaining cooking group members
     cooking_index = next(
-        (i for i, e in enumerate(manager.expenses) if e["subject"] == "Special ingredients"), None
+        (i for i, _ in manager.query_expenses(group="Cooking", text="Special ingredients")), None
     )
     if cooking_index is not None:
         # We need to change the expense to be paid by someone else in the cooking group
@@ -4,34 +4,66 @@ Graphical user interface for expense sharing calculations.
 """
 
 import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 
 from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.events import (
+    EXPENSE_ADDED,
+    EXPENSE_REMOVED,
+    EXPENSE_UPDATED,
+    GROUP_ADDED,
+    GROUP_CHANGED,
+    GROUP_REMOVED,
+    GROUP_RENAMED,
+    PERSON_ADDED,
+    PERSON_REMOVED,
+    PREPAYMENT_ADDED,
+    PREPAYMENT_REMOVED,
+    PREPAYMENT_UPDATED,
+)
+from lagerfeuer_clearing.core.export import export_transactions
+from lagerfeuer_clearing.core.recurrence import INTERVAL_LABELS, occurrences
 
 # Default save file location
 SAVE_FILE = "expense_data.json"
 
+# Maximum number of names offered when a combobox is opened
+COMPLETION_LIMIT = 50
+
+# Milliseconds between checks whether the ledger finished loading
+LOAD_POLL_INTERVAL = 50
+
 
 class ExpenseApp:
     """GUI application for expense sharing calculations."""
 
-    def __init__(self, root, manager):
+    def __init__(self, root, manager=None):
         """Initialize the GUI application.
 
+        Only the window frame is created here. The tabs are built when they are
+        shown for the first time, so the window appears at once regardless of
+        the size of the ledger.
+
         Args:
             root: The tkinter root widget
-            manager: An ExpenseManager instance
+            manager: An ExpenseManager instance, or None if it is passed to
+                set_manager later, e.g. by load_in_background
         """
         self.root = root
         self.root.title("Reisekostenaufteilung")
-        self.manager = manager
+        self.manager = None
 
-        # Create shortcuts to manager data
-        self.persons = manager.persons
-        self.groups = manager.groups
-        self.expenses = manager.expenses
-        self.prepayments = manager.prepayments
+        # Ladeanzeige, solange die Daten im Hintergrund gelesen werden
+        self.loading_frame = ttk.Frame(root)
+        ttk.Label(self.loading_frame, text="Daten werden geladen …").pack(side="left", padx=5)
+        self.loading_bar = ttk.Progressbar(self.loading_frame, mode="indeterminate", length=150)
+        self.loading_bar.pack(side="left", padx=5)
+
+        # Kontostände neben allen Tabs
+        self.setup_balance_panel()
 
         # Create notebook for tabs
         self.notebook = ttk.Notebook(root)
@@ -49,21 +81,226 @@ class ExpenseApp:
         self.notebook.add(self.prepayment_frame, text="Anzahlungen")
         self.notebook.add(self.result_frame, text="Ergebnisse")
 
-        # Set up the tab content
-        self.setup_group_tab()
-        self.setup_expense_tab()
-        self.setup_prepayment_tab()
-        self.setup_result_tab()
-        self.selected_expense_index = None
-        self.selected_prepayment_index = None 
-
-    def update_all_comboboxes(self):
-        """Update all comboboxes with current data."""
-        self.group_combo["values"] = list(self.groups.keys())
-        self.exp_person_combo["values"] = self.persons
-        self.exp_group_combo["values"] = list(self.groups.keys())
-        self.prepay_person_combo["values"] = self.persons
-        self.prepay_recipient_combo["values"] = self.persons
+        # Der Inhalt eines Tabs wird erst beim ersten Anzeigen aufgebaut
+        self.tab_setups = {
+            str(self.group_frame): self.setup_group_tab,
+            str(self.expense_frame): self.setup_expense_tab,
+            str(self.prepayment_frame): self.setup_prepayment_tab,
+            str(self.result_frame): self.setup_result_tab,
+        }
+        self.built_tabs = set()
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        # Ids der ausgewählten Einträge bleiben auch nach Löschungen und Rückgängig gültig
+        self.selected_expense_id = None
+        self.selected_prepayment_id = None
+
+        # Menü und Tastenkürzel für Rückgängig/Wiederholen
+        menubar = tk.Menu(root)
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        edit_menu.add_command(label="Rückgängig", accelerator="Strg+Z", command=self.undo)
+        edit_menu.add_command(label="Wiederholen", accelerator="Strg+Y", command=self.redo)
+        menubar.add_cascade(label="Bearbeiten", menu=edit_menu)
+        root.config(menu=menubar)
+        root.bind_all("<Control-z>", self.undo)
+        root.bind_all("<Control-y>", self.redo)
+        root.bind_all("<Control-Shift-Z>", self.redo)
+
+        if manager is not None:
+            self.set_manager(manager)
+
+    def set_manager(self, manager):
+        """Show the data of a manager, building the visible tab.
+
+        Args:
+            manager: An ExpenseManager instance
+        """
+        self.manager = manager
+
+        # Create shortcuts to manager data
+        self.persons = manager.persons
+        self.groups = manager.groups
+        self.expenses = manager.expenses
+        self.prepayments = manager.prepayments
+
+        self.update_balance_panel()
+        self.build_tab(self.notebook.select())
+
+        # Nur die von einer Änderung betroffenen Anzeigen aktualisieren
+        manager.subscribe(self.on_changes)
+
+    def load_in_background(self, loader):
+        """Load the manager on a worker thread while the window stays responsive.
+
+        Tkinter may only be used from the main thread, so the worker hands the
+        result over through a queue that the main loop polls.
+
+        Args:
+            loader: Callable returning an ExpenseManager
+        """
+        results = queue.Queue()
+
+        def work():
+            try:
+                results.put((loader(), None))
+            except Exception as error:
+                # Every failure is shown to the user by the main thread
+                results.put((None, error))
+
+        def poll():
+            try:
+                manager, error = results.get_nowait()
+            except queue.Empty:
+                self.root.after(LOAD_POLL_INTERVAL, poll)
+                return
+            self.loading_bar.stop()
+            self.loading_frame.pack_forget()
+            if error is not None:
+                messagebox.showerror("Fehler", f"Die Daten konnten nicht geladen werden:\n{error}")
+                self.root.destroy()
+                return
+            self.set_manager(manager)
+
+        self.loading_frame.pack(side="bottom", fill="x", padx=5, pady=5, before=self.notebook)
+        self.loading_bar.start()
+        # Parsing holds the interpreter lock for long stretches, so the worker
+        # only starts once the window has been drawn
+        self.root.after_idle(lambda: threading.Thread(target=work, daemon=True).start())
+        self.root.after(LOAD_POLL_INTERVAL, poll)
+
+    def on_tab_changed(self, event=None):
+        """Build the content of a tab when it is shown for the first time."""
+        self.build_tab(self.notebook.select())
+
+    def build_tab(self, tab):
+        """Build and fill the content of a tab unless that happened already.
+
+        Args:
+            tab: Widget name of the tab frame
+        """
+        if self.manager is None or tab in self.built_tabs or tab not in self.tab_setups:
+            return
+        self.built_tabs.add(tab)
+        self.tab_setups[tab]()
+
+    def is_built(self, frame):
+        """Return whether the content of a tab frame was built already."""
+        return str(frame) in self.built_tabs
+
+    def undo(self, event=None):
+        """Undo the most recent change."""
+        if self.manager is not None:
+            self.manager.undo()
+
+    def redo(self, event=None):
+        """Redo the most recently undone change."""
+        if self.manager is not None:
+            self.manager.redo()
+
+    def on_changes(self, events):
+        """Update the widgets affected by a batch of change events.
+
+        Args:
+            events: List of change events delivered by the manager
+        """
+        # Tabs that were not built yet are filled completely when first shown
+        kinds = {event.kind for event in events}
+        if kinds & {EXPENSE_ADDED, EXPENSE_UPDATED, EXPENSE_REMOVED} and self.is_built(
+            self.expense_frame
+        ):
+            self.apply_expense_events(events)
+        if kinds & {PREPAYMENT_ADDED, PREPAYMENT_UPDATED, PREPAYMENT_REMOVED} and self.is_built(
+            self.prepayment_frame
+        ):
+            self.apply_prepayment_events(events)
+        if self.is_built(self.group_frame) and kinds & {
+            PERSON_ADDED,
+            PERSON_REMOVED,
+            GROUP_ADDED,
+            GROUP_CHANGED,
+            GROUP_REMOVED,
+            GROUP_RENAMED,
+        }:
+            self.update_group_list()
+        self.update_balance_panel()
+
+    @staticmethod
+    def apply_list_events(listbox, events, kinds, text):
+        """Insert, replace and delete the listbox rows of changed records.
+
+        Args:
+            listbox: Listbox showing one row per record in list order
+            events: List of change events
+            kinds: Event kinds for added, updated and removed records
+            text: Callable returning the row text of a record
+        """
+        added, updated, removed = kinds
+        for event in events:
+            if event.kind in (updated, removed):
+                listbox.delete(event.key)
+            if event.kind in (added, updated):
+                listbox.insert(event.key, text(event.value))
+
+    def setup_balance_panel(self):
+        """Set up the panel showing the current balance of every person."""
+        self.balance_panel = ttk.LabelFrame(self.root, text="Kontostände")
+        self.balance_panel.pack(side="right", fill="y", padx=5, pady=10)
+        self.balance_tree = ttk.Treeview(
+            self.balance_panel, columns=("balance",), height=15, selectmode="none"
+        )
+        self.balance_tree.heading("#0", text="Person")
+        self.balance_tree.heading("balance", text="Saldo")
+        self.balance_tree.column("#0", width=120)
+        self.balance_tree.column("balance", width=90, anchor="e")
+        self.balance_tree.tag_configure("negative", foreground="red")
+        self.balance_tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+    def update_balance_panel(self):
+        """Update the rows of the balance panel whose balance changed.
+
+        Only the persons affected since the last update are recalculated, so
+        the panel stays cheap to update even for large ledgers. While an
+        expense is split among a group without members, no balance can be
+        calculated and the panel shows placeholders instead.
+        """
+        try:
+            changes = self.manager.balance_changes()
+        except ZeroDivisionError:
+            # The next successful update reports every person again
+            changes = dict.fromkeys(self.persons)
+        rows = self.balance_tree.get_children()
+        if list(rows) != self.persons:
+            # The persons changed, in which case all balances were reported
+            self.balance_tree.delete(*rows)
+            for person in self.persons:
+                self.balance_tree.insert("", tk.END, iid=person, text=person)
+        for person, balance in changes.items():
+            if balance is None:
+                self.balance_tree.item(person, values=("–",), tags=())
+            else:
+                self.balance_tree.item(
+                    person,
+                    values=(f"{balance:.2f} €",),
+                    tags=("negative",) if balance < -0.005 else (),
+                )
+        invalid = None in changes.values()
+        self.balance_panel.configure(
+            text="Kontostände (Gruppe ohne Mitglieder)" if invalid else "Kontostände"
+        )
+
+    def autocomplete(self, combo, complete):
+        """Offer the names starting with the text of a combobox whenever it is opened.
+
+        The names are looked up only when the list is opened (e.g. with the
+        down arrow key after typing a few letters), so changes to persons and
+        groups never have to be pushed into the comboboxes.
+
+        Args:
+            combo: The combobox
+            complete: Callable returning names for a prefix and a limit
+        """
+        combo.configure(
+            postcommand=lambda: combo.configure(values=complete(combo.get(), COMPLETION_LIMIT))
+        )
 
     def setup_group_tab(self):
         """Set up the groups management tab."""
@@ -72,8 +309,10 @@ class ExpenseApp:
         )
 
         self.group_var = tk.StringVar()
-        self.group_combo = ttk.Combobox(
-            self.group_frame, textvariable=self.group_var, values=list(self.groups.keys())
+        self.group_combo = ttk.Combobox(self.group_frame, textvariable=self.group_var)
+        self.autocomplete(
+            self.group_combo,
+            lambda prefix, limit: self.manager.complete_groups(prefix, limit, derived=False),
         )
         self.group_combo.grid(row=1, column=0, padx=5, pady=2)
         self.group_combo.bind("<<ComboboxSelected>>", self.update_group_list)
@@ -122,8 +361,6 @@ class ExpenseApp:
         group = self.group_var.get()
         if person and group in self.groups:
             self.manager.add_person(person, group)
-            self.update_group_list()
-            self.update_all_comboboxes()
 
     def remove_person(self):
         """Remove a person from a group."""
@@ -132,8 +369,6 @@ class ExpenseApp:
         if selection and group in self.groups:
             person = self.group_listbox.get(selection[0])
             self.manager.remove_person_from_group(person, group)
-            self.update_group_list()
-            self.update_all_comboboxes()
 
     def rename_group(self):
         """Rename a group."""
@@ -143,7 +378,6 @@ class ExpenseApp:
             self.manager.rename_group(old_name, new_name)
             self.group_var.set(new_name)
             self.update_group_list()
-            self.update_all_comboboxes()
 
     def setup_expense_tab(self):
         """Set up the expenses management tab."""
@@ -151,7 +385,17 @@ class ExpenseApp:
             row=0, column=0, columnspan=2, pady=5
         )
 
-        # Listbox
+        # Suchfeld über der Liste
+        search_frame = ttk.Frame(self.expense_frame)
+        search_frame.grid(row=0, column=2, sticky="e", padx=5)
+        ttk.Label(search_frame, text="Suche:").pack(side="left")
+        self.exp_search_var = tk.StringVar()
+        self.exp_search_var.trace_add("write", lambda *args: self.update_expense_list())
+        ttk.Entry(search_frame, textvariable=self.exp_search_var).pack(side="left")
+
+        # Listbox; expense_rows ordnet bei aktiver Suche jeder Zeile den Index
+        # der Ausgabe zu, ohne Suche (None) entspricht die Zeile dem Index
+        self.expense_rows = None
         self.expense_listbox = tk.Listbox(self.expense_frame, height=10, width=50)
         self.expense_listbox.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")
         self.expense_listbox.bind("<<ListboxSelect>>", self.load_expense)
@@ -164,9 +408,8 @@ class ExpenseApp:
         # Person
         ttk.Label(input_frame, text="Person:").grid(row=0, column=0, sticky="w")
         self.exp_person_var = tk.StringVar()
-        self.exp_person_combo = ttk.Combobox(
-            input_frame, textvariable=self.exp_person_var, values=self.persons
-        )
+        self.exp_person_combo = ttk.Combobox(input_frame, textvariable=self.exp_person_var)
+        self.autocomplete(self.exp_person_combo, self.manager.complete_persons)
         self.exp_person_combo.grid(row=1, column=0, pady=2)
 
         # Betrag
@@ -177,9 +420,8 @@ class ExpenseApp:
         # Gruppe
         ttk.Label(input_frame, text="Gruppe:").grid(row=4, column=0, sticky="w")
         self.exp_group_var = tk.StringVar()
-        self.exp_group_combo = ttk.Combobox(
-            input_frame, textvariable=self.exp_group_var, values=list(self.groups.keys())
-        )
+        self.exp_group_combo = ttk.Combobox(input_frame, textvariable=self.exp_group_var)
+        self.autocomplete(self.exp_group_combo, self.manager.complete_groups)
         self.exp_group_combo.grid(row=5, column=0, pady=2)
 
         # Betreff
@@ -202,27 +444,59 @@ class ExpenseApp:
         self.expense_frame.grid_columnconfigure((0, 1, 2), weight=1)
         self.expense_frame.grid_rowconfigure(1, weight=1)
 
+    @staticmethod
+    def expense_text(exp):
+        """Return the listbox row text of an expense."""
+        amount = f"{exp['amount']} €"
+        if "repeat" in exp:
+            interval = INTERVAL_LABELS[exp["repeat"]["every"]]
+            amount = f"{occurrences(exp)}× {interval} {amount} ab {exp['date']}"
+        return f"{exp['person']} - {amount} - {exp['group']} - {exp['subject']}"
+
     def update_expense_list(self):
-        """Update the expense listbox with current expenses."""
+        """Update the expense listbox with the expenses matching the search text."""
+        text = self.exp_search_var.get().strip()
         self.expense_listbox.delete(0, tk.END)
-        for exp in self.expenses:
-            self.expense_listbox.insert(
-                tk.END, f"{exp['person']} - {exp['amount']} € - {exp['group']} - {exp['subject']}"
-            )
+        self.expense_rows = [] if text else None
+        for index, exp in self.manager.query_expenses(text=text):
+            if text:
+                self.expense_rows.append(index)
+            self.expense_listbox.insert(tk.END, self.expense_text(exp))
+
+    def apply_expense_events(self, events):
+        """Update only the listbox rows of changed expenses."""
+        if self.expense_rows is not None:
+            # Changed expenses may start or stop matching the search anywhere
+            self.update_expense_list()
+            return
+        kinds = (EXPENSE_ADDED, EXPENSE_UPDATED, EXPENSE_REMOVED)
+        self.apply_list_events(self.expense_listbox, events, kinds, self.expense_text)
+
+    def expense_index(self, row):
+        """Return the index of the expense shown in a listbox row."""
+        return row if self.expense_rows is None else self.expense_rows[row]
+
+    def select_expense_row(self, index):
+        """Select the listbox row showing the expense at the given index."""
+        self.expense_listbox.selection_clear(0, tk.END)
+        if self.expense_rows is None:
+            row = index if index < len(self.expenses) else None
+        else:
+            row = self.expense_rows.index(index) if index in self.expense_rows else None
+        if row is not None:
+            self.expense_listbox.selection_set(row)
+            self.expense_listbox.activate(row)
 
     def load_expense(self, event):
         """Load an expense from the listbox into the input fields."""
         selection = self.expense_listbox.curselection()
-        # print(f"load_expense: selection = {selection}, widget = {event.widget}")
         if selection:  # Nur bei echter Auswahl reagieren
-            self.selected_expense_index = selection[0]
-            exp = self.expenses[self.selected_expense_index]
+            exp = self.expenses[self.expense_index(selection[0])]
+            self.selected_expense_id = exp["id"]
             self.exp_person_var.set(exp["person"])
             self.exp_amount_var.set(str(exp["amount"]))
             self.exp_group_var.set(exp["group"])
             self.exp_subject_var.set(exp["subject"])
-            # print(f"Index gesetzt: self.selected_expense_index = {self.selected_expense_index}")
-        # print(f"load_expense nach Laden: selection = {self.expense_listbox.curselection()}, index = {self.selected_expense_index}")
 
 
     def add_expense(self):
@@ -235,9 +509,12 @@ class ExpenseApp:
             return
         group = self.exp_group_var.get()
         subject = self.exp_subject_var.get().strip()
-        if person in self.persons and group in self.groups and amount > 0 and subject:
-            self.manager.add_or_update_expense(person, amount, group, subject)
-            self.update_expense_list()
+        if person in self.persons and group in self.manager.group_names() and amount > 0 and subject:
+            try:
+                self.manager.add_or_update_expense(person, amount, group, subject)
+            except ValueError:
+                messagebox.showerror("Fehler", f"Die Gruppe {group} hat keine Mitglieder.")
+                return
             # Clear fields after adding
             self.exp_person_var.set("")
             self.exp_amount_var.set("")
@@ -246,8 +523,7 @@ class ExpenseApp:
             self.expense_listbox.selection_clear(0, tk.END)  # Clear selection
 
     def update_expense(self):
-        # print(f"update_expense: self.selected_expense_index = {self.selected_expense_index}")
-        if self.selected_expense_index is None:
+        if self.selected_expense_id is None:
             messagebox.showwarning("Warnung", "Bitte wählen Sie einen Eintrag zum Bearbeiten aus.")
             return
         person = self.exp_person_var.get()
@@ -258,19 +534,25 @@ class ExpenseApp:
             return
         group = self.exp_group_var.get()
         subject = self.exp_subject_var.get().strip()
-        if person in self.persons and group in self.groups and amount > 0 and subject:
-            self.manager.add_or_update_expense(person, amount, group, subject, self.selected_expense_index)
-            self.update_expense_list()
-            self.expense_listbox.selection_clear(0, tk.END)
-            self.expense_listbox.selection_set(self.selected_expense_index)
-            self.expense_listbox.activate(self.selected_expense_index)
+        if person in self.persons and group in self.manager.group_names() and amount > 0 and subject:
+            try:
+                updated = self.manager.update_expense_by_id(
+                    self.selected_expense_id, person, amount, group, subject
+                )
+            except ValueError:
+                messagebox.showerror("Fehler", f"Die Gruppe {group} hat keine Mitglieder.")
+                return
+            if not updated:
+                messagebox.showwarning("Warnung", "Der ausgewählte Eintrag existiert nicht mehr.")
+                self.selected_expense_id = None
+                return
+            self.select_expense_row(self.manager.expense_index(self.selected_expense_id))
 
     def remove_expense(self):
         """Remove an expense."""
         selection = self.expense_listbox.curselection()
         if selection:
-            self.manager.remove_expense(selection[0])
-            self.update_expense_list()
+            self.manager.remove_expense(self.expense_index(selection[0]))
 
     def setup_prepayment_tab(self):
         """Set up the prepayments management tab."""
@@ -291,11 +573,9 @@ class ExpenseApp:
         # Person
         ttk.Label(input_frame, text="Person:").grid(row=0, column=0, sticky="w")
         self.prepay_person_var = tk.StringVar()
-        self.prepay_person_combo = ttk.Combobox(
-            input_frame, textvariable=self.prepay_person_var, values=self.persons
-        )
+        self.prepay_person_combo = ttk.Combobox(input_frame, textvariable=self.prepay_person_var)
+        self.autocomplete(self.prepay_person_combo, self.manager.complete_persons)
         self.prepay_person_combo.grid(row=1, column=0, pady=2)
-        self.prepay_person_combo.bind("<<ComboboxSelected>>", lambda e: print("Person Combobox event:", e.widget))
 
         # Betrag
         ttk.Label(input_frame, text="Betrag:").grid(row=2, column=0, sticky="w")
@@ -306,10 +586,10 @@ class ExpenseApp:
         ttk.Label(input_frame, text="Empfänger:").grid(row=4, column=0, sticky="w")
         self.prepay_recipient_var = tk.StringVar()
         self.prepay_recipient_combo = ttk.Combobox(
-            input_frame, textvariable=self.prepay_recipient_var, values=self.persons
+            input_frame, textvariable=self.prepay_recipient_var
         )
+        self.autocomplete(self.prepay_recipient_combo, self.manager.complete_persons)
         self.prepay_recipient_combo.grid(row=5, column=0, pady=2)
-        self.prepay_recipient_combo.bind("<<ComboboxSelected>>", lambda e: print("Recipient Combobox event:", e.widget))
 
         # Buttons
         ttk.Button(self.prepayment_frame, text="Hinzufügen", command=self.add_prepayment).grid(
@@ -326,26 +606,31 @@ class ExpenseApp:
         self.prepayment_frame.grid_columnconfigure((0, 1, 2), weight=1)
         self.prepayment_frame.grid_rowconfigure(1, weight=1)
 
+    @staticmethod
+    def prepayment_text(prep):
+        """Return the listbox row text of a prepayment."""
+        return f"{prep['person']} -> {prep['recipient']} : {prep['amount']} €"
+
     def update_prepay_list(self):
         """Update the prepayment listbox with current prepayments."""
         self.prepay_listbox.delete(0, tk.END)
         for prep in self.prepayments:
-            self.prepay_listbox.insert(
-                tk.END, f"{prep['person']} -> {prep['recipient']} : {prep['amount']} €"
-            )
+            self.prepay_listbox.insert(tk.END, self.prepayment_text(prep))
+
+    def apply_prepayment_events(self, events):
+        """Update only the listbox rows of changed prepayments."""
+        kinds = (PREPAYMENT_ADDED, PREPAYMENT_UPDATED, PREPAYMENT_REMOVED)
+        self.apply_list_events(self.prepay_listbox, events, kinds, self.prepayment_text)
 
     def load_prepayment(self, event):
         """Load a prepayment from the listbox into the input fields."""
         selection = self.prepay_listbox.curselection()
-        # print(f"load_prepayment: selection = {selection}, widget = {event.widget}")  # Debugging optional
         if selection:  # Nur bei echter Auswahl reagieren
-            self.selected_prepayment_index = selection[0]
-            prep = self.prepayments[self.selected_prepayment_index]
+            prep = self.prepayments[selection[0]]
+            self.selected_prepayment_id = prep["id"]
             self.prepay_person_var.set(prep["person"])
             self.prepay_amount_var.set(str(prep["amount"]))
             self.prepay_recipient_var.set(prep["recipient"])
-            # print(f"Index gesetzt: self.selected_prepayment_index = {self.selected_prepayment_index}")  # Debugging optional
-        # print(f"load_prepayment nach Laden: selection = {self.prepay_listbox.curselection()}, index = {self.selected_prepayment_index}")  # Debugging optional
 
     def add_prepayment(self):
         """Add a new prepayment."""
@@ -358,7 +643,6 @@ class ExpenseApp:
         recipient = self.prepay_recipient_var.get()
         if person in self.persons and recipient in self.persons and amount > 0:
             self.manager.add_or_update_prepayment(person, amount, recipient)
-            self.update_prepay_list()
             # Clear fields after adding
             self.prepay_person_var.set("")
             self.prepay_amount_var.set("")
@@ -367,8 +651,7 @@ class ExpenseApp:
 
     def update_prepayment(self):
         """Update an existing prepayment."""
-        print(f"update_prepayment: self.selected_prepayment_index = {self.selected_prepayment_index}")  # Debugging optional
-        if self.selected_prepayment_index is None:
+        if self.selected_prepayment_id is None:
             messagebox.showwarning("Warnung", "Bitte wählen Sie einen Eintrag zum Bearbeiten aus.")
             return
         person = self.prepay_person_var.get()
@@ -379,19 +662,21 @@ class ExpenseApp:
             return
         recipient = self.prepay_recipient_var.get()
         if person in self.persons and recipient in self.persons and amount > 0:
-            self.manager.add_or_update_prepayment(person, amount, recipient, self.selected_prepayment_index)
-            self.update_prepay_list()
+            if not self.manager.update_prepayment_by_id(self.selected_prepayment_id, person, amount, recipient):
+                messagebox.showwarning("Warnung", "Der ausgewählte Eintrag existiert nicht mehr.")
+                self.selected_prepayment_id = None
+                return
             # Auswahl nach Update wiederherstellen
+            row = self.manager.prepayment_index(self.selected_prepayment_id)
             self.prepay_listbox.selection_clear(0, tk.END)
-            self.prepay_listbox.selection_set(self.selected_prepayment_index)
-            self.prepay_listbox.activate(self.selected_prepayment_index)
+            self.prepay_listbox.selection_set(row)
+            self.prepay_listbox.activate(row)
 
     def remove_prepayment(self):
         """Remove a prepayment."""
         selection = self.prepay_listbox.curselection()
         if selection:
             self.manager.remove_prepayment(selection[0])
-            self.update_prepay_list()
 
     def setup_result_tab(self):
         """Set up the results tab."""
@@ -427,13 +712,23 @@ class ExpenseApp:
         self.result_text.insert(tk.END, summary)
 
     def save_results(self):
-        """Save results to a text file."""
+        """Save results to a text file, or the transactions as CSV/JSON Lines."""
         file_path = filedialog.asksaveasfilename(
-            defaultextension=".txt", filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+            defaultextension=".txt",
+            filetypes=[
+                ("Text files", "*.txt"),
+                ("CSV files", "*.csv"),
+                ("JSON Lines files", "*.jsonl"),
+                ("All files", "*.*"),
+            ],
         )
         if file_path:
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(self.result_text.get(1.0, tk.END))
+            extension = os.path.splitext(file_path)[1].lower()
+            with open(file_path, "w", encoding="utf-8", newline="") as file:
+                if extension in (".csv", ".jsonl"):
+                    export_transactions(self.manager, file, extension[1:])
+                else:
+                    file.write(self.result_text.get(1.0, tk.END))
             messagebox.showinfo("Erfolg", f"Ergebnisse wurden in {file_path} gespeichert.")
 
     def save_current_data(self):
@@ -444,14 +739,22 @@ class ExpenseApp:
         )
 
 
+def load_manager(filename=SAVE_FILE):
+    """Load the saved data, or the example data if nothing was saved yet.
+
+    Args:
+        filename: Path to the save file
+
+    Returns:
+        ExpenseManager: The loaded manager
+    """
+    if os.path.exists(filename):
+        return ExpenseManager.load_from_file(filename)
+    return ExpenseManager.create_with_defaults()
+
+
 def main():
     """Run the GUI application."""
-    # Initialize the expense manager
-    if os.path.exists(SAVE_FILE):
-        manager = ExpenseManager.load_from_file(SAVE_FILE)
-    else:
-        manager = ExpenseManager.create_with_defaults()
-
     # Start the GUI application
     root = tk.Tk()
     # Set the window size to 10% larger
@@ -460,8 +763,9 @@ def main():
     new_width = int(screen_width * 0.6 * 1.1)  # 10% larger than 60% of screen width
     new_height = int(screen_height * 0.6 * 1.1)  # 10% larger than 60% of screen height
     root.geometry(f"{new_width}x{new_height}")
-    # Create app instance but no need to store it since it modifies root directly
-    ExpenseApp(root, manager)  # App instance is bound to root
+    # The window appears right away; the data follows once it is loaded
+    app = ExpenseApp(root)
+    app.load_in_background(load_manager)
     root.mainloop()
 
 
@@ -3,13 +3,20 @@
 Script to run all tests for the Lagerfeuer Clearing application.
 """
 
+import os
+import sys
 import unittest
 
 
 def main():
     """Run all tests for the application."""
-    print("Running ExpenseManager tests...")
-    unittest.main(module="lagerfeuer_clearing.tests.test_expense_manager")
+    print("Running Lagerfeuer Clearing tests...")
+    suite = unittest.defaultTestLoader.discover(
+        os.path.dirname(os.path.abspath(__file__)),
+        top_level_dir=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    )
+    result = unittest.TextTestRunner(verbosity=1).run(suite)
+    sys.exit(not result.wasSuccessful())
 
 
 if __name__ == "__main__":
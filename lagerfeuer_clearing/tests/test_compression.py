@@ -0,0 +1,82 @@
+"""
+Tests for compressed ledger files.
+"""
+
+import gzip
+import io
+import os
+import tempfile
+import unittest
+
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.compression import is_compressed, open_ledger
+from lagerfeuer_clearing.core.streaming import calculate_balances_streaming, read_ledger
+
+
+class TestCompression(unittest.TestCase):
+    """Test cases for reading and writing compressed ledgers."""
+
+    def setUp(self):
+        """Create a temporary directory and a manager with some data."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.manager = ExpenseManager.create_with_defaults()
+        self.manager.define_group("Ohne Fahrer", include=["Alle"], exclude=["Fahrgemeinschaft"])
+        self.manager.add_or_update_expense("Anna", 12.5, "Ohne Fahrer", "Holz", date="2024-07-01")
+
+    def tearDown(self):
+        """Clean up after each test."""
+        self.directory.cleanup()
+
+    def path(self, name):
+        """Return the path of a file in the temporary directory."""
+        return os.path.join(self.directory.name, name)
+
+    def test_round_trip(self):
+        """Test that every supported extension saves and loads the same ledger."""
+        for name in ("ledger.json.gz", "ledger.json.bz2", "ledger.json.xz", "ledger.lzma"):
+            with self.subTest(name=name):
+                filename = self.path(name)
+                self.manager.save_to_file(filename)
+                with open(filename, "rb") as f:
+                    self.assertNotEqual(f.read(1), b"{")
+
+                loaded = ExpenseManager.load_from_file(filename)
+                self.assertEqual(loaded.persons, self.manager.persons)
+                self.assertEqual(loaded.groups, self.manager.groups)
+                self.assertEqual(loaded.expenses, self.manager.expenses)
+                self.assertEqual(loaded.prepayments, self.manager.prepayments)
+                self.assertEqual(loaded.group_definitions, self.manager.group_definitions)
+
+    def test_compressed_file_is_smaller(self):
+        """Test that a repetitive ledger shrinks and can be settled out of core."""
+        for i in range(500):
+            self.manager.add_or_update_expense("Bernd", i, "Alle", "Essen")
+        plain = self.path("ledger.json")
+        compressed = self.path("ledger.json.gz")
+        self.manager.save_to_file(plain)
+        self.manager.save_to_file(compressed)
+
+        self.assertTrue(is_compressed(compressed))
+        self.assertFalse(is_compressed(plain))
+        self.assertLess(os.path.getsize(compressed) * 5, os.path.getsize(plain))
+        self.assertEqual(
+            calculate_balances_streaming(compressed)["balance"],
+            calculate_balances_streaming(plain)["balance"],
+        )
+
+    def test_open_ledger_text_mode(self):
+        """Test that open_ledger reads and writes UTF-8 text."""
+        filename = self.path("notiz.gz")
+        with open_ledger(filename, "w") as f:
+            f.write("Grüße")
+        with gzip.open(filename, "rt", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "Grüße")
+
+    def test_read_ledger_empty_sections(self):
+        """Test that empty record lists are kept when reading record by record."""
+        data = read_ledger(io.StringIO('{"persons": [], "expenses": [], "prepayments": []}'))
+        self.assertEqual(data, {"persons": [], "expenses": [], "prepayments": []})
+
+
+if __name__ == "__main__":
+    unittest.main()
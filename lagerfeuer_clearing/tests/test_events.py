@@ -0,0 +1,144 @@
+"""
+Tests for the change events of the expense manager.
+"""
+
+import unittest
+
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.events import (
+    EXPENSE_ADDED,
+    EXPENSE_REMOVED,
+    EXPENSE_UPDATED,
+    GROUP_CHANGED,
+    GROUP_RENAMED,
+    PERSON_ADDED,
+    PERSON_REMOVED,
+    PREPAYMENT_UPDATED,
+    SETTLEMENT_RECORDED,
+    ChangeEvent,
+    coalesce,
+)
+
+
+class TestEvents(unittest.TestCase):
+    """Test cases for subscribe, batch and coalesce."""
+
+    def setUp(self):
+        """Set up a manager with the default example data and a subscriber."""
+        self.manager = ExpenseManager.create_with_defaults()
+        self.batches = []
+        self.manager.subscribe(self.batches.append)
+
+    def kinds(self):
+        """Return the event kinds of every delivered batch."""
+        return [[event.kind for event in batch] for batch in self.batches]
+
+    def test_record_events(self):
+        """Test that every call delivers one batch describing its changes."""
+        self.manager.add_or_update_expense("Jan", 10, "Alle", "Holz")
+        self.manager.add_or_update_expense("Jan", 12, "Alle", "Holz", index=5)
+        self.manager.remove_expense(5)
+        self.manager.add_or_update_prepayment("Jan", 5, "Tobias", index=0)
+
+        self.assertEqual(
+            self.kinds(),
+            [[EXPENSE_ADDED], [EXPENSE_UPDATED], [EXPENSE_REMOVED], [PREPAYMENT_UPDATED]],
+        )
+        updated = self.batches[1][0]
+        self.assertEqual(updated.key, 5)
+        self.assertEqual(updated.value["amount"], 12)
+        self.assertEqual(updated.old["amount"], 10)
+        self.assertEqual(self.batches[2][0].old, updated.value)
+
+    def test_undo_and_person_events(self):
+        """Test that undo reports the reverted changes."""
+        self.manager.add_person("Maja", "Alle")
+        self.assertEqual(
+            self.batches[-1], [ChangeEvent(PERSON_ADDED, 8, "Maja"), self.batches[-1][1]]
+        )
+        self.assertEqual(self.batches[-1][1].kind, GROUP_CHANGED)
+
+        self.manager.undo()
+        self.assertEqual(self.kinds()[-1], [GROUP_CHANGED, PERSON_REMOVED])
+
+    def test_rename_is_coalesced(self):
+        """Test that a rename and its undo are reported as renames."""
+        self.manager.rename_group("Fahrgemeinschaft", "Autos")
+        batch = self.batches[-1]
+        self.assertEqual(batch[0], ChangeEvent(GROUP_RENAMED, "Fahrgemeinschaft", "Autos"))
+        self.assertEqual([event.kind for event in batch[1:]], [EXPENSE_UPDATED])
+
+        self.manager.undo()
+        self.assertIn(ChangeEvent(GROUP_RENAMED, "Autos", "Fahrgemeinschaft"), self.batches[-1])
+
+    def test_batch_coalesces(self):
+        """Test that a batch is delivered once with successive changes merged."""
+        with self.manager.batch():
+            self.manager.add_or_update_expense("Jan", 10, "Alle", "Holz")
+            self.manager.add_or_update_expense("Jan", 20, "Alle", "Holz", index=5)
+            self.manager.add_or_update_expense("Teal", 3, "Alle", "Eis")
+            self.manager.remove_expense(6)
+            self.assertEqual(self.batches, [])
+
+        self.assertEqual(len(self.batches), 1)
+        (event,) = self.batches[0]
+        self.assertEqual(event.kind, EXPENSE_ADDED)
+        self.assertEqual(event.value["amount"], 20)
+
+        # The whole batch is one undo step
+        self.manager.undo()
+        self.assertEqual(len(self.manager.expenses), 5)
+
+    def test_settlement_and_unsubscribe(self):
+        """Test settlement events and that unsubscribed callables are not called."""
+        self.manager.record_settlement()
+        self.assertEqual(self.kinds(), [[SETTLEMENT_RECORDED]])
+        self.manager.unsubscribe(self.batches.append)
+        self.manager.add_or_update_expense("Jan", 10, "Alle", "Holz")
+        self.assertEqual(len(self.batches), 1)
+
+    def test_failing_subscriber(self):
+        """Test that a change stays undoable if a subscriber raises."""
+
+        def fail(events):
+            raise RuntimeError("subscriber failed")
+
+        self.manager.subscribe(fail)
+        with self.assertRaises(RuntimeError):
+            self.manager.add_or_update_prepayment("Jan", 5, "Tobias")
+        self.assertEqual(self.manager.prepayments[-1]["amount"], 5)
+        self.assertTrue(self.manager.can_undo)
+
+        self.manager.unsubscribe(fail)
+        count = len(self.manager.prepayments)
+        self.assertTrue(self.manager.undo())
+        self.assertEqual(len(self.manager.prepayments), count - 1)
+        self.assertFalse(self.manager.can_undo)
+
+    def test_coalesce_keeps_shifted_updates(self):
+        """Test that updates are not merged across insertions into the same list."""
+        events = [
+            ChangeEvent(EXPENSE_UPDATED, 1, "b", "a"),
+            ChangeEvent(EXPENSE_ADDED, 0, "x"),
+            ChangeEvent(EXPENSE_UPDATED, 1, "c", "b"),
+        ]
+        self.assertEqual(coalesce(events), events)
+        self.assertEqual(
+            coalesce([events[0], events[0]._replace(value="c", old="b")]),
+            [ChangeEvent(EXPENSE_UPDATED, 1, "c", "a")],
+        )
+
+    def test_update_after_removal_at_same_index(self):
+        """Test that an update of the item shifted into a removed index is kept."""
+        with self.manager.batch():
+            self.manager.remove_expense(0)
+            self.manager.add_or_update_expense("Teal", 999, "Fahrgemeinschaft", "Mietwagen", 0)
+
+        self.assertEqual(self.kinds(), [[EXPENSE_REMOVED, EXPENSE_UPDATED]])
+        removed, updated = self.batches[0]
+        self.assertEqual(removed.old["subject"], "Unterkunft")
+        self.assertEqual((updated.key, updated.value["amount"]), (0, 999))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -205,6 +205,82 @@ class TestExpenseManager(unittest.TestCase):
         total_debt = sum(abs(b) for b in results["balances"]["balance"].values() if b < 0)
         self.assertAlmostEqual(total_transaction_amount, total_debt, places=2)
 
+    def test_balance_changes(self):
+        """Test that only balances affected by a change are reported."""
+        expected = self.manager.calculate_balances()["balance"]
+        self.assertEqual(self.manager.balance_changes(), expected)
+        self.assertEqual(self.manager.balance_changes(), {})
+
+        self.manager.add_or_update_prepayment("Bob", 10, "Alice")
+        self.assertEqual(self.manager.balance_changes(), {"Alice": 40, "Bob": -10})
+
+        self.manager.add_or_update_expense("Alice", 30, "AB", "Fuel", index=0)
+        changes = self.manager.balance_changes()
+        self.assertEqual(set(changes), {"Alice", "Bob", "Charlie"})
+        for person, balance in self.manager.calculate_balances()["balance"].items():
+            self.assertAlmostEqual(changes[person], balance)
+
+        self.manager.undo()
+        self.assertEqual(set(self.manager.balance_changes()), {"Alice", "Bob", "Charlie"})
+
+        # Changed group members affect every balance, removed persons are dropped
+        self.manager.remove_person_from_group("Charlie", "All")
+        self.assertEqual(set(self.manager.balance_changes()), {"Alice", "Bob"})
+
+    def test_expense_of_empty_group_is_rejected(self):
+        """Test that an expense of a group without members is rejected with or without totals."""
+        for warm in (False, True):
+            with self.subTest(warm=warm):
+                self.setUp()
+                self.manager.groups["Nobody"] = []
+                expected = self.manager.calculate_balances()["balance"]
+                if warm:
+                    self.manager.balance_changes()
+                self.assertEqual(self.manager._tracker.stale, not warm)
+                with self.assertRaises(ValueError):
+                    self.manager.add_or_update_expense("Alice", 30, "Nobody", "Fuel")
+                with self.assertRaises(ValueError):
+                    self.manager.add_or_update_expense("Alice", 30, "Nobody", "Fuel", index=0)
+                with self.assertRaises(ValueError):
+                    self.manager.add_recurring_expense(
+                        "Alice", 30, "Nobody", "Fuel", "2024-05-01", count=2
+                    )
+                self.assertEqual(len(self.manager.expenses), 2)
+                self.assertEqual(self.manager.expenses[0]["group"], "All")
+                self.assertEqual(list(self.manager.query_expenses(group="Nobody")), [])
+                self.assertFalse(self.manager.can_undo)
+                self.assertEqual(self.manager.calculate_balances()["balance"], expected)
+                self.assertEqual(self.manager.rank_balances(), [("Alice", expected["Alice"])])
+
+    def test_failed_rebuild_stays_stale(self):
+        """Test that a rebuild failing halfway does not leave partial totals behind."""
+        self.manager.expenses.append(
+            {"person": "Charlie", "amount": 30, "group": "Nobody", "subject": "Fuel"}
+        )
+        self.manager.groups["Nobody"] = []
+        for _ in range(2):
+            with self.assertRaises(ZeroDivisionError):
+                self.manager.balance_changes()
+        self.assertTrue(self.manager._tracker.stale)
+        self.manager.groups["Nobody"].append("Charlie")
+        self.assertEqual(
+            self.manager.balance_changes(), self.manager.calculate_balances()["balance"]
+        )
+
+    def test_group_of_expense_emptied(self):
+        """Test that balances recover once an emptied group with expenses is restored."""
+        self.manager.balance_changes()
+        self.manager.remove_person_from_group("Alice", "AB")
+        self.manager.remove_person_from_group("Bob", "AB")
+        with self.assertRaises(ZeroDivisionError):
+            self.manager.balance_changes()
+
+        # The change is still undoable and every balance is reported afterwards
+        self.assertTrue(self.manager.undo())
+        self.assertEqual(
+            self.manager.balance_changes(), self.manager.calculate_balances()["balance"]
+        )
+
     def test_get_summary(self):
         """Test summary generation."""
         summary = self.manager.get_summary()
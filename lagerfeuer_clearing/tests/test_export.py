@@ -0,0 +1,63 @@
+"""
+Tests for the CSV and JSON Lines exporters.
+"""
+
+import csv
+import io
+import json
+import unittest
+
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.export import export_balances, export_transactions, write_rows
+
+
+class TestExport(unittest.TestCase):
+    """Test cases for the streaming exporters."""
+
+    def setUp(self):
+        """Set up a manager with the default example data."""
+        self.manager = ExpenseManager.create_with_defaults()
+
+    def test_transactions_csv(self):
+        """Test that transactions are written as CSV rows."""
+        out = io.StringIO()
+        count = export_transactions(self.manager, out, "csv")
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+
+        transactions = self.manager.calculate_transactions()["transactions"]
+        self.assertEqual(count, len(transactions))
+        self.assertEqual(rows[0]["from"], transactions[0]["from"])
+        self.assertAlmostEqual(float(rows[0]["amount"]), transactions[0]["amount"], places=2)
+
+    def test_balances_jsonl(self):
+        """Test that balances are written as one JSON object per line."""
+        out = io.StringIO()
+        export_balances(self.manager, out, "jsonl")
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+
+        self.assertEqual([row["person"] for row in rows], self.manager.persons)
+        tobias = rows[0]
+        self.assertEqual(set(tobias), {"person", "paid", "received", "owes", "balance"})
+        self.assertAlmostEqual(
+            tobias["balance"], tobias["paid"] - tobias["received"] - tobias["owes"], places=1
+        )
+
+    def test_rows_are_written_lazily(self):
+        """Test that rows are consumed one at a time from a generator."""
+        out = io.StringIO()
+
+        def rows():
+            yield {"from": "A", "to": "B", "amount": 1}
+            self.assertIn('"from": "A"', out.getvalue())
+            yield {"from": "B", "to": "C", "amount": 2}
+
+        self.assertEqual(write_rows(rows(), out, "jsonl", ("from", "to", "amount")), 2)
+
+    def test_unknown_format(self):
+        """Test that unsupported formats are rejected."""
+        with self.assertRaises(ValueError):
+            write_rows([], io.StringIO(), "xml", ())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""
+Tests for derived groups built from other groups.
+"""
+
+import os
+import unittest
+
+from lagerfeuer_clearing.core import ExpenseManager
+
+
+class TestDerivedGroups(unittest.TestCase):
+    """Test cases for group definitions and cached membership expansion."""
+
+    def setUp(self):
+        """Set up a manager with base groups and derived groups."""
+        self.manager = ExpenseManager(
+            persons=["Alice", "Bob", "Charlie", "Dave"],
+            groups={
+                "Alle": ["Alice", "Bob", "Charlie", "Dave"],
+                "Fahrer": ["Alice"],
+                "Auto 2": ["Charlie", "Dave"],
+            },
+        )
+        self.manager.define_group("Mitfahrer", include=["Alle"], exclude=["Fahrer"])
+        self.manager.define_group("Mitfahrer Auto 2", include=["Mitfahrer"], exclude=["Auto 2"])
+        self.test_file = "test_groups.json"
+
+    def tearDown(self):
+        """Clean up after each test."""
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+
+    def test_expansion(self):
+        """Test union and difference expansion, including nested definitions."""
+        self.assertEqual(self.manager.members("Mitfahrer"), ["Bob", "Charlie", "Dave"])
+        self.assertEqual(self.manager.members("Mitfahrer Auto 2"), ["Bob"])
+        self.assertEqual(
+            self.manager.group_names(),
+            ["Alle", "Fahrer", "Auto 2", "Mitfahrer", "Mitfahrer Auto 2"],
+        )
+        with self.assertRaises(KeyError):
+            self.manager.members("Unbekannt")
+
+    def test_base_change_invalidates_dependents(self):
+        """Test that changing a base group updates the derived groups built from it."""
+        self.assertEqual(self.manager.members("Mitfahrer Auto 2"), ["Bob"])
+        self.manager.add_person("Eve", "Alle")
+        self.assertEqual(self.manager.members("Mitfahrer Auto 2"), ["Bob", "Eve"])
+        self.manager.add_person("Bob", "Fahrer")
+        self.assertEqual(self.manager.members("Mitfahrer"), ["Charlie", "Dave", "Eve"])
+        self.manager.undo()
+        self.assertEqual(self.manager.members("Mitfahrer"), ["Bob", "Charlie", "Dave", "Eve"])
+
+    def test_balances_with_derived_group(self):
+        """Test that expenses split among derived groups use the expanded members."""
+        self.manager.add_or_update_expense("Alice", 90, "Mitfahrer", "Sprit")
+        balances = self.manager.calculate_balances()
+        self.assertEqual(balances["owes"].get("Alice", 0), 0)
+        self.assertAlmostEqual(balances["owes"]["Bob"], 30)
+        self.assertAlmostEqual(balances["balance"]["Alice"], 90)
+
+    def test_invalid_definitions(self):
+        """Test that cyclic, unknown and conflicting definitions are rejected."""
+        with self.assertRaises(ValueError):
+            self.manager.define_group("Mitfahrer", include=["Mitfahrer Auto 2"])
+        with self.assertRaises(ValueError):
+            self.manager.define_group("Neu", include=["Unbekannt"])
+        with self.assertRaises(ValueError):
+            self.manager.define_group("Alle", include=["Fahrer"])
+
+    def test_rename_updates_definitions(self):
+        """Test that renaming a base group keeps derived groups working."""
+        self.manager.rename_group("Fahrer", "Fahrerin")
+        self.assertEqual(self.manager.group_definitions["Mitfahrer"]["exclude"], ["Fahrerin"])
+        self.assertEqual(self.manager.members("Mitfahrer"), ["Bob", "Charlie", "Dave"])
+
+        self.manager.rename_group("Mitfahrer", "Beifahrer")
+        self.assertEqual(self.manager.members("Mitfahrer Auto 2"), ["Bob"])
+        self.assertEqual(
+            self.manager.group_definitions["Mitfahrer Auto 2"]["include"], ["Beifahrer"]
+        )
+
+    def test_remove_definition_in_use(self):
+        """Test that derived groups still in use cannot be removed."""
+        with self.assertRaises(ValueError):
+            self.manager.remove_group_definition("Mitfahrer")
+        self.manager.remove_group_definition("Mitfahrer Auto 2")
+        self.assertNotIn("Mitfahrer Auto 2", self.manager.group_names())
+
+    def test_definitions_are_saved(self):
+        """Test that group definitions survive saving and loading."""
+        self.manager.save_to_file(self.test_file)
+        loaded = ExpenseManager.load_from_file(self.test_file)
+        self.assertEqual(loaded.members("Mitfahrer Auto 2"), ["Bob"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Tests for the balance panel of the GUI, without opening a window.
+"""
+
+from types import SimpleNamespace
+import unittest
+
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.gui.gui_app import ExpenseApp
+
+
+class FakeTree:
+    """Minimal stand-in for the ttk.Treeview of the balance panel."""
+
+    def __init__(self):
+        """Initialize an empty tree."""
+        self.rows = {}
+
+    def get_children(self):
+        """Return the ids of all rows in order."""
+        return tuple(self.rows)
+
+    def delete(self, *rows):
+        """Delete rows by id."""
+        for row in rows:
+            del self.rows[row]
+
+    def insert(self, parent, position, iid, text):
+        """Append a row without values."""
+        self.rows[iid] = ()
+
+    def item(self, row, values, tags):
+        """Set the values of a row."""
+        self.rows[row] = values
+
+
+class TestBalancePanel(unittest.TestCase):
+    """Test cases for updating the balance panel after changes."""
+
+    def setUp(self):
+        """Set up a manager and a panel that is updated after every change."""
+        self.manager = ExpenseManager.create_with_defaults()
+        self.app = SimpleNamespace(
+            manager=self.manager,
+            persons=self.manager.persons,
+            balance_tree=FakeTree(),
+            balance_panel=SimpleNamespace(configure=lambda text: setattr(self, "title", text)),
+        )
+        ExpenseApp.update_balance_panel(self.app)
+        self.manager.subscribe(lambda events: ExpenseApp.update_balance_panel(self.app))
+
+    def test_group_of_expense_emptied(self):
+        """Test that an emptied group shows placeholders instead of failing every change."""
+        for person in list(self.manager.groups["Fahrgemeinschaft"]):
+            self.manager.remove_person_from_group(person, "Fahrgemeinschaft")
+        self.assertEqual(self.title, "Kontostände (Gruppe ohne Mitglieder)")
+        self.assertEqual(set(self.app.balance_tree.rows.values()), {("–",)})
+
+        # Later edits are still applied and undoable
+        self.manager.add_or_update_prepayment("Jan", 5, "Tobias")
+        self.assertTrue(self.manager.undo())
+
+        while self.title != "Kontostände":
+            self.assertTrue(self.manager.undo())
+        balances = self.manager.calculate_balances()["balance"]
+        self.assertEqual(
+            self.app.balance_tree.rows,
+            {person: (f"{balance:.2f} €",) for person, balance in balances.items()},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Tests for undo, redo and snapshots of the ExpenseManager.
+"""
+
+import unittest
+
+from lagerfeuer_clearing.core import ExpenseManager
+
+
+class TestHistory(unittest.TestCase):
+    """Test cases for the undo/redo history."""
+
+    def setUp(self):
+        """Set up a test instance with a simple dataset before each test."""
+        self.manager = ExpenseManager(
+            persons=["Alice", "Bob", "Charlie"],
+            groups={"All": ["Alice", "Bob", "Charlie"], "AB": ["Alice", "Bob"]},
+            expenses=[
+                {"person": "Alice", "amount": 150, "group": "All", "subject": "Food"},
+                {"person": "Bob", "amount": 60, "group": "AB", "subject": "Drinks"},
+            ],
+            prepayments=[{"person": "Charlie", "amount": 20, "recipient": "Alice"}],
+        )
+
+    def test_undo_and_redo_expense_changes(self):
+        """Test undoing and redoing added, updated and removed expenses."""
+        self.assertFalse(self.manager.can_undo)
+        self.manager.add_or_update_expense("Charlie", 75, "All", "Transport")
+        self.manager.add_or_update_expense("Alice", 200, "All", "Updated Food", 0)
+        self.manager.remove_expense(1)
+        self.assertEqual(
+            [e["subject"] for e in self.manager.expenses], ["Updated Food", "Transport"]
+        )
+
+        self.assertTrue(self.manager.undo())
+        self.assertEqual(self.manager.expenses[1]["subject"], "Drinks")
+        self.assertTrue(self.manager.undo())
+        self.assertEqual(self.manager.expenses[0]["amount"], 150)
+        self.assertTrue(self.manager.undo())
+        self.assertEqual(len(self.manager.expenses), 2)
+        self.assertFalse(self.manager.undo())
+
+        self.assertTrue(self.manager.can_redo)
+        self.manager.redo()
+        self.manager.redo()
+        self.assertEqual(self.manager.expenses[0]["amount"], 200)
+        self.assertEqual(len(self.manager.expenses), 3)
+
+        # A new change discards the redo steps
+        self.manager.add_or_update_prepayment("Bob", 10, "Alice")
+        self.assertFalse(self.manager.can_redo)
+
+    def test_undo_group_changes(self):
+        """Test that compound group changes are undone in a single step."""
+        self.manager.rename_group("AB", "AliceBob")
+        self.manager.remove_person_from_group("Charlie", "All")
+        self.assertNotIn("Charlie", self.manager.persons)
+
+        self.manager.undo()
+        self.assertIn("Charlie", self.manager.persons)
+        self.assertIn("Charlie", self.manager.groups["All"])
+        self.manager.undo()
+        self.assertIn("AB", self.manager.groups)
+        self.assertNotIn("AliceBob", self.manager.groups)
+        self.assertEqual(self.manager.expenses[1]["group"], "AB")
+
+    def test_snapshot_and_restore(self):
+        """Test restoring earlier and later snapshots."""
+        before = self.manager.snapshot()
+        expected = self.manager.calculate_balances()["balance"]
+        self.manager.add_or_update_expense("Charlie", 75, "All", "Transport")
+        self.manager.add_person("Dave", "All")
+        after = self.manager.snapshot()
+
+        self.manager.restore(before)
+        self.assertEqual(len(self.manager.expenses), 2)
+        self.assertNotIn("Dave", self.manager.persons)
+        self.assertEqual(self.manager.calculate_balances()["balance"], expected)
+
+        self.manager.restore(after)
+        self.assertIn("Dave", self.manager.groups["All"])
+
+        # Once a new change was made after undoing, later snapshots are gone
+        self.manager.restore(before)
+        self.manager.remove_expense(0)
+        with self.assertRaises(ValueError):
+            self.manager.restore(after)
+
+    def test_restore_inside_batch(self):
+        """Test that restoring inside a batch is refused instead of looping forever."""
+        before = self.manager.snapshot()
+        self.manager.add_or_update_expense("Charlie", 75, "All", "Transport")
+        with self.manager.batch():
+            self.manager.remove_expense(0)
+            with self.assertRaises(RuntimeError):
+                self.manager.restore(before)
+        self.assertEqual(len(self.manager.expenses), 2)
+        self.manager.restore(before)
+        self.assertEqual(len(self.manager.expenses), 2)
+        self.assertEqual(self.manager.expenses[0]["subject"], "Food")
+
+    def test_undo_keeps_delta_settlement_consistent(self):
+        """Test that undone changes are reflected in incremental balances."""
+        self.manager.record_settlement()
+        self.manager.add_or_update_expense("Charlie", 75, "All", "Transport")
+        self.assertTrue(self.manager.calculate_delta_transactions()["transactions"])
+        self.manager.undo()
+        self.assertEqual(self.manager.calculate_delta_transactions()["transactions"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Tests for the three-way merge of ledgers.
+"""
+
+from contextlib import redirect_stderr, redirect_stdout
+import io
+import os
+import tempfile
+import unittest
+
+from lagerfeuer_clearing.cli.cli_app import main
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.merge import merge_ledgers, record_key
+
+
+class TestMerge(unittest.TestCase):
+    """Test cases for merge_ledgers and the merge command."""
+
+    def setUp(self):
+        """Set up a common version and two copies of the default example data."""
+        self.base = ExpenseManager.create_with_defaults()
+        self.ours = ExpenseManager.create_with_defaults()
+        self.theirs = ExpenseManager.create_with_defaults()
+
+    def test_independent_changes(self):
+        """Test that changes made on only one side are all taken over."""
+        self.ours.add_or_update_expense("Jan", 30, "Alle", "Holz")
+        self.ours.remove_prepayment(0)
+        self.ours.add_person("Maja", "Alle")
+        self.theirs.add_or_update_expense("Teal", 12, "Alle", "Eis")
+        self.theirs.add_or_update_expense("Marius", 45, "Alle", "Saunaholz", index=4)
+        self.theirs.remove_person_from_group("Marius", "Fahrgemeinschaft")
+
+        manager, conflicts = merge_ledgers(self.base, self.ours, self.theirs)
+        self.assertEqual(conflicts, [])
+        self.assertEqual(
+            [expense["subject"] for expense in manager.expenses],
+            ["Unterkunft", "Mietwagen", "Kaufland", "Bierdronka", "Saunaholz", "Holz", "Eis"],
+        )
+        # The changed expense keeps its id and therefore its position
+        self.assertEqual(manager.expenses[4]["amount"], 45)
+        self.assertEqual(len(manager.prepayments), 4)
+        self.assertIn("Maja", manager.persons)
+        self.assertIn("Maja", manager.groups["Alle"])
+        self.assertNotIn("Marius", manager.groups["Fahrgemeinschaft"])
+
+    def test_same_change_on_both_sides(self):
+        """Test that records are matched by their ids and settlements by their content."""
+        for manager in (self.ours, self.theirs):
+            manager.add_or_update_expense("Jan", 30, "Alle", "Holz")
+            manager.remove_expense(0)
+            manager.record_settlement(date="2024-07-10")
+        self.theirs.record_settlement(date="2024-07-11")
+
+        manager, _ = merge_ledgers(self.base, self.ours, self.theirs)
+        subjects = [expense["subject"] for expense in manager.expenses]
+        # Expenses entered on two devices are different expenses
+        self.assertEqual(subjects.count("Holz"), 2)
+        self.assertNotIn("Unterkunft", subjects)
+        self.assertEqual(len(manager.settlements), 2)
+
+    def test_conflicts_by_id(self):
+        """Test that records with an id are merged field by field and conflicts reported."""
+        for manager in (self.base, self.ours, self.theirs):
+            for number, expense in enumerate(manager.expenses):
+                expense["id"] = f"e{number}"
+        self.ours.expenses[0]["amount"] = 1400
+        self.theirs.expenses[0]["amount"] = 1500
+        self.theirs.expenses[1]["subject"] = "Mietwagen und Sprit"
+        self.ours.expenses.pop(2)
+        self.theirs.expenses[2]["amount"] = 750
+
+        manager, conflicts = merge_ledgers(self.base, self.ours, self.theirs)
+        self.assertEqual([conflict["key"] for conflict in conflicts], ["e0", "e2"])
+        self.assertEqual(manager.expenses[0]["amount"], 1400)
+        self.assertEqual(manager.expenses[1]["subject"], "Mietwagen und Sprit")
+        # A removal loses against a change
+        self.assertEqual(manager.expenses[-1]["amount"], 750)
+        self.assertEqual(record_key(manager.expenses[1]), ("id", "e1"))
+
+    def test_cli(self):
+        """Test the merge command on files."""
+        self.ours.add_or_update_expense("Jan", 30, "Alle", "Holz")
+        self.theirs.add_or_update_expense("Teal", 12, "Alle", "Eis")
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for name, manager in (
+                ("base", self.base),
+                ("ours", self.ours),
+                ("theirs", self.theirs),
+            ):
+                paths.append(os.path.join(directory, f"{name}.json"))
+                manager.save_to_file(paths[-1])
+            merged = os.path.join(directory, "merged.json.gz")
+            out = io.StringIO()
+            with redirect_stdout(out), redirect_stderr(io.StringIO()):
+                main(["--output", merged, "merge", *paths])
+            self.assertIn("7 Ausgaben", out.getvalue())
+            self.assertEqual(len(ExpenseManager.load_from_file(merged).expenses), 7)
+
+    def test_cli_rejects_invalid_merge(self):
+        """Test that a merge referring to a group removed on one side is not written."""
+        self.ours.add_or_update_expense("Jan", 30, "Fahrgemeinschaft", "Holz")
+        self.theirs.rename_group("Fahrgemeinschaft", "Autos")
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for name, manager in (
+                ("base", self.base),
+                ("ours", self.ours),
+                ("theirs", self.theirs),
+            ):
+                paths.append(os.path.join(directory, f"{name}.json"))
+                manager.save_to_file(paths[-1])
+            merged = os.path.join(directory, "merged.json")
+            err = io.StringIO()
+            with redirect_stdout(io.StringIO()), redirect_stderr(err):
+                with self.assertRaises(SystemExit):
+                    main(["--output", merged, "merge", *paths])
+            self.assertIn("expenses[5].group: unbekannt ('Fahrgemeinschaft')", err.getvalue())
+            self.assertFalse(os.path.exists(merged))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Tests for the pairwise obligation matrix.
+"""
+
+import random
+import unittest
+
+from lagerfeuer_clearing.benchmarks.obligations import random_matrix
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.obligations import ObligationMatrix, settle_obligations
+
+
+class TestObligations(unittest.TestCase):
+    """Test cases for ObligationMatrix and settle_obligations."""
+
+    def setUp(self):
+        """Set up a manager with the default example data."""
+        self.manager = ExpenseManager.create_with_defaults()
+
+    def test_matches_balances(self):
+        """Test that the obligations add up to the regular balances."""
+        matrix = self.manager.calculate_obligations()
+        balances = matrix.balances()
+        for person, expected in self.manager.calculate_balances()["balance"].items():
+            self.assertAlmostEqual(balances.get(person, 0.0), expected)
+
+    def test_drill_down(self):
+        """Test looking up and explaining the obligations of a person."""
+        matrix = self.manager.calculate_obligations()
+        debts = matrix.owed_by("Teal")
+        self.assertEqual(debts["Tobias"], matrix.amount("Teal", "Tobias"))
+        self.assertAlmostEqual(
+            sum(matrix.owed_to("Teal").values()) - sum(debts.values()),
+            self.manager.calculate_balances()["balance"]["Teal"],
+        )
+        self.assertIn("Teal", matrix.owed_to("Tobias"))
+        self.assertEqual(matrix.amount("Teal", "Teal"), 0.0)
+
+        details = self.manager.explain_obligation("Teal", "Tobias")
+        self.assertAlmostEqual(
+            sum(detail["amount"] for detail in details), matrix.amount("Teal", "Tobias")
+        )
+        self.assertEqual({detail["section"] for detail in details}, {"expenses"})
+
+        # The matrix is rebuilt after a change
+        before = matrix.amount("Tobias", "Teal")
+        self.manager.add_or_update_expense("Teal", 80, "Fahrgemeinschaft", "Maut")
+        self.assertIsNot(self.manager.calculate_obligations(), matrix)
+        self.assertAlmostEqual(
+            self.manager.calculate_obligations().amount("Tobias", "Teal") - before, 16
+        )
+
+    def test_cycles_are_cancelled(self):
+        """Test that circular debts are removed while balances stay intact."""
+        matrix = ObligationMatrix()
+        matrix.add("A", "B", 10)
+        matrix.add("B", "C", 10)
+        matrix.add("C", "A", 4)
+        matrix.add("B", "A", 1)
+        transactions = settle_obligations(matrix)
+
+        self.assertEqual(
+            sorted((t["from"], t["to"], round(t["amount"], 9)) for t in transactions),
+            [("A", "B", 5.0), ("B", "C", 6.0)],
+        )
+
+    def test_dense_graph(self):
+        """Test that no cycle is left in dense graphs and every balance is kept."""
+        for persons, cyclic_share in ((50, 1.0), (400, 1.0), (400, 0.1)):
+            with self.subTest(persons=persons, cyclic_share=cyclic_share):
+                matrix = random_matrix(persons, 20, cyclic_share, random.Random(persons))
+                transactions = settle_obligations(matrix)
+
+                settled = ObligationMatrix()
+                for transaction in transactions:
+                    settled.add(transaction["from"], transaction["to"], transaction["amount"])
+                balances = settled.balances()
+                for person, expected in matrix.balances().items():
+                    self.assertAlmostEqual(balances.get(person, 0.0), expected)
+
+                # Without cycles, persons owing nobody can be removed one by one
+                owing = {person: set(settled.owed_by(person)) for person in balances}
+                while owing:
+                    free = [debtor for debtor, creditors in owing.items() if not creditors]
+                    self.assertTrue(free)
+                    for debtor in free:
+                        del owing[debtor]
+                    for creditors in owing.values():
+                        creditors.difference_update(free)
+
+    def test_pairwise_transactions(self):
+        """Test that pairwise settlement only connects persons who shared costs."""
+        transactions = self.manager.calculate_transactions(pairwise=True)["transactions"]
+        matrix = self.manager.calculate_obligations()
+        received = {}
+        for transaction in transactions:
+            pair = (transaction["from"], transaction["to"])
+            self.assertTrue(matrix.amount(*pair) or matrix.amount(*reversed(pair)))
+            received[pair[0]] = received.get(pair[0], 0) - transaction["amount"]
+            received[pair[1]] = received.get(pair[1], 0) + transaction["amount"]
+
+        for person, balance in self.manager.calculate_balances()["balance"].items():
+            self.assertAlmostEqual(received.get(person, 0.0), balance)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Tests for the parallel balance calculation.
+"""
+
+import io
+import json
+import unittest
+from unittest import mock
+
+from lagerfeuer_clearing.benchmarks.generate import write_ledger
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core import parallel
+from lagerfeuer_clearing.core.parallel import calculate_balances_parallel
+
+
+class TestParallel(unittest.TestCase):
+    """Test cases for calculate_balances_parallel."""
+
+    def setUp(self):
+        """Generate a ledger with derived groups."""
+        out = io.StringIO()
+        write_ledger(out, expenses=3000, prepayments=300, persons=20, groups=5, seed=3)
+        data = json.loads(out.getvalue())
+        self.manager = ExpenseManager(
+            data["persons"], data["groups"], data["expenses"], data["prepayments"]
+        )
+        self.manager.define_group("Rest", include=["Alle"], exclude=["Gruppe 0"])
+        self.manager.add_or_update_expense("Person 1", 99, "Rest", "Holz")
+
+    def assertBalancesEqual(self, actual, expected):
+        """Assert that two balance results match up to rounding errors."""
+        for key in ("paid", "received", "owes", "balance"):
+            for person in self.manager.persons:
+                self.assertAlmostEqual(actual[key].get(person, 0), expected[key].get(person, 0))
+
+    def test_parallel_matches_serial(self):
+        """Test that splitting the work over processes gives the same result."""
+        expected = self.manager.calculate_balances()
+        for workers in (2, 3):
+            result = calculate_balances_parallel(
+                self.manager.expenses,
+                self.manager.prepayments,
+                self.manager.persons,
+                self.manager.members,
+                workers=workers,
+                min_records=0,
+            )
+            self.assertBalancesEqual(result, expected)
+
+    def test_small_ledger_falls_back_to_serial(self):
+        """Test that small ledgers are calculated without worker processes."""
+        expected = self.manager.calculate_balances()
+        expected_transactions = self.manager.calculate_transactions()["transactions"]
+        with (
+            mock.patch.object(parallel, "ProcessPoolExecutor", side_effect=AssertionError),
+            mock.patch.object(parallel, "partial_totals", wraps=parallel.partial_totals) as serial,
+        ):
+            result = self.manager.calculate_balances(workers=4)
+            self.assertEqual(serial.call_count, 1)
+            transactions = self.manager.calculate_transactions(workers=4)["transactions"]
+            self.assertEqual(serial.call_count, 2)
+        self.assertBalancesEqual(result, expected)
+        self.assertEqual(len(transactions), len(expected_transactions))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+"""
+Tests for the indexed expense and prepayment queries.
+"""
+
+import unittest
+
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.query import IdIndex, PrefixIndex
+
+
+class TestQuery(unittest.TestCase):
+    """Test cases for query_expenses and query_prepayments."""
+
+    def setUp(self):
+        """Set up a manager with the default example data."""
+        self.manager = ExpenseManager.create_with_defaults()
+        self.manager.add_or_update_expense("Tobias", 200, "Alle", "Unterkunft Endreinigung")
+
+    def subjects(self, results):
+        """Return the subjects of query results."""
+        return [expense["subject"] for _, expense in results]
+
+    def test_query_by_payer_group_and_text(self):
+        """Test combining secondary indexes with the subject search."""
+        results = list(self.manager.query_expenses(payer="Tobias", group="Alle", text="Unterkunft"))
+        self.assertEqual([index for index, _ in results], [0, 5])
+        self.assertEqual(self.subjects(results), ["Unterkunft", "Unterkunft Endreinigung"])
+
+        self.assertEqual(
+            self.subjects(self.manager.query_expenses(text="end")), ["Unterkunft Endreinigung"]
+        )
+        self.assertEqual(
+            self.subjects(self.manager.query_expenses(group="Fahrgemeinschaft")), ["Mietwagen"]
+        )
+        self.assertEqual(list(self.manager.query_expenses(payer="Nobody")), [])
+        self.assertEqual(len(list(self.manager.query_expenses())), len(self.manager.expenses))
+
+    def test_query_is_lazy(self):
+        """Test that queries return iterators."""
+        results = self.manager.query_expenses(text="Unterkunft")
+        self.assertEqual(next(results)[0], 0)
+
+    def test_indexes_follow_changes(self):
+        """Test that updates, removals and undo are reflected in query results."""
+        self.manager.add_or_update_expense("Marlon", 700, "Alle", "Lidl", 2)
+        self.assertEqual(list(self.manager.query_expenses(text="Kaufland")), [])
+        self.assertEqual(self.subjects(self.manager.query_expenses(text="lidl")), ["Lidl"])
+
+        self.manager.remove_expense(0)
+        self.assertEqual([index for index, _ in self.manager.query_expenses(payer="Tobias")], [4])
+        self.manager.undo()
+        self.assertEqual(
+            [index for index, _ in self.manager.query_expenses(payer="Tobias")], [0, 5]
+        )
+
+        self.manager.rename_group("Alle", "Everyone")
+        self.assertEqual(list(self.manager.query_expenses(group="Alle")), [])
+        self.assertEqual(len(list(self.manager.query_expenses(group="Everyone"))), 5)
+
+    def test_query_prepayments(self):
+        """Test querying prepayments by payer and recipient."""
+        self.assertEqual(len(list(self.manager.query_prepayments(recipient="Tobias"))), 5)
+        results = list(self.manager.query_prepayments(payer="Jan", recipient="Tobias"))
+        self.assertEqual(results, [(4, self.manager.prepayments[4])])
+
+
+class TestPrefixIndex(unittest.TestCase):
+    """Test cases for the name completion of persons and groups."""
+
+    def setUp(self):
+        """Set up a manager with the default example data."""
+        self.manager = ExpenseManager.create_with_defaults()
+
+    def test_complete(self):
+        """Test case-insensitive completion with a limit."""
+        index = PrefixIndex()
+        names = ["marc", "Marlon", "Marius", "Anna", "Mara"]
+        self.assertEqual(index.complete(names, "mar"), ["Mara", "marc", "Marius", "Marlon"])
+        self.assertEqual(index.complete(names, "MAR", limit=2), ["Mara", "marc"])
+        self.assertEqual(index.complete(names, "x"), [])
+        self.assertEqual(index.complete(names, ""), sorted(names, key=str.casefold))
+
+        index.remove("Anna")
+        index.add("Marco")
+        self.assertEqual(index.complete(names, "marc"), ["marc", "Marco"])
+
+    def test_persons_follow_changes(self):
+        """Test that added and removed persons are completed, also after undo."""
+        self.assertEqual(self.manager.complete_persons("ma"), ["Marius", "Marlon"])
+        self.manager.add_person("Maja", "Alle")
+        self.assertEqual(self.manager.complete_persons("ma", limit=2), ["Maja", "Marius"])
+        self.manager.remove_person_from_group("Marlon", "Alle")
+        self.assertEqual(self.manager.complete_persons("ma"), ["Maja", "Marius"])
+        self.manager.undo()
+        self.manager.undo()
+        self.assertEqual(self.manager.complete_persons("ma"), ["Marius", "Marlon"])
+
+    def test_groups_follow_changes(self):
+        """Test completion of base and derived groups across renames."""
+        self.manager.define_group("Fußgänger", include=["Alle"], exclude=["Fahrgemeinschaft"])
+        self.assertEqual(self.manager.complete_groups("f"), ["Fahrgemeinschaft", "Fußgänger"])
+        self.assertEqual(self.manager.complete_groups("f", derived=False), ["Fahrgemeinschaft"])
+        self.assertEqual(self.manager.complete_groups("", limit=1), ["Alle"])
+
+        self.manager.rename_group("Fahrgemeinschaft", "Autos")
+        self.assertEqual(self.manager.complete_groups("a"), ["Alle", "Autos"])
+        self.assertEqual(self.manager.complete_groups("f"), ["Fußgänger"])
+        self.manager.undo()
+        self.assertEqual(self.manager.complete_groups("a"), ["Alle"])
+
+
+class TestIdIndex(unittest.TestCase):
+    """Test cases for IdIndex and the id-based record methods."""
+
+    def setUp(self):
+        """Set up a manager with the default example data."""
+        self.manager = ExpenseManager.create_with_defaults()
+
+    def test_positions_match_list(self):
+        """Test positions after tombstoned removals, revivals, appends and compaction."""
+        records = [{"id": number} for number in range(200)]
+        index = IdIndex()
+        index.rebuild(records)
+        for number in range(0, 150, 3):
+            position = index.position(records, number)
+            del records[position]
+            index.remove(number)
+            if number == 60:
+                # Undoing the last removal revives its slot
+                records.insert(position, {"id": number})
+                index.insert(position, number)
+        records.append({"id": "new"})
+        index.insert(len(records) - 1, "new")
+        self.assertFalse(index.stale)
+        for position, record in enumerate(records):
+            self.assertEqual(index.position(records, record["id"]), position)
+        self.assertIsNone(index.position(records, 3))
+
+        # Removing most records compacts the slots
+        for record in records[:150]:
+            index.remove(record["id"])
+        del records[:150]
+        self.assertFalse(index.stale)
+        self.assertLessEqual(len(index._slots), 2 * len(records) + index.MIN_COMPACTION)
+        for position, record in enumerate(records):
+            self.assertEqual(index.position(records, record["id"]), position)
+
+    def test_ids_survive_removals(self):
+        """Test that ids keep addressing the same records when others are removed."""
+        ids = [expense["id"] for expense in self.manager.expenses]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ExpenseManager.create_with_defaults().expenses[0]["id"], ids[0])
+
+        self.manager.remove_expense(1)
+        self.assertEqual(self.manager.expense_index(ids[3]), 2)
+        self.assertTrue(self.manager.update_expense_by_id(ids[3], "Patrick", 500, "Alle", "Bier"))
+        self.assertEqual(self.manager.expenses[2]["amount"], 500)
+        self.assertEqual(self.manager.expenses[2]["id"], ids[3])
+        self.assertTrue(self.manager.remove_expense_by_id(ids[0]))
+        self.assertFalse(self.manager.remove_expense_by_id(ids[0]))
+        self.assertIsNone(self.manager.expense_index(ids[1]))
+
+        self.manager.undo()
+        self.manager.undo()
+        self.manager.undo()
+        self.assertEqual(self.manager.expense_index(ids[1]), 1)
+        self.assertEqual(self.manager.expense_index(ids[3]), 3)
+
+        self.manager.add_or_update_prepayment("Jan", 20, "Teal")
+        new_id = self.manager.prepayments[-1]["id"]
+        self.assertTrue(self.manager.update_prepayment_by_id(new_id, "Jan", 25, "Teal"))
+        self.assertTrue(self.manager.remove_prepayment_by_id(self.manager.prepayments[0]["id"]))
+        self.assertEqual(self.manager.prepayment_index(new_id), 4)
+        self.assertEqual(self.manager.prepayments[4]["amount"], 25)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Tests for selecting the largest creditors and debtors.
+"""
+
+from contextlib import redirect_stdout
+import io
+import random
+import unittest
+
+from lagerfeuer_clearing.cli.cli_app import main
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.ranking import rank_balances
+
+
+class TestRanking(unittest.TestCase):
+    """Test cases for rank_balances and ExpenseManager.rank_balances."""
+
+    def setUp(self):
+        """Set up a manager with the default example data."""
+        self.manager = ExpenseManager.create_with_defaults()
+
+    def test_matches_sorting(self):
+        """Test that heap selection returns the same persons as sorting all balances."""
+        rng = random.Random(7)
+        balance = {f"P{i}": round(rng.uniform(-100, 100), 2) for i in range(500)}
+        for debtors in (False, True):
+            sign = -1 if debtors else 1
+            ordered = sorted(
+                ((p, b) for p, b in balance.items() if sign * b > 0), key=lambda x: -sign * x[1]
+            )
+            self.assertEqual(rank_balances(balance, debtors, count=20), ordered[:20])
+            self.assertEqual(rank_balances(balance, debtors), ordered)
+            self.assertEqual(
+                rank_balances(balance, debtors, threshold=50),
+                [(p, b) for p, b in ordered if abs(b) > 50],
+            )
+
+    def test_zero_and_ties(self):
+        """Test that settled persons are left out and ties keep their order."""
+        balance = {"A": 10, "B": 0, "C": 10, "D": -5, "E": 1e-12}
+        self.assertEqual(rank_balances(balance), [("A", 10), ("C", 10)])
+        self.assertEqual(rank_balances(balance, debtors=True), [("D", -5)])
+        self.assertEqual(rank_balances(balance, count=1), [("A", 10)])
+
+    def test_manager_follows_changes(self):
+        """Test that the manager ranking matches calculate_balances after changes."""
+        self.manager.add_or_update_expense("Jan", 2000, "Alle", "Boot")
+        balance = self.manager.calculate_balances()["balance"]
+        self.assertEqual(self.manager.rank_balances(count=1), [("Jan", balance["Jan"])])
+        debtors = self.manager.rank_balances(debtors=True, threshold=300)
+        self.assertEqual(
+            [person for person, _ in debtors],
+            sorted((p for p in balance if balance[p] < -300), key=balance.get),
+        )
+
+    def test_cli(self):
+        """Test the top command."""
+        out = io.StringIO()
+        with redirect_stdout(out):
+            main(["top", "--debtors", "-n", "2"])
+        self.assertEqual(
+            out.getvalue(), "Schuldner:\n\tAdrian          411.25 €\n\tMarius          371.25 €\n"
+        )
+        out = io.StringIO()
+        with redirect_stdout(out):
+            main(["--format", "jsonl", "top", "--over", "400"])
+        self.assertEqual(out.getvalue().count("\n"), 1)
+        self.assertIn('"Teal"', out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+"""
+Smoke test running the Python examples of the README.
+"""
+
+from contextlib import redirect_stdout
+import io
+import os
+import re
+import tempfile
+import unittest
+
+README = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "README.md"
+)
+
+_PYTHON_BLOCK = re.compile(r"^```python\n(.*?)^```", re.DOTALL | re.MULTILINE)
+
+
+@unittest.skipUnless(os.path.exists(README), "README.md is not part of the installed package")
+class TestReadme(unittest.TestCase):
+    """Test that the documented examples run from top to bottom."""
+
+    def test_python_examples(self):
+        """Test every Python block of the README in a temporary directory."""
+        with open(README, encoding="utf-8") as f:
+            blocks = _PYTHON_BLOCK.findall(f.read())
+        self.assertTrue(blocks)
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                for number, block in enumerate(blocks):
+                    with self.subTest(block=number), redirect_stdout(io.StringIO()):
+                        exec(compile(block, f"README.md block {number}", "exec"), {})
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    unittest.main()
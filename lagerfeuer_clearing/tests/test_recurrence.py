@@ -0,0 +1,126 @@
+"""
+Tests for recurring expenses.
+"""
+
+from datetime import datetime
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.export import export_expenses
+from lagerfeuer_clearing.core.recurrence import (
+    expand_expense,
+    expense_total,
+    occurrences,
+    validate_repeat,
+)
+from lagerfeuer_clearing.core.streaming import calculate_balances_streaming
+
+
+class TestRecurrence(unittest.TestCase):
+    """Test cases for the recurrence helpers and recurring expenses in the manager."""
+
+    def setUp(self):
+        """Set up a manager with the default example data and a daily expense."""
+        self.manager = ExpenseManager.create_with_defaults()
+        self.manager.add_recurring_expense(
+            "Jan", 12, "Alle", "Frühstück", "2024-07-01", every="day", count=14
+        )
+        self.index = len(self.manager.expenses) - 1
+
+    def expanded_manager(self):
+        """Return a copy of the manager with the recurring expense expanded."""
+        expanded = ExpenseManager.create_with_defaults()
+        expanded.expenses.extend(expand_expense(self.manager.expenses[self.index]))
+        return expanded
+
+    def test_occurrences(self):
+        """Test counting occurrences for counts, end dates and months."""
+        expense = self.manager.expenses[self.index]
+        self.assertEqual(occurrences(expense), 14)
+        self.assertEqual(occurrences(expense, datetime(2024, 7, 3, 12)), 3)
+        self.assertEqual(occurrences(expense, datetime(2024, 6, 30)), 0)
+        self.assertEqual(expense_total(expense), 168)
+
+        weekly = {
+            "amount": 5,
+            "date": "2024-07-01",
+            "repeat": {"every": "week", "until": "2024-07-29"},
+        }
+        self.assertEqual(occurrences(weekly), 5)
+        monthly = {"amount": 1, "date": "2024-01-31", "repeat": {"every": "month", "count": 3}}
+        self.assertEqual(
+            [row["date"] for row in expand_expense(monthly)],
+            ["2024-01-31", "2024-02-29", "2024-03-31"],
+        )
+        self.assertEqual(occurrences(monthly, datetime(2024, 2, 29)), 2)
+
+    def test_invalid_schedules(self):
+        """Test that incomplete or inconsistent schedules are rejected."""
+        for repeat in (
+            {"every": "year", "count": 2},
+            {"every": "day"},
+            {"every": "day", "count": 2, "until": "2024-01-01"},
+            {"every": "day", "count": 0},
+        ):
+            with self.subTest(repeat=repeat), self.assertRaises(ValueError):
+                validate_repeat(repeat)
+        with self.assertRaises(ValueError):
+            self.manager.add_recurring_expense("Jan", 1, "Alle", "Eis", "2024-07-01")
+
+    def test_balances_match_expanded(self):
+        """Test that all calculations agree with the explicitly expanded expenses."""
+        expanded = self.expanded_manager()
+        self.assertEqual(len(expanded.expenses), len(self.manager.expenses) + 13)
+
+        expected = expanded.calculate_balances()["balance"]
+        changes = self.manager.balance_changes()
+        for person, balance in self.manager.calculate_balances()["balance"].items():
+            self.assertAlmostEqual(balance, expected[person])
+            self.assertAlmostEqual(changes[person], expected[person])
+
+        as_of = self.manager.calculate_balances(as_of="2024-07-05")["balance"]
+        between = self.manager.calculate_balances_between("2024-07-03", "2024-07-05")["owes"]
+        expected_as_of = expanded.calculate_balances(as_of="2024-07-05")["balance"]
+        for person, balance in as_of.items():
+            self.assertAlmostEqual(balance, expected_as_of[person])
+        self.assertAlmostEqual(between["Teal"], 3 * 12 / len(self.manager.members("Alle")))
+        self.assertEqual(
+            [day for day, _ in self.manager.balance_history()],
+            [day for day, _ in expanded.balance_history()],
+        )
+
+        matrix = self.manager.calculate_obligations()
+        for person, balance in matrix.balances().items():
+            self.assertAlmostEqual(balance, expected[person])
+
+    def test_streaming(self):
+        """Test that the out-of-core calculation counts every occurrence."""
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "ledger.json")
+            self.manager.save_to_file(filename)
+            with open(filename, encoding="utf-8") as f:
+                self.assertEqual(json.load(f)["expenses"][self.index]["repeat"]["count"], 14)
+            balances = calculate_balances_streaming(filename)["balance"]
+        for person, balance in self.manager.calculate_balances()["balance"].items():
+            self.assertAlmostEqual(balances[person], balance)
+
+    def test_update_summary_and_export(self):
+        """Test updating a recurring expense, its summary line and the expanded export."""
+        self.manager.add_or_update_expense("Jan", 10, "Alle", "Frühstück", index=self.index)
+        expense = self.manager.expenses[self.index]
+        self.assertEqual(expense["repeat"], {"every": "day", "count": 14})
+        self.assertIn("14× täglich 10.00 € (insgesamt 140.00 €)", self.manager.get_summary())
+
+        out = io.StringIO()
+        rows = export_expenses(self.manager, out, "jsonl")
+        self.assertEqual(rows, len(self.manager.expenses) + 13)
+        last = json.loads(out.getvalue().splitlines()[-1])
+        self.assertEqual((last["index"], last["date"]), (self.index, "2024-07-14"))
+
+
+if __name__ == "__main__":
+    unittest.main()
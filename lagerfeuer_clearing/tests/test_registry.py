@@ -0,0 +1,109 @@
+"""
+Tests for the registry of loaded ledgers.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.registry import LedgerRegistry, estimate_size
+
+
+class TestRegistry(unittest.TestCase):
+    """Test cases for LedgerRegistry."""
+
+    def setUp(self):
+        """Write three ledger files into a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(3):
+            manager = ExpenseManager.create_with_defaults()
+            manager.add_or_update_expense("Jan", 10 * (i + 1), "Alle", f"Ledger {i}")
+            path = os.path.join(self.directory.name, f"ledger{i}.json")
+            manager.save_to_file(path)
+            self.paths.append(path)
+
+    def tearDown(self):
+        """Clean up after each test."""
+        self.directory.cleanup()
+
+    def test_hits_and_reload_after_change(self):
+        """Test that unchanged files are served from the cache."""
+        registry = LedgerRegistry()
+        manager = registry.get(self.paths[0])
+        self.assertIs(registry.get(self.paths[0]), manager)
+        self.assertEqual(registry.stats()["hits"], 1)
+
+        manager.add_person("Maja", "Alle")
+        manager.save_to_file(self.paths[0])
+        os.utime(self.paths[0], ns=(0, 0))
+        reloaded = registry.get(self.paths[0])
+        self.assertIsNot(reloaded, manager)
+        self.assertIn("Maja", reloaded.persons)
+        self.assertEqual(registry.stats()["misses"], 2)
+        self.assertEqual(registry.stats()["entries"], 1)
+
+        with self.assertRaises(FileNotFoundError):
+            registry.get(os.path.join(self.directory.name, "missing.json"))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used ledgers are evicted first."""
+        registry = LedgerRegistry(max_entries=2)
+        first = registry.get(self.paths[0])
+        registry.get(self.paths[1])
+        registry.get(self.paths[0])
+        registry.get(self.paths[2])
+
+        stats = registry.stats()
+        self.assertEqual((stats["entries"], stats["evictions"]), (2, 1))
+        self.assertIs(registry.get(self.paths[0]), first)
+        registry.get(self.paths[1])
+        self.assertEqual(registry.stats()["misses"], 4)
+
+        size = estimate_size(first)
+        registry = LedgerRegistry(max_bytes=int(size * 1.5))
+        for path in self.paths:
+            registry.get(path)
+        self.assertEqual(registry.stats()["entries"], 1)
+        self.assertLessEqual(registry.stats()["bytes"], size * 1.5)
+
+    def test_cached_transactions(self):
+        """Test that settlements are cached until the manager changes."""
+        registry = LedgerRegistry()
+        results = registry.transactions(self.paths[0])
+        self.assertIs(registry.transactions(self.paths[0]), results)
+        self.assertIsNot(registry.transactions(self.paths[0], pairwise=True), results)
+
+        registry.get(self.paths[0]).add_or_update_expense("Teal", 50, "Alle", "Eis")
+        updated = registry.transactions(self.paths[0])
+        self.assertIsNot(updated, results)
+        self.assertEqual(updated, registry.get(self.paths[0]).calculate_transactions())
+
+    def test_threads(self):
+        """Test concurrent access from several threads."""
+        registry = LedgerRegistry(max_entries=2)
+        errors = []
+
+        def work(offset):
+            try:
+                for i in range(30):
+                    registry.transactions(self.paths[(i + offset) % 3])
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        stats = registry.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 4 * 30)
+        self.assertLessEqual(stats["entries"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+Tests for the evaluation of what-if scenarios.
+"""
+
+import copy
+import unittest
+
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.scenarios import Scenario, ScenarioLedger, evaluate_scenarios
+
+
+class TestScenarios(unittest.TestCase):
+    """Test cases for Scenario, ScenarioLedger and ExpenseManager.evaluate_scenarios."""
+
+    def setUp(self):
+        """Set up a manager with the default example data and a derived group."""
+        self.manager = ExpenseManager.create_with_defaults()
+        self.manager.define_group("Ohne Auto", ["Alle"], ["Fahrgemeinschaft"])
+        self.manager.add_or_update_expense("Jan", 60, "Ohne Auto", "Zugtickets")
+
+    def copy_manager(self):
+        """Return an independent copy of the manager."""
+        return ExpenseManager(
+            copy.deepcopy(self.manager.persons),
+            copy.deepcopy(self.manager.groups),
+            copy.deepcopy(self.manager.expenses),
+            copy.deepcopy(self.manager.prepayments),
+            group_definitions=copy.deepcopy(self.manager.group_definitions),
+        )
+
+    def assertBalancesEqual(self, result, manager):
+        """Assert that a scenario result matches the balances of an edited copy."""
+        expected = manager.calculate_balances()
+        for key in ("paid", "received", "owes", "balance"):
+            for person in manager.persons:
+                self.assertAlmostEqual(
+                    result["balances"][key][person], expected[key].get(person, 0), places=9
+                )
+        transferred = sum(transaction["amount"] for transaction in result["transactions"])
+        expected_transferred = sum(
+            transaction["amount"]
+            for transaction in manager.calculate_transactions()["transactions"]
+        )
+        self.assertAlmostEqual(transferred, expected_transferred, places=6)
+
+    def test_empty_scenario(self):
+        """Test that a scenario without edits reproduces the current settlement."""
+        (result,) = self.manager.evaluate_scenarios([Scenario("Ist")])
+        self.assertEqual(result["name"], "Ist")
+        self.assertEqual(result["delta"], {})
+        self.assertBalancesEqual(result, self.manager)
+
+    def test_record_edits(self):
+        """Test changed, removed and added records against an edited copy."""
+        kaufland = self.manager.expenses[2]["id"]
+        unterkunft = self.manager.expenses[0]["id"]
+        prepayment = self.manager.prepayments[1]["id"]
+        scenario = Scenario()
+        scenario.update_expense(kaufland, group="Fahrgemeinschaft")
+        scenario.remove_expense(unterkunft)
+        scenario.add_expense("Micha", 80, "Alle", "Grillkohle")
+        scenario.update_prepayment(prepayment, amount=150)
+        scenario.add_prepayment("Jan", 20, "Teal")
+
+        expected = self.copy_manager()
+        expected.add_or_update_expense("Marlon", 700, "Fahrgemeinschaft", "Kaufland", index=2)
+        expected.remove_expense(0)
+        expected.add_or_update_expense("Micha", 80, "Alle", "Grillkohle")
+        expected.add_or_update_prepayment("Patrick", 150, "Tobias", index=1)
+        expected.add_or_update_prepayment("Jan", 20, "Teal")
+
+        (result,) = self.manager.evaluate_scenarios([scenario])
+        self.assertBalancesEqual(result, expected)
+        before = self.manager.calculate_balances()["balance"]
+        after = expected.calculate_balances()["balance"]
+        for person in self.manager.persons:
+            self.assertAlmostEqual(
+                result["delta"].get(person, 0), after[person] - before[person], places=9
+            )
+        # The ledger itself stays unchanged
+        self.assertEqual(self.manager.expenses[2]["group"], "Alle")
+        self.assertEqual(len(self.manager.expenses), 6)
+
+    def test_group_changes(self):
+        """Test that member changes reach base and derived groups."""
+        scenario = Scenario("Jan fährt früher")
+        scenario.remove_person("Jan")
+        scenario.set_members("Fahrgemeinschaft", ["Tobias", "Teal", "Adrian", "Patrick"])
+
+        expected = self.copy_manager()
+        expected.remove_person_from_group("Jan", "Alle")
+        expected.remove_person_from_group("Marius", "Fahrgemeinschaft")
+        # Leaving early does not cancel what Jan already paid
+        expected.add_person("Jan")
+
+        (result,) = self.manager.evaluate_scenarios([scenario])
+        self.assertBalancesEqual(result, expected)
+        self.assertEqual(self.manager.members("Ohne Auto"), ["Micha", "Jan", "Marlon"])
+
+    def test_batch(self):
+        """Test that many scenarios are evaluated in order, serially and in parallel."""
+        scenarios = []
+        for index, expense in enumerate(self.manager.expenses):
+            scenario = Scenario(index)
+            scenario.remove_expense(expense["id"])
+            scenarios.append(scenario)
+        ledger = ScenarioLedger(
+            self.manager.expenses,
+            self.manager.prepayments,
+            self.manager.groups,
+            self.manager.group_definitions,
+            self.manager.persons,
+            tuple(self.manager.calculate_balances()[key] for key in ("paid", "received", "owes")),
+        )
+        serial = evaluate_scenarios(ledger, scenarios)
+        parallel = evaluate_scenarios(ledger, scenarios, workers=2, min_scenarios=1)
+        self.assertEqual([result["name"] for result in serial], list(range(6)))
+        for expected, result in zip(serial, parallel, strict=True):
+            self.assertEqual(result["delta"].keys(), expected["delta"].keys())
+            for person, change in expected["delta"].items():
+                self.assertAlmostEqual(result["delta"][person], change, places=9)
+        for index, result in enumerate(serial):
+            expected = self.copy_manager()
+            expected.remove_expense(index)
+            self.assertBalancesEqual(result, expected)
+
+    def test_unknown_id(self):
+        """Test that edits of unknown records are rejected."""
+        scenario = Scenario()
+        scenario.remove_prepayment("unbekannt")
+        with self.assertRaises(KeyError):
+            self.manager.evaluate_scenarios([scenario])
+
+    def test_emptied_group(self):
+        """Test that a scenario leaving a group with expenses empty is rejected clearly."""
+        scenario = Scenario("Keine Fahrer")
+        scenario.set_members("Fahrgemeinschaft", [])
+        with self.assertRaisesRegex(ValueError, "'Keine Fahrer'.*'Fahrgemeinschaft'"):
+            self.manager.evaluate_scenarios([scenario])
+
+        ledger = ScenarioLedger(
+            self.manager.expenses,
+            self.manager.prepayments,
+            self.manager.groups,
+            self.manager.group_definitions,
+            self.manager.persons,
+            tuple(self.manager.calculate_balances()[key] for key in ("paid", "received", "owes")),
+        )
+        with self.assertRaisesRegex(ValueError, "Mietwagen"):
+            evaluate_scenarios(ledger, [Scenario(), scenario], workers=2, min_scenarios=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
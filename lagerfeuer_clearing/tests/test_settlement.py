@@ -0,0 +1,212 @@
+"""
+Tests for recorded settlements and delta transactions.
+"""
+
+from contextlib import redirect_stderr, redirect_stdout
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from lagerfeuer_clearing.cli.cli_app import main
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.flow import MinCostFlow
+from lagerfeuer_clearing.core.settlement import (
+    SettlementConstraints,
+    SettlementInfeasibleError,
+    settle_constrained,
+)
+
+
+class TestDeltaSettlement(unittest.TestCase):
+    """Test cases for settling only the changes since the last settlement."""
+
+    def setUp(self):
+        """Set up a manager with a simple dataset before each test."""
+        self.manager = ExpenseManager(
+            persons=["Alice", "Bob", "Charlie", "Dave"],
+            groups={"All": ["Alice", "Bob", "Charlie", "Dave"], "AB": ["Alice", "Bob"]},
+            expenses=[
+                {"person": "Alice", "amount": 120, "group": "All", "subject": "Food"},
+                {"person": "Bob", "amount": 60, "group": "AB", "subject": "Drinks"},
+            ],
+            prepayments=[{"person": "Charlie", "amount": 20, "recipient": "Alice"}],
+        )
+        self.test_file = "test_settlements.json"
+
+    def tearDown(self):
+        """Clean up after each test."""
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+
+    def test_without_settlement_matches_full_calculation(self):
+        """Test that the first delta settlement covers all balances."""
+        delta = self.manager.calculate_delta_transactions()
+        full = self.manager.calculate_transactions()
+        self.assertAlmostEqual(
+            sum(t["amount"] for t in delta["transactions"]),
+            sum(t["amount"] for t in full["transactions"]),
+        )
+
+    def test_late_expense_after_settlement(self):
+        """Test that only the late expense is settled after a recorded settlement."""
+        self.manager.record_settlement(date="2024-05-04")
+        self.assertEqual(self.manager.calculate_delta_transactions()["transactions"], [])
+
+        self.manager.add_or_update_expense("Charlie", 40, "AB", "Late taxi")
+        delta = self.manager.calculate_delta_transactions()
+        self.assertEqual(set(delta["delta"]), {"Alice", "Bob", "Charlie"})
+        self.assertAlmostEqual(delta["delta"]["Charlie"], 40)
+        self.assertEqual(
+            sorted((t["from"], t["to"], round(t["amount"], 2)) for t in delta["transactions"]),
+            [("Alice", "Charlie", 20), ("Bob", "Charlie", 20)],
+        )
+
+    def test_partial_settlement_keeps_open_amounts(self):
+        """Test that transfers not executed remain in the next delta settlement."""
+        transactions = self.manager.calculate_delta_transactions()["transactions"]
+        self.manager.record_settlement(transactions[:1])
+        remaining = self.manager.calculate_delta_transactions()["transactions"]
+        self.assertAlmostEqual(
+            sum(t["amount"] for t in remaining), sum(t["amount"] for t in transactions[1:])
+        )
+
+    def test_group_change_after_settlement(self):
+        """Test that membership changes are picked up by the delta settlement."""
+        self.manager.record_settlement()
+        self.manager.remove_person_from_group("Dave", "All")
+        delta = self.manager.calculate_delta_transactions()
+        self.assertAlmostEqual(delta["delta"]["Dave"], 30)
+        self.assertAlmostEqual(sum(delta["delta"].values()), 0)
+
+    def test_settlements_are_saved(self):
+        """Test that recorded settlements survive saving and loading."""
+        self.manager.record_settlement(date="2024-05-04")
+        self.manager.save_to_file(self.test_file)
+        loaded = ExpenseManager.load_from_file(self.test_file)
+        self.assertEqual(loaded.settlements[0]["date"], "2024-05-04")
+        self.assertEqual(loaded.calculate_delta_transactions()["transactions"], [])
+
+
+class TestConstrainedSettlement(unittest.TestCase):
+    """Test cases for settling with allowed pairs and capacities."""
+
+    def setUp(self):
+        """Set up balances of two debtors and one creditor."""
+        self.balance = {"Alice": -30, "Bob": -20, "Charlie": 50, "Dave": 0}
+
+    def assertSettles(self, transactions, balance):
+        """Assert that the transactions settle every balance exactly."""
+        net = dict.fromkeys(balance, 0)
+        for transaction in transactions:
+            net[transaction["from"]] += transaction["amount"]
+            net[transaction["to"]] -= transaction["amount"]
+        for person, amount in balance.items():
+            self.assertAlmostEqual(net[person] + amount, 0, places=9)
+
+    def test_min_cost_flow(self):
+        """Test that the cheapest paths are used before more expensive ones."""
+        network = MinCostFlow(4)
+        cheap = network.add_edge(0, 1, 5, 1)
+        network.add_edge(1, 3, 5, 1)
+        expensive = network.add_edge(0, 2, 10, 3)
+        network.add_edge(2, 3, 10, 1)
+        self.assertEqual(network.solve(0, 3, 8), (8, 10 + 12))
+        self.assertEqual((network.flow_of(cheap), network.flow_of(expensive)), (5, 3))
+        self.assertEqual(network.solve(0, 3)[0], 7)
+
+    def test_without_constraints(self):
+        """Test that unconstrained settling pays creditors directly."""
+        transactions = settle_constrained(self.balance, SettlementConstraints())
+        self.assertSettles(transactions, self.balance)
+        self.assertEqual({t["to"] for t in transactions}, {"Charlie"})
+
+    def test_allowed_pairs(self):
+        """Test that money is passed on where no direct transfer is allowed."""
+        constraints = SettlementConstraints(
+            allowed=[("Alice", "Dave"), ("Dave", "Charlie"), ("Bob", "Charlie")]
+        )
+        transactions = settle_constrained(self.balance, constraints)
+        self.assertSettles(transactions, self.balance)
+        self.assertEqual(
+            sorted((t["from"], t["to"], t["amount"]) for t in transactions),
+            [("Alice", "Dave", 30), ("Bob", "Charlie", 20), ("Dave", "Charlie", 30)],
+        )
+
+    def test_capacities(self):
+        """Test that pair capacities and the maximum transfer are respected."""
+        constraints = SettlementConstraints.from_dict(
+            {
+                "allowed": [["Alice", "Charlie"], ["Alice", "Bob"], ["Bob", "Charlie"]],
+                "capacities": [["Alice", "Charlie", 10]],
+                "max_transfer": 45,
+            }
+        )
+        transactions = settle_constrained(self.balance, constraints)
+        self.assertSettles(transactions, self.balance)
+        amounts = {(t["from"], t["to"]): t["amount"] for t in transactions}
+        self.assertEqual(
+            amounts, {("Alice", "Charlie"): 10, ("Alice", "Bob"): 20, ("Bob", "Charlie"): 40}
+        )
+
+    def test_infeasible(self):
+        """Test that unsettled amounts are reported per person."""
+        constraints = SettlementConstraints(allowed=[("Alice", "Charlie")], max_transfer=25)
+        with self.assertRaises(SettlementInfeasibleError) as context:
+            settle_constrained(self.balance, constraints)
+        self.assertEqual(context.exception.unsettled, {"Alice": -5, "Bob": -20, "Charlie": 25})
+
+    def test_cents(self):
+        """Test that fractional balances are settled in whole cents."""
+        balance = {"A": -10 / 3, "B": -10 / 3, "C": 20 / 3}
+        transactions = settle_constrained(
+            balance, SettlementConstraints(allowed=[("A", "B"), ("B", "C")])
+        )
+        self.assertEqual(
+            [(t["from"], t["amount"]) for t in transactions], [("A", 3.33), ("B", 6.66)]
+        )
+
+    def test_random_ledgers(self):
+        """Test random sparse constraints against the settled balances."""
+        rng = random.Random(0)
+        names = [f"P{i}" for i in range(60)]
+        for _ in range(5):
+            cents = [rng.randint(-5000, 5000) for _ in names]
+            cents[0] -= sum(cents)
+            balance = {name: amount / 100 for name, amount in zip(names, cents, strict=True)}
+            allowed = {(name, names[(i + 1) % len(names)]) for i, name in enumerate(names)}
+            allowed |= {(rng.choice(names), rng.choice(names)) for _ in range(120)}
+            transactions = settle_constrained(balance, SettlementConstraints(allowed))
+            self.assertSettles(transactions, balance)
+            self.assertTrue(all((t["from"], t["to"]) in allowed for t in transactions))
+
+    def test_manager_and_cli(self):
+        """Test the constraints through the manager and the command line."""
+        manager = ExpenseManager.create_with_defaults()
+        with self.assertRaises(ValueError):
+            manager.calculate_transactions(pairwise=True, constraints=SettlementConstraints())
+        results = manager.calculate_transactions(
+            constraints=SettlementConstraints(max_transfer=100)
+        )
+        self.assertTrue(all(t["amount"] <= 100 for t in results["transactions"]))
+        self.assertSettles(results["transactions"], results["balances"]["balance"])
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "constraints.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"allowed": [["Jan", "Tobias"]]}, f)
+            out = io.StringIO()
+            with redirect_stdout(out):
+                main(["--format", "jsonl", "--max-transfer", "200"])
+            rows = [json.loads(line) for line in out.getvalue().splitlines()]
+            self.assertTrue(rows)
+            self.assertTrue(all(row["amount"] <= 200 for row in rows))
+            with redirect_stderr(io.StringIO()) as err, self.assertRaises(SystemExit):
+                main(["--constraints", path, "--format", "csv"])
+        self.assertIn("nicht möglich", err.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
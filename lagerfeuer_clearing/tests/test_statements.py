@@ -0,0 +1,109 @@
+"""
+Tests for the personal statements.
+"""
+
+from contextlib import redirect_stdout
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from lagerfeuer_clearing.benchmarks.generate import write_ledger
+from lagerfeuer_clearing.cli.cli_app import main
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.statements import PersonIndex, statement_paths, write_statements
+
+
+class TestStatements(unittest.TestCase):
+    """Test cases for PersonIndex, the statement texts and the statements command."""
+
+    def setUp(self):
+        """Set up a manager with the default example data."""
+        self.manager = ExpenseManager.create_with_defaults()
+
+    def test_person_index(self):
+        """Test that the index finds the same records as a scan of the ledger."""
+        out = io.StringIO()
+        write_ledger(out, 2_000, 200, persons=30, groups=6)
+        data = json.loads(out.getvalue())
+        manager = ExpenseManager(
+            data["persons"], data["groups"], data["expenses"], data["prepayments"]
+        )
+        group_members = {group: manager.members(group) for group in manager.groups}
+        index = PersonIndex(manager.expenses, manager.prepayments, group_members)
+        for person in manager.persons:
+            self.assertEqual(
+                index.expenses_of(person),
+                [
+                    position
+                    for position, expense in enumerate(manager.expenses)
+                    if expense["person"] == person or person in group_members[expense["group"]]
+                ],
+            )
+            self.assertEqual(
+                index.prepayments_of(person),
+                [
+                    position
+                    for position, prepayment in enumerate(manager.prepayments)
+                    if person in (prepayment["person"], prepayment["recipient"])
+                ],
+            )
+
+    def test_statement(self):
+        """Test the content of a single statement."""
+        self.manager.add_or_update_expense("Jan", 60, "Fahrgemeinschaft", "Tanken")
+        statement = self.manager.get_statement("Jan")
+        self.assertIn("Unterkunft, 1300.00 € bezahlt von Tobias", statement)
+        self.assertIn("Anteil 162.50 €", statement)
+        # Paid but not shared expenses are listed without a share
+        self.assertIn("Tanken, 60.00 € bezahlt von selbst, Gruppe 'Fahrgemeinschaft'", statement)
+        self.assertNotIn("Mietwagen", statement)
+        self.assertIn("- an Tobias 100.00 €", statement)
+        balance = self.manager.calculate_balances()["balance"]["Jan"]
+        self.assertIn(f"Saldo {balance:.2f} €", statement)
+        transfers = [
+            t
+            for t in self.manager.calculate_transactions()["transactions"]
+            if "Jan" in (t["from"], t["to"])
+        ]
+        self.assertEqual(
+            statement.count("zahlt an") + statement.count("erhält von"), len(transfers)
+        )
+
+    def test_paths(self):
+        """Test that every person gets a distinct, safe file name."""
+        paths = statement_paths(["Jan", "jan", "A/B", "../x"], "out")
+        self.assertEqual(
+            [os.path.basename(path) for path in paths.values()],
+            ["Jan.txt", "jan_2.txt", "A_B.txt", "x.txt"],
+        )
+
+    def test_write_serial_and_parallel(self):
+        """Test that the process pool writes the same statements as the serial writer."""
+        with tempfile.TemporaryDirectory() as directory:
+            serial = self.manager.write_statements(os.path.join(directory, "serial"), workers=1)
+            args = self.manager._statement_args()
+            parallel = write_statements(
+                args, self.manager.persons, os.path.join(directory, "parallel"), 2, 1
+            )
+            self.assertEqual(list(serial), self.manager.persons)
+            for person in self.manager.persons:
+                with open(serial[person], encoding="utf-8") as f:
+                    expected = f.read()
+                with open(parallel[person], encoding="utf-8") as f:
+                    self.assertEqual(f.read(), expected)
+                self.assertEqual(expected, self.manager.get_statement(person))
+
+    def test_cli(self):
+        """Test the statements command."""
+        with tempfile.TemporaryDirectory() as directory:
+            out = io.StringIO()
+            with redirect_stdout(out):
+                main(["statements", directory])
+            self.assertIn("8 Abrechnungen", out.getvalue())
+            self.assertEqual(len(os.listdir(directory)), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+"""
+Tests for the out-of-core balance calculation.
+"""
+
+from contextlib import redirect_stderr, redirect_stdout
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+from lagerfeuer_clearing.benchmarks.generate import write_ledger
+from lagerfeuer_clearing.cli.cli_app import main
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.streaming import (
+    calculate_balances_streaming,
+    calculate_transactions_streaming,
+    iter_ledger,
+)
+
+# Size of the generated ledger in the memory test; raise it to check
+# multi-gigabyte ledgers, e.g. LAGERFEUER_OUT_OF_CORE_MB=4096
+LEDGER_MB = int(os.environ.get("LAGERFEUER_OUT_OF_CORE_MB", "4"))
+
+
+class TestStreaming(unittest.TestCase):
+    """Test cases for reading and settling ledgers in bounded chunks."""
+
+    def setUp(self):
+        """Create a temporary directory for ledger files."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.test_file = os.path.join(self.directory.name, "ledger.json")
+
+    def tearDown(self):
+        """Clean up after each test."""
+        self.directory.cleanup()
+
+    def test_iter_ledger_small_chunks(self):
+        """Test that values spanning chunk boundaries are decoded correctly."""
+        manager = ExpenseManager.create_with_defaults()
+        manager.define_group("Ohne Fahrer", include=["Alle"], exclude=["Fahrgemeinschaft"])
+        manager.save_to_file(self.test_file)
+        with open(self.test_file, encoding="utf-8") as f:
+            items = list(iter_ledger(f, chunk_size=7))
+
+        expenses = [value for section, value in items if section == "expenses"]
+        self.assertEqual(expenses, manager.expenses)
+        self.assertIn(("persons", manager.persons), items)
+
+        with self.assertRaises(MemoryError):
+            list(iter_ledger(io.StringIO('{"persons": ["' + "x" * 100 + '"]}'), 8, 50))
+
+    def test_buffer_limit_below_chunk_size(self):
+        """Test that the buffer limit caps the chunks and only rejects longer values."""
+        manager = ExpenseManager.create_with_defaults()
+        manager.save_to_file(self.test_file)
+        self.assertGreater(os.path.getsize(self.test_file), 400)
+        with open(self.test_file, encoding="utf-8") as f:
+            items = list(iter_ledger(f, chunk_size=1 << 16, buffer_limit=400))
+        expenses = [value for section, value in items if section == "expenses"]
+        self.assertEqual(expenses, manager.expenses)
+
+        # The groups are the longest single value of the file
+        with open(self.test_file, encoding="utf-8") as f, self.assertRaises(MemoryError):
+            list(iter_ledger(f, chunk_size=1 << 16, buffer_limit=200))
+
+    def test_cli_buffer_limit(self):
+        """Test passing the buffer limit on the command line."""
+        ExpenseManager.create_with_defaults().save_to_file(self.test_file)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            main(["--file", self.test_file, "--out-of-core", "--buffer-limit", "400"])
+        self.assertIn("Transaktionen die jetzt folgen müssen", out.getvalue())
+
+        output = os.path.join(self.directory.name, "transactions.jsonl")
+        for argv, message in (
+            (["--out-of-core", "--buffer-limit", "200", "-o", output], "200 Zeichen"),
+            (["--buffer-limit", "400"], "nur mit --out-of-core"),
+            (["--out-of-core", "--buffer-limit", "0"], "größer als 0"),
+        ):
+            with self.subTest(argv=argv):
+                err = io.StringIO()
+                with redirect_stderr(err), self.assertRaises(SystemExit):
+                    main(["--file", self.test_file, *argv])
+                self.assertIn(message, err.getvalue())
+        self.assertFalse(os.path.exists(output))
+
+        with redirect_stdout(io.StringIO()) as out:
+            main(
+                [
+                    "--file",
+                    self.test_file,
+                    "--out-of-core",
+                    "--buffer-limit",
+                    "400",
+                    "--format",
+                    "jsonl",
+                ]
+            )
+        transactions = [json.loads(line) for line in out.getvalue().splitlines()]
+        expected = ExpenseManager.load_from_file(self.test_file).calculate_transactions()
+        self.assertEqual(len(transactions), len(expected["transactions"]))
+
+    def test_matches_in_memory_calculation(self):
+        """Test that the streaming result equals the regular calculation."""
+        with open(self.test_file, "w", encoding="utf-8") as f:
+            write_ledger(f, expenses=2000, prepayments=200, persons=12, groups=4)
+        manager = ExpenseManager.load_from_file(self.test_file)
+        expected = manager.calculate_balances()["balance"]
+
+        result = calculate_transactions_streaming(self.test_file, chunk_size=512)
+        for person in manager.persons:
+            self.assertAlmostEqual(result["balances"]["balance"][person], expected[person])
+        self.assertEqual(
+            len(result["transactions"]), len(manager.calculate_transactions()["transactions"])
+        )
+
+    def test_memory_is_bounded(self):
+        """Test that the peak memory does not grow with the size of the ledger."""
+        with open(self.test_file, "w", encoding="utf-8") as f:
+            write_ledger(f, expenses=LEDGER_MB * 1024 * 1024 // 90, persons=200, groups=20)
+        size = os.path.getsize(self.test_file)
+
+        tracemalloc.start()
+        try:
+            balances = calculate_balances_streaming(self.test_file)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(len(balances["balance"]), 200)
+        self.assertLess(peak, 2 * 1024 * 1024)
+        self.assertLess(peak, size / 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Tests for dated records and point-in-time balance queries.
+"""
+
+import unittest
+from datetime import date
+
+from lagerfeuer_clearing.core import ExpenseManager
+
+
+class TestTimeline(unittest.TestCase):
+    """Test cases for the time-indexed balance queries."""
+
+    def setUp(self):
+        """Set up a manager with expenses spread over several days."""
+        self.manager = ExpenseManager(
+            persons=["Alice", "Bob", "Charlie"],
+            groups={"All": ["Alice", "Bob", "Charlie"], "AB": ["Alice", "Bob"]},
+        )
+        self.manager.add_or_update_expense("Alice", 150, "All", "Food", date="2024-05-01")
+        self.manager.add_or_update_expense("Bob", 60, "AB", "Drinks", date="2024-05-03")
+        self.manager.add_or_update_prepayment("Charlie", 20, "Alice", date=date(2024, 5, 2))
+
+    def test_date_is_stored_as_iso_string(self):
+        """Test that dates are stored in a JSON friendly format."""
+        self.assertEqual(self.manager.expenses[0]["date"], "2024-05-01")
+        self.assertEqual(self.manager.prepayments[0]["date"], "2024-05-02")
+
+        # Updating without a date keeps the previous one
+        self.manager.add_or_update_expense("Alice", 120, "All", "Food", 0)
+        self.assertEqual(self.manager.expenses[0]["date"], "2024-05-01")
+
+    def test_balances_as_of(self):
+        """Test that only records up to the given day are considered."""
+        balances = self.manager.calculate_balances(as_of="2024-05-02")
+        self.assertEqual(balances["paid"]["Alice"], 150)
+        self.assertEqual(balances["paid"]["Charlie"], 20)
+        self.assertEqual(balances["paid"].get("Bob", 0), 0)
+        self.assertAlmostEqual(balances["balance"]["Alice"], 150 - 20 - 50)
+        self.assertAlmostEqual(balances["balance"]["Bob"], -50)
+
+        # At the last day the result matches the full calculation
+        full = self.manager.calculate_balances()
+        latest = self.manager.calculate_balances(as_of=date(2024, 5, 3))
+        for person in self.manager.persons:
+            self.assertAlmostEqual(latest["balance"][person], full["balance"][person])
+
+        # Before the first record nothing has happened
+        empty = self.manager.calculate_balances(as_of="2024-04-30")
+        self.assertTrue(all(value == 0 for value in empty["balance"].values()))
+
+    def test_undated_records_are_always_included(self):
+        """Test that records without a date count for every point in time."""
+        self.manager.add_or_update_expense("Charlie", 30, "All", "Firewood")
+        balances = self.manager.calculate_balances(as_of="2024-04-30")
+        self.assertEqual(balances["paid"]["Charlie"], 30)
+
+    def test_balances_between(self):
+        """Test range queries over a period of days."""
+        balances = self.manager.calculate_balances_between("2024-05-02", "2024-05-03")
+        self.assertEqual(balances["paid"].get("Alice", 0), 0)
+        self.assertEqual(balances["paid"]["Bob"], 60)
+        self.assertEqual(balances["received"]["Alice"], 20)
+        self.assertAlmostEqual(balances["owes"]["Alice"], 30)
+
+    def test_balance_history(self):
+        """Test the end-of-day balance history."""
+        history = self.manager.balance_history()
+        self.assertEqual([day for day, _ in history], [date(2024, 5, d) for d in (1, 2, 3)])
+        self.assertAlmostEqual(history[0][1]["Alice"], 100)
+        self.assertAlmostEqual(history[-1][1]["Bob"], 60 - 80)
+
+
+if __name__ == "__main__":
+    unittest.main()
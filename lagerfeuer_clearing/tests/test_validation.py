@@ -0,0 +1,148 @@
+"""
+Tests for the validation of ledgers while loading.
+"""
+
+from contextlib import redirect_stderr, redirect_stdout
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from lagerfeuer_clearing.cli.cli_app import main
+from lagerfeuer_clearing.core import ExpenseManager
+from lagerfeuer_clearing.core.validation import LedgerValidationError, validate_ledger
+
+
+class TestValidation(unittest.TestCase):
+    """Test cases for validate_ledger and the validation in load_from_file."""
+
+    def setUp(self):
+        """Set up a temporary directory and a valid ledger."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.data = {
+            "persons": ["Alice", "Bob", "Charlie"],
+            "groups": {"All": ["Alice", "Bob", "Charlie"], "AB": ["Alice", "Bob"]},
+            "group_definitions": {"Only C": {"include": ["All"], "exclude": ["AB"]}},
+            "expenses": [
+                {"person": "Alice", "amount": 90, "group": "All", "subject": "Food", "id": "e1"},
+                {"person": "Bob", "amount": 30, "group": "Only C", "subject": "Taxi", "id": "e2"},
+            ],
+            "prepayments": [{"person": "Charlie", "amount": 20, "recipient": "Alice", "id": "p1"}],
+        }
+
+    def tearDown(self):
+        """Clean up after each test."""
+        self.directory.cleanup()
+
+    def issues(self):
+        """Validate the ledger and return its issues as tuples."""
+        issues = validate_ledger(
+            self.data["persons"],
+            self.data["groups"],
+            self.data["expenses"],
+            self.data["prepayments"],
+            self.data["group_definitions"],
+        )
+        return [
+            (issue["section"], issue["index"], issue["field"], issue["problem"]) for issue in issues
+        ]
+
+    def write(self):
+        """Save the ledger as JSON file and return its path."""
+        filename = os.path.join(self.directory.name, "ledger.json")
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        return filename
+
+    def test_valid_ledger(self):
+        """Test that a valid ledger has no issues and loads unchanged."""
+        self.assertEqual(self.issues(), [])
+        manager = ExpenseManager.load_from_file(self.write())
+        self.assertEqual(manager.expenses, self.data["expenses"])
+        self.assertEqual(manager.validate(), [])
+
+    def test_all_issues_are_collected(self):
+        """Test that every problem is reported with the position of its record."""
+        self.data["persons"].append("Bob")
+        self.data["groups"]["Empty"] = []
+        self.data["group_definitions"]["Loop"] = {"include": ["Loop", "Nobody"]}
+        self.data["expenses"].extend(
+            [
+                {"person": "Alice", "amount": "12", "group": "Team", "subject": "x", "id": "e1"},
+                {"person": "Bob", "amount": float("nan"), "group": "Empty", "subject": "y"},
+                {"person": "Alice", "amount": 5, "group": "All", "subject": "z", "date": "gestern"},
+                {
+                    "person": "Alice",
+                    "amount": 5,
+                    "group": "All",
+                    "subject": "Miete",
+                    "date": "2024-07-01",
+                    "repeat": {"every": "year", "count": 2},
+                },
+            ]
+        )
+        self.data["prepayments"].append({"person": "Alice", "amount": True, "recipient": "Dora"})
+        self.assertEqual(
+            self.issues(),
+            [
+                ("persons", "Bob", "name", "duplicate"),
+                ("group_definitions", "Loop", "include/exclude", "unknown"),
+                ("group_definitions", "Loop", "include/exclude", "cyclic"),
+                ("expenses", 2, "group", "unknown"),
+                ("expenses", 2, "amount", "invalid"),
+                ("expenses", 2, "id", "duplicate"),
+                ("expenses", 3, "group", "empty"),
+                ("expenses", 3, "amount", "invalid"),
+                ("expenses", 4, "date", "invalid"),
+                ("expenses", 5, "repeat", "invalid"),
+                ("prepayments", 1, "recipient", "unlisted"),
+                ("prepayments", 1, "amount", "invalid"),
+            ],
+        )
+
+        with self.assertRaises(LedgerValidationError) as context:
+            ExpenseManager.load_from_file(self.write())
+        # Persons missing from the person list do not prevent loading
+        self.assertEqual(len(context.exception.issues), 11)
+        self.assertIn("expenses[2].group: unknown 'Team'", str(context.exception))
+        self.assertIn("... and 1 more", str(context.exception))
+
+    def test_unlisted_persons_are_loaded(self):
+        """Test that records of persons who left every group can still be loaded."""
+        self.data["expenses"][1]["group"] = "AB"
+        manager = ExpenseManager.load_from_file(self.write())
+        manager.remove_person_from_group("Charlie", "All")
+        filename = self.write()
+        manager.save_to_file(filename)
+        loaded = ExpenseManager.load_from_file(filename)
+        self.assertNotIn("Charlie", loaded.persons)
+        self.assertEqual(
+            [(issue["section"], issue["problem"]) for issue in loaded.validate()],
+            [("prepayments", "unlisted")],
+        )
+
+    def test_cli(self):
+        """Test that the CLI rejects an invalid file and batch skips it."""
+        valid = self.write()
+        self.data["expenses"][0]["group"] = "Team"
+        invalid = os.path.join(self.directory.name, "invalid.json")
+        with open(invalid, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+
+        err = io.StringIO()
+        with redirect_stderr(err), self.assertRaises(SystemExit):
+            main(["--file", invalid, "summary"])
+        self.assertIn("expenses[0].group: unbekannt ('Team')", err.getvalue())
+
+        out = io.StringIO()
+        err = io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            main(["batch", invalid, valid])
+        self.assertIn(f"{invalid}: Ungültige Daten", err.getvalue())
+        self.assertIn(f"{valid}:", out.getvalue())
+        self.assertNotIn(f"{invalid}:", out.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()